@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Fama-MacBeth factor returns, Newey-West t-stats and return attribution.
+
+Every month ``t`` the next-month returns are regressed on the neutralized
+z-scores of the cube::
+
+    r[t+1, i] = a[t] + sum_k z[t, i, k] * f[t, k] + e[t, i]
+
+All months are solved at once from the stacked normal equations (one
+``einsum`` for ``X'X`` / ``X'y`` and one batched pseudo-inverse) instead of a
+``lstsq`` call per month.  Missing exposures count as 0 (the cross-sectional
+mean of a z-score); symbols without a next-month return are left out.
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+from cube import FactorCube
+
+def fama_macbeth(cube: FactorCube, factors: Optional[Sequence[str]] = None, min_obs: int = 30) -> Dict[str, object]:
+    """Monthly cross-sectional regressions over the cube.
+
+    Returns ``factor_returns`` (month x ["alpha"] + factors), ``r2`` and
+    ``n_obs`` (per month).  Months with fewer than ``min_obs`` usable symbols
+    are NaN, as is a factor's return in a month where nobody has exposure.
+    """
+    factors = list(cube.factors if factors is None else factors)
+    fi = [cube.factors.get_loc(f) for f in factors]
+    Z = np.asarray(cube.z[:, :, fi], dtype=float)                    # (T, N, K)
+    y = np.asarray(cube.matrices["m_rets"], dtype=float)             # (T, N)
+    T, N, K = Z.shape
+
+    obs = np.isfinite(y)
+    exposed = np.isfinite(Z) & obs[:, :, None]
+    X = np.concatenate([np.ones((T, N, 1)), np.where(exposed, Z, 0.0)], axis=2)
+    X *= obs[:, :, None]
+    y0 = np.where(obs, y, 0.0)
+
+    XtX = np.einsum("tnk,tnl->tkl", X, X)
+    Xty = np.einsum("tnk,tn->tk", X, y0)
+    beta = np.einsum("tkl,tl->tk", np.linalg.pinv(XtX), Xty)        # (T, K+1)
+
+    n = obs.sum(axis=1)
+    resid = y0 - np.einsum("tnk,tk->tn", X, beta)
+    ybar = y0.sum(axis=1) / np.maximum(n, 1)
+    sst = (np.where(obs, y0 - ybar[:, None], 0.0) ** 2).sum(axis=1)
+    r2 = 1.0 - (np.where(obs, resid, 0.0) ** 2).sum(axis=1) / np.where(sst > 0, sst, np.nan)
+
+    beta[:, 1:][~exposed.any(axis=1)] = np.nan
+    bad = n < max(min_obs, K + 2)
+    beta[bad] = np.nan
+    r2[bad] = np.nan
+    fr = pd.DataFrame(beta, index=cube.months, columns=["alpha"] + factors)
+    return dict(factor_returns=fr, r2=pd.Series(r2, index=cube.months, name="R2"),
+                n_obs=pd.Series(n, index=cube.months, name="N"))
+
+def newey_west_tstats(fr: pd.DataFrame, lags: Optional[int] = None) -> pd.DataFrame:
+    """Mean, Newey-West standard error and t-stat of each column (Bartlett kernel).
+
+    ``lags`` defaults to ``floor(4 * (T / 100) ** (2 / 9))``.
+    """
+    out = {}
+    for col in fr.columns:
+        x = fr[col].dropna().to_numpy(dtype=float)
+        T = len(x)
+        if T < 3:
+            out[col] = dict(mean=np.nan, se=np.nan, t_stat=np.nan, N=T)
+            continue
+        L = int(np.floor(4 * (T / 100.0) ** (2.0 / 9.0))) if lags is None else int(lags)
+        e = x - x.mean()
+        var = e @ e / T
+        for l in range(1, min(L, T - 1) + 1):
+            var += 2.0 * (1.0 - l / (L + 1.0)) * (e[l:] @ e[:-l]) / T
+        se = np.sqrt(max(var, 0.0) / T)
+        out[col] = dict(mean=x.mean(), se=se, t_stat=x.mean() / se if se > 0 else np.nan, N=T)
+    return pd.DataFrame(out).T[["mean", "se", "t_stat", "N"]]
+
+def attribution(cube: FactorCube, weights: pd.DataFrame, factor_returns: pd.DataFrame) -> pd.DataFrame:
+    """Split a portfolio's monthly return into factor, alpha and specific parts.
+
+    ``weights`` is month x symbol (formation month, as in ``build_and_backtest``).
+    The exposure to factor k is ``w . z[:, k]``; its contribution is exposure
+    times that month's factor return.  ``specific`` is what the regression does
+    not explain, so the parts add up to ``total``.
+    """
+    factors = [c for c in factor_returns.columns if c != "alpha"]
+    W = weights.reindex(index=cube.months, columns=cube.symbols).to_numpy(dtype=float)
+    W = np.nan_to_num(W)
+    Z = np.nan_to_num(np.asarray(cube.z[:, :, [cube.factors.get_loc(f) for f in factors]], dtype=float))
+    y = np.asarray(cube.matrices["m_rets"], dtype=float)
+    total = np.nansum(W * y, axis=1)
+    fret = factor_returns.reindex(cube.months)
+    # a factor nobody was exposed to that month contributes nothing
+    contrib = np.einsum("tn,tnk->tk", W, Z) * fret[factors].fillna(0.0).to_numpy()
+    alpha = W.sum(axis=1) * fret["alpha"].to_numpy()
+    out = pd.DataFrame(contrib, index=cube.months, columns=factors)
+    out["alpha"] = alpha
+    out["specific"] = total - out.sum(axis=1, skipna=False)
+    out["total"] = total
+    held = weights.reindex(cube.months).notna().any(axis=1).to_numpy() & fret["alpha"].notna().to_numpy()
+    return out[held]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Multi-horizon rank IC, IC decay and rank turnover of the factor cube.
+
+The IC at horizon ``h`` is the Spearman correlation between the factor at
+month ``t`` and the return of month ``t+h`` (``h = 1`` is the next month), so
+every horizon is a shift of the same return matrix.  Each horizon is one
+masked correlation over a ``(month, symbol, factor)`` array: factor and
+return are ranked over the symbols where both are finite (average ranks for
+ties), which makes the IC the exact Spearman coefficient of those pairs.
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+from cube import FactorCube
+
+def cs_rank(a: np.ndarray) -> np.ndarray:
+    """Average ranks 0..n-1 along axis 1 (symbols); ties share their mean rank, NaN kept as NaN."""
+    x = np.moveaxis(a, 1, -1)
+    ok = np.isfinite(x)
+    order = np.argsort(np.where(ok, x, np.inf), axis=-1, kind="stable")
+    srt = np.take_along_axis(np.where(ok, x, np.inf), order, axis=-1)
+    n = x.shape[-1]
+    pos = np.broadcast_to(np.arange(n, dtype=float), x.shape)
+    first = np.ones(x.shape, dtype=bool)                 # first sorted slot of each run of equal values
+    first[..., 1:] = srt[..., 1:] != srt[..., :-1]
+    last = np.ones(x.shape, dtype=bool)
+    last[..., :-1] = first[..., 1:]
+    lo = np.maximum.accumulate(np.where(first, pos, 0.0), axis=-1)
+    hi = np.flip(np.minimum.accumulate(np.flip(np.where(last, pos, float(n)), -1), axis=-1), -1)
+    r = np.empty(x.shape, dtype=float)
+    np.put_along_axis(r, order, (lo + hi) / 2, axis=-1)
+    r[~ok] = np.nan
+    return np.moveaxis(r, -1, 1)
+
+def _masked_corr(x: np.ndarray, y: np.ndarray, axis: int, min_obs: int) -> np.ndarray:
+    """Pearson correlation along ``axis`` over the entries where both are finite."""
+    m = np.isfinite(x) & np.isfinite(y)
+    n = m.sum(axis=axis)
+    x0, y0 = np.where(m, x, 0.0), np.where(m, y, 0.0)
+    nn = np.maximum(n, 1)
+    mx = np.expand_dims(x0.sum(axis=axis) / nn, axis)
+    my = np.expand_dims(y0.sum(axis=axis) / nn, axis)
+    dx, dy = np.where(m, x0 - mx, 0.0), np.where(m, y0 - my, 0.0)
+    den = np.sqrt((dx * dx).sum(axis=axis) * (dy * dy).sum(axis=axis))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c = (dx * dy).sum(axis=axis) / den
+    c[(n < min_obs) | ~(den > 0)] = np.nan
+    return c
+
+def _spearman(x: np.ndarray, y: np.ndarray, min_obs: int) -> np.ndarray:
+    """Spearman correlation along axis 1: both sides re-ranked over their jointly finite entries."""
+    x, y = np.broadcast_arrays(x, y)
+    m = np.isfinite(x) & np.isfinite(y)
+    return _masked_corr(cs_rank(np.where(m, x, np.nan)), cs_rank(np.where(m, y, np.nan)), axis=1, min_obs=min_obs)
+
+def _nanmean(a: np.ndarray, axis: int):
+    n = np.isfinite(a).sum(axis=axis)
+    s = np.where(np.isfinite(a), a, 0.0).sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, s / np.maximum(n, 1), np.nan)
+
+def _nanstd(a: np.ndarray, axis: int):
+    n = np.isfinite(a).sum(axis=axis)
+    m = np.expand_dims(_nanmean(a, axis), axis)
+    ss = np.where(np.isfinite(a), (a - m) ** 2, 0.0).sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 1, np.sqrt(ss / np.maximum(n - 1, 1)), np.nan)
+
+def rank_ic(cube: FactorCube, horizons: Sequence[int] = range(1, 13), factors: Optional[Sequence[str]] = None,
+            min_obs: int = 30) -> Dict[str, object]:
+    """IC per (horizon, month, factor), its summary and the rank turnover of each factor.
+
+    Returns ``ic`` (long frame: date, horizon, factor, ic), ``summary`` (per
+    factor and horizon: mean IC, IC std, IC IR = mean/std, t-stat, N),
+    ``decay`` (per factor: peak horizon, half-life, mean rank autocorrelation
+    and turnover = 1 - autocorrelation) and ``turnover`` (month x factor).
+    """
+    factors = list(cube.factors if factors is None else factors)
+    hs = np.asarray(list(horizons), dtype=int)
+    fi = [cube.factors.get_loc(f) for f in factors]
+    Z = np.asarray(cube.z[:, :, fi], dtype=float)                      # (T, N, K)
+    R = np.asarray(cube.matrices["m_rets"], dtype=float)[..., None]    # (T, N, 1)
+    T = R.shape[0]
+
+    # return of month t+h is m_rets[t+h-1] (m_rets[t] already is month t -> t+1); one horizon at a time
+    # keeps the temporaries at (T, N, K)
+    ic = np.full((len(hs), T, len(factors)), np.nan)                   # (H, T, K)
+    for i, h in enumerate(hs):
+        if 0 < h <= T:
+            ic[i, :T - h + 1] = _spearman(Z[:T - h + 1], R[h - 1:], min_obs)
+
+    # rank autocorrelation month over month; turnover = 1 - autocorrelation
+    ac = np.full((T, len(factors)), np.nan)
+    if T > 1:
+        ac[1:] = _spearman(Z[1:], Z[:-1], min_obs)
+
+    months = cube.months
+    long = pd.DataFrame({
+        "date": np.tile(np.repeat(months.strftime("%Y-%m-%d"), len(factors)), len(hs)),
+        "horizon": np.repeat(hs, T * len(factors)),
+        "factor": np.tile(factors, T * len(hs)),
+        "ic": ic.reshape(-1),
+    }).dropna(subset=["ic"])
+
+    n = np.isfinite(ic).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _nanmean(ic, axis=1)
+        std = _nanstd(ic, axis=1)
+        ir = mean / std
+        tstat = ir * np.sqrt(n)
+    summary = pd.DataFrame({
+        "factor": np.tile(factors, len(hs)), "horizon": np.repeat(hs, len(factors)),
+        "mean_ic": mean.reshape(-1), "ic_std": std.reshape(-1), "ic_ir": ir.reshape(-1),
+        "t_stat": tstat.reshape(-1), "n": n.reshape(-1),
+    })
+
+    turnover = pd.DataFrame(1.0 - ac, index=months, columns=factors)
+    rows = []
+    for k, f in enumerate(factors):
+        m = mean[:, k]
+        peak = half = np.nan
+        if np.isfinite(m).any():
+            p = int(np.nanargmax(np.abs(m)))
+            peak = int(hs[p])
+            # first horizon after the peak where |IC| is at most half of the peak
+            below = np.flatnonzero(np.abs(m[p:]) <= 0.5 * abs(m[p]))
+            half = int(hs[p + below[0]]) if len(below) else np.nan
+        a = float(_nanmean(ac[:, k], axis=0))
+        rows.append(dict(factor=f, peak_horizon=peak, half_life=half, rank_autocorr=a, turnover=1.0 - a))
+    return dict(ic=long, summary=summary, decay=pd.DataFrame(rows), turnover=turnover)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Walk-forward (out-of-sample) composite from the factor cube.
+
+At each formation month ``t`` the factor weights are chosen from the monthly
+rank ICs (``h = 1``) of a training window that ends with the last month whose
+return is already known (``t - 1``), then applied to the z-scores of ``t``.
+Training statistics come from prefix sums of the IC matrix, so any expanding
+or rolling window's mean and IC IR cost O(1), and all windows (and all
+selection methods) are evaluated together as arrays instead of re-running
+the pipeline per window.
+
+Methods (``factor_weights``):
+    equal      equal weights on every factor (the in-sample composite, for reference)
+    ic         weights proportional to the positive part of the mean IC
+    ic_ir      weights proportional to the positive part of IC / std(IC)
+    top<k>     equal weights on the ``k`` factors with the best IC IR
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+from cube import FactorCube
+from analytics.ic import rank_ic
+from portfolio import build_long_short_beta_neutral_batch
+
+def window_stats(ic: np.ndarray, min_train: int = 36, window: Optional[int] = None):
+    """Mean IC, IC std and count over each month's training window, shape (T, K).
+
+    Row ``t`` covers months ``[t - window, t - 1]`` (``window=None``: expanding
+    from the first month).  Rows with fewer than ``min_train`` ICs (at most
+    ``window``) are NaN.
+    """
+    T, K = ic.shape
+    ok = np.isfinite(ic)
+    x = np.where(ok, ic, 0.0)
+    # prefix sums with a leading zero row: S[t] = sum over months < t
+    S = np.vstack([np.zeros((1, K)), np.cumsum(x, axis=0)])
+    Q = np.vstack([np.zeros((1, K)), np.cumsum(x * x, axis=0)])
+    N = np.vstack([np.zeros((1, K)), np.cumsum(ok, axis=0)])
+    t = np.arange(T)
+    lo = np.zeros(T, dtype=int) if window is None else np.clip(t - window, 0, None)
+    n = N[t] - N[lo]
+    s, q = S[t] - S[lo], Q[t] - Q[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / n
+        std = np.sqrt(np.maximum(q - n * mean * mean, 0.0) / (n - 1))
+    need = min_train if window is None else min(min_train, window)
+    bad = n < max(need, 2)
+    mean[bad] = np.nan
+    std[bad] = np.nan
+    return mean, std, n
+
+def factor_weights(mean: np.ndarray, std: np.ndarray, method: str) -> np.ndarray:
+    """(T, K) non-negative factor weights summing to 1 (NaN rows: no training yet)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ir = mean / std
+    trained = np.isfinite(mean).any(axis=1, keepdims=True)
+    if method == "equal":
+        w = np.ones_like(mean)
+    elif method == "ic":
+        w = np.clip(np.nan_to_num(mean), 0.0, None)
+    elif method == "ic_ir":
+        w = np.clip(np.nan_to_num(ir), 0.0, None)
+    elif method.startswith("top"):
+        k = int(method[3:] or 3)
+        score = np.where(np.isfinite(ir), ir, -np.inf)
+        rank = np.argsort(np.argsort(-score, axis=1, kind="stable"), axis=1)
+        w = ((rank < k) & (score > 0)).astype(float)
+    else:
+        raise ValueError(f"unknown walk-forward method {method!r}")
+    tot = w.sum(axis=1, keepdims=True)
+    return np.where(trained & (tot > 0), w / np.where(tot > 0, tot, 1.0), np.nan)
+
+def walk_forward(cube: FactorCube, factors: Sequence[str], methods: Sequence[str] = ("equal", "ic", "ic_ir", "top3"),
+                 min_train: int = 36, window: Optional[int] = None, min_liq_pctl: float = 0.2,
+                 top_q: float = 0.1, bottom_q: float = 0.1) -> Dict[str, object]:
+    """Out-of-sample beta-neutral long/short composites, one per method.
+
+    Returns ``weights`` ({name: {month: Series}} as in ``build_and_backtest``),
+    ``returns`` ({name: monthly Series}, formation-month index) and
+    ``factor_weights`` ({name: month x factor}).  Names are
+    ``COMPOSITE_WF_LS::<method>_<exp|roll<window>>``.
+    """
+    factors = list(factors)
+    ic = rank_ic(cube, horizons=[1], factors=factors)["ic"]
+    IC = ic.pivot(index="date", columns="factor", values="ic").reindex(
+        index=cube.months.strftime("%Y-%m-%d"), columns=factors).to_numpy(dtype=float)
+    mean, std, _ = window_stats(IC, min_train, window)
+
+    fi = [cube.factors.get_loc(f) for f in factors]
+    Z = np.asarray(cube.z[:, :, fi], dtype=float)                      # (T, N, K)
+    zok = np.isfinite(Z)
+    R = np.asarray(cube.matrices["m_rets"], dtype=float)
+    ADV = np.asarray(cube.matrices["adv20"], dtype=float)
+    B = np.asarray(cube.matrices["beta"], dtype=float) if "beta" in cube.matrices else np.full(R.shape, np.nan)
+    has_beta = ~np.all(np.isnan(B), axis=1, keepdims=True)
+    tag = "exp" if window is None else f"roll{window}"
+
+    out = dict(weights={}, returns={}, factor_weights={})
+    for method in methods:
+        fw = factor_weights(mean, std, method)                          # (T, K)
+        # weighted mean over the factors each symbol has (as the equal-weight composite does)
+        num = np.einsum("tnk,tk->tn", np.where(zok, Z, 0.0), np.nan_to_num(fw))
+        den = np.einsum("tnk,tk->tn", zok.astype(float), np.nan_to_num(fw))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            comp = np.where(den > 0, num / den, np.nan)
+        live = np.isfinite(fw).any(axis=1, keepdims=True) & has_beta
+        W = np.where(live, build_long_short_beta_neutral_batch(comp, B, ADV, min_liq_pctl, top_q, bottom_q, 1.0), 0.0)
+        rows = np.flatnonzero(live[:, 0])
+        if not len(rows):
+            continue
+        name = f"COMPOSITE_WF_LS::{method}_{tag}"
+        out["weights"][name] = {cube.months[t]: pd.Series(W[t], index=cube.symbols) for t in rows}
+        ret = (np.nan_to_num(W) * np.nan_to_num(R)).sum(axis=1)
+        out["returns"][name] = pd.Series(ret[rows], index=cube.months[rows])
+        out["factor_weights"][name] = pd.DataFrame(fw[rows], index=cube.months[rows], columns=factors)
+    return out
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Command line entry point with one subcommand per stage.
+
+    python cli.py status
+    python cli.py fetch-prices --symbols AAPL,MSFT --start 2020-01-01
+    python cli.py fetch-fundamentals
+    python cli.py betas
+    python cli.py factors
+    python cli.py backtest --optimizer min_var
+    python cli.py report --top 10
+    python cli.py build-reports
+
+Only the standard library is imported at startup; each subcommand imports the
+modules it needs (pandas, numpy, the HTTP clients) when it runs, so ``--help``,
+``status`` and ``report`` start in a few tens of milliseconds.  ``--timing``
+logs the startup and total wall time.
+"""
+import time
+_T0 = time.perf_counter()
+
+import os, sys, argparse, logging, sqlite3
+from contextlib import contextmanager
+
+import config
+
+def _elapsed_ms() -> float:
+    return (time.perf_counter() - _T0) * 1000.0
+
+@contextmanager
+def _writing():
+    from data.db import init_db, start_writer, stop_writer
+    init_db()
+    start_writer()
+    try:
+        yield
+    finally:
+        stop_writer()
+
+def _db_symbols():
+    from data.db import connection
+    return [r[0] for r in connection().execute("SELECT symbol FROM universe ORDER BY symbol")]
+
+def _symbols(args):
+    if args.symbols:
+        return [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    return None
+
+def cmd_fetch_prices(args):
+    import run_study as rs
+    with _writing():
+        syms = _symbols(args) or _db_symbols()
+        if not syms:
+            uni, _, _ = rs.prepare_universe(args.include_delisted == 1, args.universe_size, args.seed)
+            syms = uni["symbol"].tolist()
+        got = rs.fetch_price_data(syms, args.start, args.end, persist_benchmark=True) or {}
+        rs.fetch_rotation_prices(args.start, args.end)
+    logging.info("Precios: %d/%d símbolos actualizados", len(got), len(syms) + 1)
+
+def cmd_fetch_fundamentals(args):
+    import run_study as rs
+    with _writing():
+        engine, _, _, _ = rs.load_panels(_symbols(args), args.start, args.end)
+        syms = [s for s in engine.get("close").columns if s != config.BENCHMARK]
+        if not syms:
+            logging.error("Sin precios en la DB: ejecuta fetch-prices primero.")
+            return 1
+        rs.compute_factors(syms, engine)
+    logging.info("Fundamentales: %d símbolos", len(syms))
+
+def cmd_betas(args):
+    import run_study as rs
+    with _writing():
+        engine, _, _, _ = rs.load_panels(_symbols(args), args.start, args.end)
+        betas = rs.compute_betas(engine)
+    if betas is None:
+        logging.error("Sin precios de %s en la DB: no se pueden calcular betas.", config.BENCHMARK)
+        return 1
+    logging.info("Betas mensuales: %s", betas.shape)
+
+def cmd_factors(args):
+    import run_study as rs
+    from factors import FACTORS
+    facs = [f.strip() for f in args.factors.split(",") if f.strip()] if args.factors else None
+    unknown = sorted(set(facs or ()) - set(FACTORS))
+    if unknown:
+        logging.error("Factores desconocidos: %s (disponibles: %s)", ", ".join(unknown), ", ".join(FACTORS))
+        return 2
+    with _writing():
+        engine, betas, industries, log_mcap = rs.load_panels(_symbols(args), args.start, args.end)
+        if engine.get("close").empty:
+            logging.error("Sin precios en la DB: ejecuta fetch-prices primero.")
+            return 1
+        cube = rs.factor_stage(engine, betas, industries, log_mcap, facs)
+    logging.info("Factores: cubo %s", cube.shape)
+
+def cmd_backtest(args):
+    import run_study as rs
+    try:
+        strategies = rs.parse_strategies(args.strategies)
+    except KeyError as e:
+        logging.error("%s", e)
+        return 2
+    msg = rs.monthly_only(args.rebalance, args.optimizer, args.walk_forward)
+    if msg:
+        logging.error("%s", msg)
+        return 2
+    with _writing():
+        engine, betas, industries, log_mcap = rs.load_panels(_symbols(args), args.start, args.end)
+        if engine.get("close").empty:
+            logging.error("Sin precios en la DB: ejecuta fetch-prices primero.")
+            return 1
+        rs.cross_sectional(engine, betas, industries, log_mcap, args.optimizer, args.rebalance, args.walk_forward,
+                           strategies)
+
+def cmd_build_reports(args):
+    from data.db import init_db
+    from report_builder import build_reports
+    init_db()
+    done = build_reports(args.out, force=args.force, workers=args.workers)
+    print(f"{len(done)} informes regenerados en {args.out or config.REPORTS_DIR}")
+
+def _open_existing():
+    if not os.path.exists(config.DB_PATH):
+        print(f"{config.DB_PATH}: no existe", file=sys.stderr)
+        return None
+    # read-only URI: a status check never creates or migrates the store
+    return sqlite3.connect(f"file:{os.path.abspath(config.DB_PATH)}?mode=ro", uri=True)
+
+def cmd_report(args):
+    conn = _open_existing()
+    if conn is None:
+        return 1
+    try:
+        rows = conn.execute("SELECT strategy, CAGR, AnnVol, Sharpe, Sortino, MaxDD, HitRate, N FROM performance "
+                            "ORDER BY CAGR DESC LIMIT ?", (args.top,)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    if not rows:
+        print("Sin resultados: ejecuta backtest primero.")
+        return 1
+    width = max(len("strategy"), *(len(r[0]) for r in rows))
+    cols = ["CAGR", "AnnVol", "Sharpe", "Sortino", "MaxDD", "HitRate", "N"]
+    print(f"{'strategy':<{width}} " + " ".join(f"{c:>8}" for c in cols))
+    for r in rows:
+        print(f"{r[0]:<{width}} " + " ".join("     nan" if v is None else f"{v:>8.3f}" for v in r[1:-1])
+              + f" {r[-1] or 0:>8d}")
+
+STATUS_TABLES = [("universe", None), ("prices_daily", "date"), ("factors_static", "as_of"),
+                 ("betas_monthly", "date"), ("weights", "date"), ("portfolio_returns", "date"),
+                 ("performance", None), ("factor_ic", "date")]
+
+def cmd_status(args):
+    conn = _open_existing()
+    if conn is None:
+        return 1
+    try:
+        print(f"{config.DB_PATH} ({os.path.getsize(config.DB_PATH) / 1e6:.1f} MB)")
+        for table, date_col in STATUS_TABLES:
+            try:
+                n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                rng = conn.execute(f"SELECT MIN({date_col}), MAX({date_col}) FROM {table}").fetchone() \
+                    if date_col else None
+            except sqlite3.OperationalError:
+                print(f"  {table:<18} (no existe)")
+                continue
+            print(f"  {table:<18} {n:>10,d}" + (f"  {rng[0]} .. {rng[1]}" if rng and rng[0] else ""))
+    finally:
+        conn.close()
+    cube = os.path.join(config.CUBE_DIR, "index.json") if config.CUBE_DIR else ""
+    print(f"  cube               {'sí' if cube and os.path.exists(cube) else 'no'}")
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="cli.py", description="Factor study stages")
+    ap.add_argument("--log", default="INFO")
+    ap.add_argument("--timing", action="store_true", help="log startup and total wall time")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    def stage(name, fn, help_):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument("--start", default=config.DEFAULT_START)
+        p.add_argument("--end", default=config.DEFAULT_END)
+        p.add_argument("--symbols", default=None, help="comma-separated; default: the universe in the DB")
+        p.set_defaults(fn=fn)
+        return p
+
+    p = stage("fetch-prices", cmd_fetch_prices, "incremental EOD prices (NDL)")
+    p.add_argument("--universe-size", type=int, default=500, help="only used when the DB has no universe yet")
+    p.add_argument("--include-delisted", type=int, default=1)
+    p.add_argument("--seed", type=int, default=42)
+    stage("fetch-fundamentals", cmd_fetch_fundamentals, "static factors + alt-data for priced symbols")
+    stage("betas", cmd_betas, "monthly betas from stored prices")
+    p = stage("factors", cmd_factors, "neutralized factor z-scores (cube), IC and Fama-MacBeth; no portfolios")
+    p.add_argument("--factors", default=None, help="comma-separated factor names (default: all)")
+    p = stage("backtest", cmd_backtest, "neutralization, portfolios and results from the DB")
+    p.add_argument("--optimizer", choices=["min_var", "mean_variance", "max_sharpe", "downside"], default=None)
+    p.add_argument("--rebalance", choices=["M", "W", "D"], default="M")
+    p.add_argument("--walk-forward", choices=["expanding", "rolling"], default=None,
+                   help="out-of-sample composites (monthly rebalance only)")
+    p.add_argument("--strategies", default=None, help="comma-separated strategy names (default: all)")
+
+    p = sub.add_parser("report", help="performance summary from the DB")
+    p.add_argument("--top", type=int, default=20)
+    p.set_defaults(fn=cmd_report)
+    p = sub.add_parser("build-reports", help="static HTML tearsheets (only changed strategies)")
+    p.add_argument("--out", default=None, help="default: $REPORTS_DIR")
+    p.add_argument("--force", action="store_true", help="ignore the manifest and render everything")
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(fn=cmd_build_reports)
+    sub.add_parser("status", help="row counts and date ranges of the DB").set_defaults(fn=cmd_status)
+    return ap
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=getattr(logging, args.log.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s: %(message)s",
+    )
+    if args.timing:
+        logging.info("Arranque: %.0f ms", _elapsed_ms())
+    rc = args.fn(args) or 0
+    if args.timing:
+        logging.info("%s: %.0f ms total", args.command, _elapsed_ms())
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main())
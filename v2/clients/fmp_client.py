@@ -1,22 +1,34 @@
 # -*- coding: utf-8 -*-
-import time, json, logging, requests, os
+import time, json, logging, requests, os, re, threading
 from typing import Optional, Dict, Any
-from http_cache import cache_get, cache_set
+from http_cache import cache_get, cache_set, neg_cache_get, neg_cache_set
+from clients.retry import BUDGET, is_permanent, retry_after, quiet_insecure_warnings
 
 BASE_URL = "https://financialmodelingprep.com"
 API_ENV_KEYS = ["FMP_API_KEY", "FMP_KEY", "FMP_TOKEN"]
 RATE_LIMIT_QPS = float(os.getenv("FMP_QPS", "4"))
 
 _last=[0.0]
+_throttle_lock = threading.Lock()  # price-source pools call fmp_get from several threads
+# Endpoints answered with 401/403 (key or plan without access): skip them for the rest of the run
+_denied_paths=set()
+MAX_ATTEMPTS = 5
+
+def endpoint_key(path: str) -> str:
+    """Path without a trailing symbol segment: ``/api/v3/profile/AAPL`` -> ``/api/v3/profile``."""
+    return re.sub(r"/[A-Z0-9.^=-]+$", "", path)
+
 def _throttle():
     import time as _t
-    now=_t.time()
-    if _last[0]:
-        dt = now - _last[0]
-        need = 1.0/max(RATE_LIMIT_QPS,1e-6)
-        if dt < need:
-            _t.sleep(need-dt)
-    _last[0]=_t.time()
+    # held across the sleep: each caller waits for its own slot, so threads cannot exceed the rate together
+    with _throttle_lock:
+        now=_t.time()
+        if _last[0]:
+            dt = now - _last[0]
+            need = 1.0/max(RATE_LIMIT_QPS,1e-6)
+            if dt < need:
+                _t.sleep(need-dt)
+        _last[0]=_t.time()
 
 def _get_api_key() -> Optional[str]:
     """Return the first Financial Modeling Prep API key found in the environment."""
@@ -35,10 +47,20 @@ def fmp_get(path: str, params: Optional[Dict[str, Any]] = None):
     cached = cache_get("GET", url, params)
     if cached is not None:
         return cached
-    for attempt in range(5):
+    endpoint = endpoint_key(path)
+    if endpoint in _denied_paths:
+        return None
+    if neg_cache_get("GET", url, params) is not None:
+        return None
+    quiet_insecure_warnings()
+    status = None
+    tries = 0
+    for attempt in range(MAX_ATTEMPTS):
+        tries += 1
         try:
             _throttle()
             r = requests.get(url, params=params, timeout=30, verify=False)
+            status = r.status_code
             if r.status_code==200:
                 try:
                     payload=r.json()
@@ -46,12 +68,20 @@ def fmp_get(path: str, params: Optional[Dict[str, Any]] = None):
                     payload=json.loads(r.text)
                 cache_set("GET", url, params, payload)
                 return payload
-            if r.status_code in (429,502,503,504):
-                time.sleep(1.0*(attempt+1))
-            else:
-                logging.warning("FMP non-200 %s: %s", r.status_code, r.text[:200])
-                time.sleep(0.8*(attempt+1))
+            if is_permanent(r.status_code):
+                logging.warning("FMP permanent %s %s: %s", r.status_code, path, r.text[:200])
+                neg_cache_set("GET", url, params, r.status_code, permanent=True)
+                if r.status_code in (401, 403):
+                    _denied_paths.add(endpoint)
+                return None
+            logging.warning("FMP non-200 %s: %s", r.status_code, r.text[:200])
+            delay = retry_after(r) or 1.0*(attempt+1)
         except Exception as e:
             logging.warning("FMP error %s: %s", url, e)
-            time.sleep(1.0*(attempt+1))
+            delay = 1.0*(attempt+1)
+        if attempt == MAX_ATTEMPTS - 1 or not BUDGET.sleep(delay):
+            break
+    # cut short by the retry budget: not enough evidence to skip this URL on later runs
+    if tries == MAX_ATTEMPTS:
+        neg_cache_set("GET", url, params, status, permanent=False)
     return None
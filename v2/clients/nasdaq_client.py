@@ -1,10 +1,12 @@
 # nasdaq_client.py
 import time, json, logging, requests, os
 from typing import Optional, Dict, Any
-from http_cache import cache_get, cache_set
+from http_cache import cache_get, cache_set, neg_cache_get, neg_cache_set
+from clients.retry import BUDGET, is_permanent, retry_after, quiet_insecure_warnings
 
 NDL_BASE = "https://data.nasdaq.com/api/v3"
 API_ENV_KEYS = ["NDL_API_KEY", "NASDAQ_API_KEY", "QUANDL_API_KEY"]
+MAX_ATTEMPTS = 4
 
 def _get_api_key() -> Optional[str]:
     for k in API_ENV_KEYS:
@@ -13,7 +15,8 @@ def _get_api_key() -> Optional[str]:
             return v
     return None
 
-def ndl_get(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+def ndl_get(path: str, params: Optional[Dict[str, Any]] = None, cache: bool = True) -> Optional[Any]:
+    """GET an NDL endpoint; ``cache=False`` bypasses the response cache (callers with a cache of their own)."""
     params = params.copy() if params else {}
     key = _get_api_key()
     if key and "api_key" not in params:
@@ -21,18 +24,26 @@ def ndl_get(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]
 
     url = path if path.startswith("http") else f"{NDL_BASE}{path}"
 
-    cached = cache_get("GET", url, params)
+    cached = cache_get("GET", url, params) if cache else None
     if cached is not None:
         # Debug summary for cached hits
         if "datatable" in cached:
             rows = len(cached["datatable"].get("data", []))
             logging.debug("NDL (cached) %s rows=%s meta=%s", url, rows, cached.get("meta"))
         return cached
+    if neg_cache_get("GET", url, params) is not None:
+        logging.debug("NDL (neg-cached) %s", url)
+        return None
 
-    for attempt in range(4):
+    quiet_insecure_warnings()
+    status = None
+    tries = 0
+    for attempt in range(MAX_ATTEMPTS):
+        tries += 1
         try:
             r = requests.get(url, params=params, timeout=30, verify=False)
             logging.debug("NDL GET %s | status=%s | params=%s", r.url, r.status_code, params)
+            status = r.status_code
 
             if r.status_code == 200:
                 try:
@@ -51,18 +62,23 @@ def ndl_get(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]
                 else:
                     logging.debug("NDL 200 (non-datatable) keys=%s", list(payload.keys())[:6])
 
-                cache_set("GET", url, params, payload)
+                if cache:
+                    cache_set("GET", url, params, payload)
                 return payload
 
             # Non-200: show short body
             body = (r.text or "")[:300]
             logging.warning("NDL non-200 %s: %s", r.status_code, body)
-            if r.status_code in (429, 502, 503, 504):
-                time.sleep(1.0 * (attempt + 1))
-            else:
-                break
+            if is_permanent(r.status_code):
+                neg_cache_set("GET", url, params, r.status_code, permanent=True)
+                return None
+            delay = retry_after(r) or 1.0 * (attempt + 1)
         except Exception as e:
             logging.warning("NDL req error: %s", e)
-            time.sleep(1.0 * (attempt + 1))
+            delay = 1.0 * (attempt + 1)
+        if attempt == MAX_ATTEMPTS - 1 or not BUDGET.sleep(delay):
+            break
+    # cut short by the retry budget: not enough evidence to skip this URL on later runs
+    if tries == MAX_ATTEMPTS:
+        neg_cache_set("GET", url, params, status, permanent=False)
     return None
-
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Shared retry policy for the HTTP clients.
+
+Errors are split into permanent (bad key, unknown/delisted symbol: retrying
+cannot help) and transient (throttling, gateway errors, timeouts).  Every
+retry of a run draws from one process-wide ``BUDGET`` so that a flaky API
+degrades to single attempts instead of stalling the whole study.
+"""
+import os, time, logging, threading
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+MAX_RETRY_AFTER_S = float(os.getenv("HTTP_MAX_RETRY_AFTER_S", "60"))
+
+def is_permanent(status: int) -> bool:
+    """4xx other than throttling/timeouts will not succeed on retry."""
+    return 400 <= status < 500 and status not in TRANSIENT_STATUS
+
+def retry_after(r) -> Optional[float]:
+    """Seconds requested by a ``Retry-After`` header (delta or HTTP-date), capped."""
+    v = (getattr(r, "headers", None) or {}).get("Retry-After")
+    if not v:
+        return None
+    try:
+        secs = float(v)
+    except ValueError:
+        try:
+            secs = parsedate_to_datetime(v).timestamp() - time.time()
+        except Exception:
+            return None
+    return min(max(secs, 0.0), MAX_RETRY_AFTER_S)
+
+_quiet = [False]
+def quiet_insecure_warnings():
+    """Silence urllib3's InsecureRequestWarning (both clients use verify=False), on first request only."""
+    if not _quiet[0]:
+        import urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        _quiet[0] = True
+
+class RetryBudget:
+    """Per-run allowance of retries and seconds spent sleeping between them."""
+
+    def __init__(self, max_retries: int, max_sleep_s: float):
+        self.max_retries = max_retries
+        self.max_sleep_s = max_sleep_s
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.retries = 0
+            self.slept_s = 0.0
+            self.denied = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.retries >= self.max_retries or self.slept_s >= self.max_sleep_s
+
+    def sleep(self, delay: float) -> bool:
+        """Sleep ``delay`` seconds before a retry if the budget allows it.
+
+        Returns False (without sleeping) once the budget is spent; the caller
+        should then give up on the request.
+        """
+        with self._lock:
+            if self.exhausted:
+                if not self.denied:
+                    logging.warning("HTTP retry budget exhausted (%d retries, %.0fs slept): "
+                                    "further failures will not be retried", self.retries, self.slept_s)
+                self.denied += 1
+                return False
+            delay = min(max(delay, 0.0), self.max_sleep_s - self.slept_s)
+            self.retries += 1
+            self.slept_s += delay
+        time.sleep(delay)
+        return True
+
+    def summary(self) -> dict:
+        return dict(retries=self.retries, slept_s=round(self.slept_s, 1), denied=self.denied)
+
+BUDGET = RetryBudget(int(os.getenv("HTTP_RETRY_BUDGET", "200")),
+                     float(os.getenv("HTTP_SLEEP_BUDGET_S", "300")))
@@ -3,7 +3,14 @@ import os
 from datetime import datetime
 
 OUT_DIR = os.getenv("OUT_DIR", "./out")
+# Memory-mapped factor cube export (empty string disables it)
+CUBE_DIR = os.getenv("CUBE_DIR", os.path.join(OUT_DIR, "cube"))
 DB_PATH  = os.getenv("DB_PATH", "./factor_study.db")
+# Static tearsheets (report_builder.py); 0 workers = one per CPU
+REPORTS_DIR = os.getenv("REPORTS_DIR", os.path.join(OUT_DIR, "reports"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "0"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_KB  = int(os.getenv("DB_CACHE_KB", "65536"))
 
 DEFAULT_START = "2015-01-01"
 DEFAULT_END   = datetime.utcnow().date().isoformat()
@@ -14,3 +21,16 @@ TOP_Q = 0.10
 BOTTOM_Q = 0.10
 MIN_LIQ_PCTL = 0.20
 BETA_WINDOW_D = 252
+BENCHMARK = "SPY"
+
+# Intermarket beta rotation (notebook 02): "DEFENSIVE:MARKET" pairs x lookbacks (in rebalance periods)
+ROTATION_PAIRS = os.getenv("ROTATION_PAIRS", "XLU:VTI")
+ROTATION_LOOKBACKS = [int(x) for x in os.getenv("ROTATION_LOOKBACKS", "2,4,8,13").split(",") if x.strip()]
+ROTATION_FREQ = os.getenv("ROTATION_FREQ", "W")
+ROTATION_COST_BPS = float(os.getenv("ROTATION_COST_BPS", "0"))
+
+# Walk-forward composite (analytics/walk_forward.py): months in the rolling training window,
+# minimum months of IC history before the first out-of-sample month, selection methods
+WF_TRAIN_MONTHS = int(os.getenv("WF_TRAIN_MONTHS", "60"))
+WF_MIN_TRAIN = int(os.getenv("WF_MIN_TRAIN", "36"))
+WF_METHODS = [m.strip() for m in os.getenv("WF_METHODS", "equal,ic,ic_ir,top3").split(",") if m.strip()]
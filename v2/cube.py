@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Month x symbol x factor cube of neutralized z-scores, stored as memory-mapped arrays.
+
+Layout of a cube directory::
+
+    index.json        {"months": [...], "symbols": [...], "factors": [...]}
+    zscores.npy       float64 (month, symbol, factor)
+    m_rets.npy        float64 (month, symbol)  next-month returns
+    adv20.npy         float64 (month, symbol)
+    beta.npy          float64 (month, symbol)
+
+``open_cube`` maps the ``.npy`` files read-only (``np.load(mmap_mode="r")``),
+so opening is instant regardless of size and slices are only paged in when
+touched.  ``CubeWriter`` fills the cube month by month from
+``build_and_backtest`` and publishes it atomically; without a directory it
+keeps the arrays in memory so later stages can reuse the z-scores directly.
+"""
+import os, json, shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+MATRICES = ("m_rets", "adv20", "beta")
+
+class FactorCube:
+    """Labelled, lazily sliced view over the cube arrays."""
+
+    def __init__(self, months: pd.DatetimeIndex, symbols: pd.Index, factors: pd.Index,
+                 z: np.ndarray, matrices: Dict[str, np.ndarray]):
+        self.months, self.symbols, self.factors = months, symbols, factors
+        self.z = z
+        self.matrices = matrices
+
+    @property
+    def shape(self):
+        return self.z.shape
+
+    def factor(self, name: str) -> pd.DataFrame:
+        """month x symbol panel of one factor (a strided view, no copy)."""
+        return pd.DataFrame(self.z[:, :, self.factors.get_loc(name)], index=self.months,
+                            columns=self.symbols, copy=False)
+
+    def month(self, dt) -> pd.DataFrame:
+        """symbol x factor z-scores for one month."""
+        return pd.DataFrame(self.z[self.months.get_loc(pd.Timestamp(dt))], index=self.symbols,
+                            columns=self.factors, copy=False)
+
+    def matrix(self, name: str) -> pd.DataFrame:
+        return pd.DataFrame(self.matrices[name], index=self.months, columns=self.symbols, copy=False)
+
+def open_cube(path: str, mmap_mode: Optional[str] = "r") -> FactorCube:
+    with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+        idx = json.load(f)
+    z = np.load(os.path.join(path, "zscores.npy"), mmap_mode=mmap_mode)
+    mats = {m: np.load(os.path.join(path, f"{m}.npy"), mmap_mode=mmap_mode)
+            for m in MATRICES if os.path.exists(os.path.join(path, f"{m}.npy"))}
+    return FactorCube(pd.DatetimeIndex(idx["months"]), pd.Index(idx["symbols"]), pd.Index(idx["factors"]), z, mats)
+
+class CubeWriter:
+    """Fill a cube month by month; ``path=None`` keeps it in memory."""
+
+    def __init__(self, path: Optional[str], months: pd.DatetimeIndex, symbols: Sequence[str],
+                 factors: Sequence[str]):
+        self.path = path
+        self.months, self.symbols, self.factors = pd.DatetimeIndex(months), pd.Index(symbols), pd.Index(factors)
+        shape = (len(self.months), len(self.symbols), len(self.factors))
+        self._tmp = None
+        if path:
+            self._tmp = f"{path.rstrip(os.sep)}.tmp"
+            shutil.rmtree(self._tmp, ignore_errors=True)
+            os.makedirs(self._tmp)
+            self.z = np.lib.format.open_memmap(os.path.join(self._tmp, "zscores.npy"), mode="w+",
+                                               dtype=np.float64, shape=shape)
+            self.z[:] = np.nan
+        else:
+            self.z = np.full(shape, np.nan)
+        self.matrices: Dict[str, np.ndarray] = {}
+
+    def write_month(self, dt, zdf: pd.DataFrame):
+        i = self.months.get_loc(pd.Timestamp(dt))
+        self.z[i] = zdf.reindex(index=self.symbols, columns=self.factors).to_numpy(dtype=np.float64)
+
+    def write_matrix(self, name: str, df: Optional[pd.DataFrame]):
+        if df is None:
+            return
+        vals = df.reindex(index=self.months, columns=self.symbols).to_numpy(dtype=np.float64)
+        if self._tmp:
+            arr = np.lib.format.open_memmap(os.path.join(self._tmp, f"{name}.npy"), mode="w+",
+                                            dtype=np.float64, shape=vals.shape)
+            arr[:] = vals
+            arr.flush()
+        else:
+            arr = vals
+        self.matrices[name] = arr
+
+    def close(self) -> FactorCube:
+        """Flush and publish (rename ``<path>.tmp`` -> ``<path>``); returns the cube.
+
+        A previous cube is renamed aside first and deleted only once the new
+        one is in place, so ``<path>`` always holds a complete cube (or, if
+        the publish is interrupted, ``<path>.old`` still does).
+        """
+        if not self._tmp:
+            return FactorCube(self.months, self.symbols, self.factors, self.z, self.matrices)
+        self.z.flush()
+        with open(os.path.join(self._tmp, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"months": [d.strftime("%Y-%m-%d") for d in self.months],
+                       "symbols": [str(s) for s in self.symbols],
+                       "factors": [str(f_) for f_ in self.factors]}, f)
+        del self.z, self.matrices
+        old = f"{self.path.rstrip(os.sep)}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(self._tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        return open_cube(self.path)
@@ -5,22 +5,23 @@ from config import DB_PATH
 st.set_page_config(page_title="Factor Study Dashboard", layout="wide")
 
 @st.cache_data(show_spinner=False)
-def read_table(name: str) -> pd.DataFrame:
+def read_query(sql: str, params: tuple = ()) -> pd.DataFrame:
     if not os.path.exists(DB_PATH):
         return pd.DataFrame()
     con = sqlite3.connect(DB_PATH)
     try:
-        return pd.read_sql_query(f"SELECT * FROM {name}", con)
+        return pd.read_sql_query(sql, con, params=params)
     finally:
         con.close()
 
+def read_table(name: str) -> pd.DataFrame:
+    return read_query(f"SELECT * FROM {name}")
+
 st.title("📊 Factor Study Dashboard")
 
 perf = read_table("performance")
-rets = read_table("portfolio_returns")
-weights = read_table("weights")
 
-if perf.empty or rets.empty:
+if perf.empty:
     st.warning("Aún no hay datos en la base. Ejecuta `run_study.py` primero.")
     st.stop()
 
@@ -34,20 +35,39 @@ st.dataframe(perf.sort_values("CAGR", ascending=False).style.format({
 strats = sorted(perf["strategy"].unique())
 sel = st.multiselect("Estrategías a visualizar", options=strats, default=strats[:3])
 
-# --- Equity curves
-st.subheader("Curvas de capital (mensual)")
+# --- Equity curves: monthly strategies and the daily series of --rebalance D/W (suffix @D / @W) apart,
+# a chart mixing month-end and daily points would not be comparable
 if sel:
+    # filtering by strategy reads only those strategies' rows (tables are clustered by strategy, date)
+    rets = read_query(f"SELECT date, strategy, ret FROM portfolio_returns WHERE strategy IN ({','.join('?' * len(sel))})",
+                      tuple(sel))
     rets["date"] = pd.to_datetime(rets["date"])
     pivot = rets.pivot(index="date", columns="strategy", values="ret").sort_index()
-    eq = (1 + pivot.fillna(0)).cumprod()
-    st.line_chart(eq[sel])
+    daily = [s for s in sel if s.endswith(("@D", "@W")) and s in pivot]
+    monthly = [s for s in sel if s not in daily and s in pivot]
+    for title, cols in (("Curvas de capital (mensual)", monthly), ("Curvas de capital (diaria, @D / @W)", daily)):
+        if cols:
+            st.subheader(title)
+            eq = (1 + pivot[cols].dropna(how="all").fillna(0)).cumprod()
+            st.line_chart(eq)
 
 # --- Weights snapshot (último mes) para estrategia elegida
 st.subheader("Top 20 pesos último mes")
 one = st.selectbox("Estrategia", options=strats, index=0)
-wdf = weights.copy()
-wdf["date"] = pd.to_datetime(wdf["date"])
-if one and not wdf.empty:
-    last = wdf[wdf["strategy"]==one]["date"].max()
-    wlast = wdf[(wdf["strategy"]==one) & (wdf["date"]==last)].sort_values("weight", ascending=False).head(20)
-    st.bar_chart(wlast.set_index("symbol")["weight"])
+if one:
+    wlast = read_query("SELECT symbol, weight FROM weights WHERE strategy = ? AND date = "
+                       "(SELECT MAX(date) FROM weights WHERE strategy = ?) ORDER BY weight DESC LIMIT 20", (one, one))
+    if not wlast.empty:
+        st.bar_chart(wlast.set_index("symbol")["weight"])
+
+# --- IC por horizonte / decaimiento
+st.subheader("Rank IC por horizonte (meses)")
+try:
+    ics = read_table("factor_ic_summary")
+    decay = read_table("factor_decay")
+except Exception:
+    ics = decay = pd.DataFrame()
+if not ics.empty:
+    st.line_chart(ics.pivot(index="horizon", columns="factor", values="mean_ic"))
+    st.dataframe(ics[ics["horizon"] == 1].set_index("factor")[["mean_ic", "ic_std", "ic_ir", "t_stat", "n"]]
+                 .join(decay.set_index("factor")), use_container_width=True)
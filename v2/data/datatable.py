@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Typed columnar decoder for Nasdaq Data Link ``datatable`` payloads.
+
+NDL answers ``{"datatable": {"data": [[...], ...], "columns": [{"name", "type"}]}}``.
+Instead of building an object-dtype DataFrame per page and fixing dtypes after
+``pd.concat``, ``DatatableReader`` uses the ``columns`` type metadata to decode
+every page straight into preallocated typed arrays (datetime64, float64 and
+integer codes for string columns), growing them geometrically across cursor
+pages.  String columns come out as ``pd.Categorical``.  Unparseable date or
+numeric cells are coerced to NaT / NaN and remembered, so ``frame`` can drop
+those rows.
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+
+_NUMERIC_TYPES = ("bigdecimal", "double", "float", "integer", "int", "long", "number")
+
+def _kind(ndl_type: Optional[str]) -> str:
+    t = (ndl_type or "").lower()
+    if t.startswith("date"):
+        return "date"
+    if t.startswith(_NUMERIC_TYPES):
+        return "num"
+    return "str"
+
+_DTYPES = {"date": "datetime64[ns]", "num": "float64", "str": "int32"}
+
+class DatatableReader:
+    """Accumulate one or more datatable pages into typed column arrays."""
+
+    def __init__(self, capacity: int = 0):
+        self.columns: Optional[list] = None
+        self.kinds: Dict[str, str] = {}
+        self.n = 0
+        self._cap = capacity
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._cats: Dict[str, dict] = {}
+        self._bad: Dict[str, list] = {}  # column -> arrays of row positions with unparseable cells
+
+    def _init_columns(self, cols: Sequence[dict]):
+        self.columns = [c["name"] for c in cols]
+        self.kinds = {c["name"]: _kind(c.get("type")) for c in cols}
+        self._arrays = {name: np.empty(self._cap, dtype=_DTYPES[k]) for name, k in self.kinds.items()}
+        self._cats = {name: {} for name, k in self.kinds.items() if k == "str"}
+
+    def _reserve(self, need: int):
+        if need <= self._cap:
+            return
+        cap = max(need, 2 * self._cap, 1024)
+        for name, arr in self._arrays.items():
+            grown = np.empty(cap, dtype=arr.dtype)
+            grown[:self.n] = arr[:self.n]
+            self._arrays[name] = grown
+        self._cap = cap
+
+    def add_page(self, obj: Optional[dict]) -> int:
+        """Decode one payload page; returns the number of rows appended."""
+        if not obj or "datatable" not in obj:
+            return 0
+        table = obj["datatable"]
+        cols = table.get("columns") or []
+        if self.columns is None:
+            if not cols:
+                return 0
+            self._init_columns(cols)
+        elif [c["name"] for c in cols] != self.columns:
+            raise ValueError(f"datatable columns changed between pages: {[c['name'] for c in cols]}")
+        data = table.get("data") or []
+        if not data:
+            return 0
+        m = len(data)
+        self._reserve(self.n + m)
+        lo, hi = self.n, self.n + m
+        for name, col in zip(self.columns, zip(*data)):
+            kind = self.kinds[name]
+            dst = self._arrays[name]
+            if kind in ("num", "date"):
+                try:
+                    dst[lo:hi] = np.array(col, dtype=_DTYPES[kind])
+                except (TypeError, ValueError):
+                    # a stray unparseable cell becomes NaN / NaT instead of failing the page
+                    raw = pd.Series(col, dtype=object)
+                    val = pd.to_numeric(raw, errors="coerce") if kind == "num" \
+                        else pd.to_datetime(raw, errors="coerce")
+                    dst[lo:hi] = val.to_numpy(dtype=_DTYPES[kind])
+                    self._bad.setdefault(name, []).append(lo + np.flatnonzero(val.isna() & raw.notna()))
+            else:
+                cat = self._cats[name]
+                dst[lo:hi] = [-1 if v is None else cat.setdefault(v, len(cat)) for v in col]
+        self.n = hi
+        return m
+
+    def __len__(self):
+        return self.n
+
+    def frame(self, keys: Sequence[str] = ("ticker", "date"), index: Optional[str] = None,
+              columns: Optional[Sequence[str]] = None, keep: str = "first",
+              required: Sequence[str] = ()) -> pd.DataFrame:
+        """Return the accumulated rows as a typed DataFrame.
+
+        Rows with an unparseable cell in a date key or in a ``required`` column
+        are dropped first (a null cell is kept as NaN).  Rows are then sorted by
+        ``keys`` (those present), duplicated keys are dropped (``keep`` "first"
+        or "last" received wins) and rows with a missing date key are discarded.
+        ``index`` optionally promotes one column to the index.
+        """
+        if self.columns is None:
+            return pd.DataFrame(columns=list(columns or []))
+        n = self.n
+        arrs = {name: a[:n] for name, a in self._arrays.items()}
+        keys = [k for k in keys if k in arrs]
+        take = None
+        bad = [np.concatenate(self._bad[c]) for c in set(keys) | set(required) if c in self._bad]
+        if bad:
+            take = np.setdiff1d(np.arange(n), np.concatenate(bad))
+        if keys and n:
+            rows = take
+            key_arrs = [arrs[k] if rows is None else arrs[k][rows] for k in keys]
+            key_arrs = [a.view("int64") if self.kinds[k] == "date" else a for k, a in zip(keys, key_arrs)]
+            order = np.lexsort(key_arrs[::-1])
+            take = order if rows is None else rows[order]
+            mask = np.ones(len(take), dtype=bool)
+            if len(take) > 1:
+                sorted_keys = [k[order] for k in key_arrs]
+                new = np.logical_or.reduce([np.diff(k) != 0 for k in sorted_keys])
+                # lexsort is stable: within equal keys rows stay in arrival order
+                if keep == "last":
+                    mask[:-1] = new
+                else:
+                    mask[1:] = new
+            for k in keys:
+                if self.kinds[k] == "date":
+                    mask &= ~np.isnat(arrs[k][take])
+            take = take[mask]
+        out_cols = [c for c in (columns or self.columns) if c in arrs and c != index]
+        data = {}
+        for name in out_cols + ([index] if index else []):
+            a = arrs[name] if take is None else arrs[name][take]
+            if self.kinds[name] == "str":
+                a = pd.Categorical.from_codes(a, categories=list(self._cats[name]))
+            data[name] = a
+        idx = None
+        if index:
+            ix = data.pop(index)
+            idx = pd.DatetimeIndex(ix, name=index) if self.kinds[index] == "date" else pd.Index(ix, name=index)
+        return pd.DataFrame(data, index=idx, columns=out_cols, copy=False)
+
+def decode_datatable(obj: Optional[dict], **kwargs) -> pd.DataFrame:
+    """Single-payload convenience wrapper around ``DatatableReader``."""
+    reader = DatatableReader()
+    reader.add_page(obj)
+    return reader.frame(**kwargs)
+
+def split_by_ticker(df: pd.DataFrame, col: str = "ticker", drop_key: bool = True) -> Dict[str, pd.DataFrame]:
+    """Per-ticker row slices of a frame sorted by ``col`` (as produced by ``frame``).
+
+    The ticker column is dropped once (``drop_key``); each slice is then a
+    positional row range (``iloc[a:b]``) that shares memory with that frame.
+    """
+    if df.empty or col not in df.columns:
+        return {}
+    codes = df[col].cat.codes.to_numpy() if isinstance(df[col].dtype, pd.CategoricalDtype) \
+        else pd.factorize(df[col])[0]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(df)]])
+    tickers = df[col].to_numpy()
+    sub = df.drop(columns=col) if drop_key else df
+    return {str(tickers[a]): sub.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:]) if codes[a] >= 0}
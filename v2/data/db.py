@@ -1,24 +1,144 @@
 # -*- coding: utf-8 -*-
-import sqlite3
+import sqlite3, threading, queue, logging
 from contextlib import contextmanager
 from typing import List, Tuple, Optional
 
-from config import DB_PATH
+import config
+
+_local = threading.local()
+
+def _connect(path: str) -> sqlite3.Connection:
+    # isolation_level=None: no implicit transactions, every write batch goes through transaction()
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False,
+                           cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_KB)}")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+def connection() -> sqlite3.Connection:
+    """Thread-local connection to ``config.DB_PATH``, opened once and reused."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    path = config.DB_PATH
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _connect(path)
+    return conn
+
+def close_conn():
+    """Close this thread's connections (they are reopened on next use)."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
 
 @contextmanager
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+def transaction():
+    """Explicit ``BEGIN IMMEDIATE`` ... ``COMMIT`` on the thread-local connection.
+
+    Nested calls join the outer transaction.
+    """
+    conn = connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
     try:
         yield conn
-    finally:
-        conn.commit()
-        conn.close()
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+@contextmanager
+def get_conn():
+    with transaction() as conn:
+        yield conn
+
+class DBWriter:
+    """Background single-writer: batches submitted from any thread are applied in order
+    by one thread, coalescing whatever is queued into a single transaction."""
+
+    def __init__(self, max_batches_per_tx: int = 64):
+        self.max_batches_per_tx = max_batches_per_tx
+        self._q: "queue.Queue" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, rows: List[Tuple]):
+        if self._error is not None:
+            raise RuntimeError("DB writer failed") from self._error
+        self._q.put((sql, rows))
+
+    def _loop(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                self._q.task_done()
+                break
+            batch = [item]
+            while len(batch) < self.max_batches_per_tx:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._q.put(None)
+                    self._q.task_done()
+                    break
+                batch.append(nxt)
+            try:
+                with transaction() as conn:
+                    for sql, rows in batch:
+                        conn.executemany(sql, rows)
+            except BaseException as e:
+                logging.exception("DB writer: transaction of %d batches failed", len(batch))
+                self._error = self._error or e
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+        close_conn()
+
+    def flush(self):
+        """Block until everything submitted so far is committed."""
+        self._q.join()
+        if self._error is not None:
+            raise RuntimeError("DB writer failed") from self._error
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("DB writer failed") from self._error
+
+_writer: Optional[DBWriter] = None
+
+def start_writer() -> DBWriter:
+    """Route ``upsert_many`` through a background single-writer thread."""
+    global _writer
+    if _writer is None:
+        _writer = DBWriter()
+    return _writer
+
+def stop_writer():
+    """Drain and stop the background writer; later writes are applied inline again."""
+    global _writer
+    w, _writer = _writer, None
+    if w is not None:
+        w.close()
+
+def flush_writes():
+    if _writer is not None:
+        _writer.flush()
 
 def init_db():
-    with get_conn() as conn:
-        c = conn.cursor()
-        c.executescript("""
-        PRAGMA journal_mode=WAL;
+    conn = connection()
+    conn.executescript("""
         CREATE TABLE IF NOT EXISTS universe(
             symbol TEXT PRIMARY KEY,
             name TEXT,
@@ -33,6 +153,7 @@ def init_db():
             date TEXT,
             close REAL,
             volume REAL,
+            source TEXT,
             PRIMARY KEY(symbol, date)
         );
         CREATE INDEX IF NOT EXISTS idx_prices_date ON prices_daily(date);
@@ -49,42 +170,135 @@ def init_db():
             InsiderNet90d REAL,
             Sentiment30d REAL
         );
-        CREATE TABLE IF NOT EXISTS betas_monthly(
-            date TEXT,
-            symbol TEXT,
-            beta_252 REAL,
-            PRIMARY KEY(date, symbol)
-        );
-        CREATE TABLE IF NOT EXISTS weights(
-            date TEXT,
-            strategy TEXT,
-            symbol TEXT,
-            weight REAL,
-            PRIMARY KEY(date, strategy, symbol)
-        );
-        CREATE TABLE IF NOT EXISTS portfolio_returns(
-            date TEXT,
-            strategy TEXT,
-            ret REAL,
-            PRIMARY KEY(date, strategy)
-        );
         CREATE TABLE IF NOT EXISTS performance(
             strategy TEXT PRIMARY KEY,
             CAGR REAL, AnnVol REAL, Sharpe REAL, Sortino REAL, MaxDD REAL, HitRate REAL, N INTEGER
         );
+        CREATE TABLE IF NOT EXISTS factor_ic(
+            factor TEXT, horizon INTEGER, date TEXT, ic REAL,
+            PRIMARY KEY(factor, horizon, date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS factor_ic_summary(
+            factor TEXT, horizon INTEGER,
+            mean_ic REAL, ic_std REAL, ic_ir REAL, t_stat REAL, n INTEGER,
+            PRIMARY KEY(factor, horizon)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS factor_decay(
+            factor TEXT PRIMARY KEY,
+            peak_horizon INTEGER, half_life INTEGER, rank_autocorr REAL, turnover REAL
+        );
         """)
+    if "source" not in [r[1] for r in conn.execute("PRAGMA table_info(prices_daily)")]:
+        # stores from before the FMP fallback only hold SEP bars
+        conn.execute("ALTER TABLE prices_daily ADD COLUMN source TEXT DEFAULT 'NDL'")
+    with transaction():
+        legacy = [t for t, kind in conn.execute("SELECT name, type FROM sqlite_master WHERE name IN "
+                                                "('weights','portfolio_returns','betas_monthly')")
+                  if kind == "table"]
+        for q in COMPACT_SCHEMA:
+            conn.execute(q)
+        if legacy:
+            _migrate_compact(conn, legacy)
+        for q in COMPACT_VIEWS:
+            conn.execute(q)
+    if legacy:
+        conn.execute("VACUUM")
+
+# Day number of an ISO date (days since 1970-01-01) and back
+_DAY = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+_DATE = "date({} + 2440587.5)"
+
+# Weights, returns and betas keep integer surrogate keys for strategy and symbol and
+# integer days, in WITHOUT ROWID tables clustered by their primary key; the original
+# table names are views over them (INSTEAD OF triggers keep INSERT OR REPLACE working).
+COMPACT_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS strategies(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS symbols(id INTEGER PRIMARY KEY, symbol TEXT NOT NULL UNIQUE)",
+    """CREATE TABLE IF NOT EXISTS weights_c(
+        strategy_id INTEGER, day INTEGER, symbol_id INTEGER, weight REAL,
+        PRIMARY KEY(strategy_id, day, symbol_id)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS portfolio_returns_c(
+        strategy_id INTEGER, day INTEGER, ret REAL,
+        PRIMARY KEY(strategy_id, day)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS betas_monthly_c(
+        day INTEGER, symbol_id INTEGER, beta_252 REAL,
+        PRIMARY KEY(day, symbol_id)
+    ) WITHOUT ROWID""",
+]
+
+# NOT EXISTS instead of INSERT OR IGNORE: an outer INSERT OR REPLACE would turn the
+# trigger's IGNORE into REPLACE and renumber the key
+_ID = "INSERT INTO {t}({c}) SELECT NEW.{v} WHERE NOT EXISTS (SELECT 1 FROM {t} WHERE {c} = NEW.{v});"
+_STRAT_ID, _SYM_ID = _ID.format(t="strategies", c="name", v="strategy"), _ID.format(t="symbols", c="symbol", v="symbol")
+_SID = "(SELECT id FROM strategies WHERE name = NEW.strategy)"
+_YID = "(SELECT id FROM symbols WHERE symbol = NEW.symbol)"
+
+COMPACT_VIEWS = [
+    f"""CREATE VIEW IF NOT EXISTS weights AS
+        SELECT {_DATE.format("w.day")} AS date, s.name AS strategy, y.symbol AS symbol, w.weight AS weight
+        FROM weights_c w JOIN strategies s ON s.id = w.strategy_id JOIN symbols y ON y.id = w.symbol_id""",
+    f"""CREATE VIEW IF NOT EXISTS portfolio_returns AS
+        SELECT {_DATE.format("r.day")} AS date, s.name AS strategy, r.ret AS ret
+        FROM portfolio_returns_c r JOIN strategies s ON s.id = r.strategy_id""",
+    f"""CREATE VIEW IF NOT EXISTS betas_monthly AS
+        SELECT {_DATE.format("b.day")} AS date, y.symbol AS symbol, b.beta_252 AS beta_252
+        FROM betas_monthly_c b JOIN symbols y ON y.id = b.symbol_id""",
+    f"""CREATE TRIGGER IF NOT EXISTS weights_ins INSTEAD OF INSERT ON weights BEGIN
+        {_STRAT_ID} {_SYM_ID}
+        INSERT OR REPLACE INTO weights_c VALUES ({_SID}, {_DAY.format("NEW.date")}, {_YID}, NEW.weight);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS portfolio_returns_ins INSTEAD OF INSERT ON portfolio_returns BEGIN
+        {_STRAT_ID}
+        INSERT OR REPLACE INTO portfolio_returns_c VALUES ({_SID}, {_DAY.format("NEW.date")}, NEW.ret);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS betas_monthly_ins INSTEAD OF INSERT ON betas_monthly BEGIN
+        {_SYM_ID}
+        INSERT OR REPLACE INTO betas_monthly_c VALUES ({_DAY.format("NEW.date")}, {_YID}, NEW.beta_252);
+    END""",
+]
+
+def _migrate_compact(conn: sqlite3.Connection, legacy: List[str]):
+    """Move rows of the pre-compact tables into the keyed tables and drop them."""
+    logging.info("Migrando %s al esquema compacto ...", ", ".join(legacy))
+    if "weights" in legacy or "portfolio_returns" in legacy:
+        src = " UNION ".join(f"SELECT strategy FROM {t}" for t in legacy if t != "betas_monthly")
+        conn.execute(f"INSERT OR IGNORE INTO strategies(name) SELECT strategy FROM ({src}) ORDER BY strategy")
+    if "weights" in legacy or "betas_monthly" in legacy:
+        src = " UNION ".join(f"SELECT symbol FROM {t}" for t in legacy if t != "portfolio_returns")
+        conn.execute(f"INSERT OR IGNORE INTO symbols(symbol) SELECT symbol FROM ({src}) ORDER BY symbol")
+    day = _DAY.format("t.date")
+    copy = {
+        "weights": f"INSERT OR REPLACE INTO weights_c SELECT s.id, {day}, y.id, t.weight FROM weights t "
+                   "JOIN strategies s ON s.name = t.strategy JOIN symbols y ON y.symbol = t.symbol",
+        "portfolio_returns": f"INSERT OR REPLACE INTO portfolio_returns_c SELECT s.id, {day}, t.ret "
+                             "FROM portfolio_returns t JOIN strategies s ON s.name = t.strategy",
+        "betas_monthly": f"INSERT OR REPLACE INTO betas_monthly_c SELECT {day}, y.id, t.beta_252 "
+                         "FROM betas_monthly t JOIN symbols y ON y.symbol = t.symbol",
+    }
+    for t in legacy:
+        conn.execute(copy[t])
+        conn.execute(f"DROP TABLE {t}")
 
 def upsert_many(table: str, rows: List[Tuple], placeholders: str):
     if not rows: return
-    with get_conn() as conn:
-        c = conn.cursor()
-        c.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
+    sql = f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})"
+    if _writer is not None:
+        _writer.submit(sql, rows)
+        return
+    with transaction() as conn:
+        conn.executemany(sql, rows)
+
+# prices_daily.source suffix of secondary-source bars that could not be checked against the primary's basis;
+# they are stored but kept out of returns, and re-requested on the next run
+UNRECONCILED = ":unreconciled"
+RECONCILED_SQL = f"COALESCE(source, '') NOT LIKE '%{UNRECONCILED}'"
 
 def latest_price_date(symbol: str) -> Optional[str]:
-    with get_conn() as conn:
-        c = conn.cursor()
-        c.execute("SELECT MAX(date) FROM prices_daily WHERE symbol=?", (symbol,))
-        row = c.fetchone()
-        if row and row[0]:
-            return row[0]
+    """Last reconciled bar of ``symbol`` (unreconciled ones are asked again)."""
+    row = connection().execute(f"SELECT MAX(date) FROM prices_daily WHERE symbol=? AND {RECONCILED_SQL}",
+                               (symbol,)).fetchone()
+    if row and row[0]:
+        return row[0]
     return None
@@ -1,20 +1,12 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from clients.nasdaq_client import ndl_get
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-def _datatable_to_df(obj: dict) -> pd.DataFrame:
-    if not obj or "datatable" not in obj:
-        return pd.DataFrame()
-    cols = [c["name"] for c in obj["datatable"]["columns"]]
-    data = obj["datatable"]["data"]
-    return pd.DataFrame(data, columns=cols)
+from data.datatable import DatatableReader, decode_datatable
 
 def sf1_latest_ttm(symbol: str) -> Dict[str, Any]:
-    frames, cursor_id = [], None
+    reader, cursor_id = DatatableReader(), None
     base_params = {
         "ticker": symbol,
         "dimension": "TTM",
@@ -26,22 +18,17 @@ def sf1_latest_ttm(symbol: str) -> Dict[str, Any]:
         if cursor_id:
             params["qopts.cursor_id"] = cursor_id
         obj = ndl_get("/datatables/SHARADAR/SF1", params=params)
-        df = _datatable_to_df(obj)
-        if df.empty:
+        if not reader.add_page(obj):
             break
-        frames.append(df)
         meta = (obj or {}).get("meta", {}) or {}
         cursor_id = meta.get("next_cursor_id")
         if not cursor_id:
             break
 
-        if not frames:
-            return {}
-
-        df = pd.concat(frames, ignore_index=True)
-        df["calendardate"] = pd.to_datetime(df["calendardate"], errors="coerce")
-        df = df.dropna(subset=["calendardate"]).sort_values("calendardate")
-        return df.tail(1).to_dict(orient="records")[0]
+    df = reader.frame(keys=("calendardate",), keep="last")  # latest restatement wins
+    if df.empty:
+        return {}
+    return df.tail(1).to_dict(orient="records")[0]
 
 def sf1_annual_assets(symbol: str, limit: int = 4) -> pd.DataFrame:
     params = {
@@ -52,13 +39,15 @@ def sf1_annual_assets(symbol: str, limit: int = 4) -> pd.DataFrame:
         "qopts.per_page": limit
     }
     obj = ndl_get("/datatables/SHARADAR/SF1", params=params)
-    df = _datatable_to_df(obj)
-    if "calendardate" in df.columns:
-        df["calendardate"] = pd.to_datetime(df["calendardate"])
-        df = df.sort_values("calendardate")
-    return df
+    return decode_datatable(obj, keys=("calendardate",))
+
+def compute_static_factors_from_ndl(symbol: str, px: Optional[pd.DataFrame] = None) -> dict:
+    """SF1-based snapshot factors for ``symbol``.
 
-def compute_static_factors_from_ndl(symbol: str, px: pd.DataFrame) -> dict:
+    The price-based ``*_last`` fields are only filled when ``px`` is given; the
+    pipeline takes them from ``FactorEngine.snapshot()`` instead, which reuses
+    the shared return/volume intermediates across all symbols.
+    """
     row = sf1_latest_ttm(symbol)
     pb = row.get("pb") if row else None
     roa = row.get("roa") if row else None
@@ -94,12 +83,14 @@ def compute_static_factors_from_ndl(symbol: str, px: pd.DataFrame) -> dict:
         pass
 
     mom_last = vol60_last = adv20_last = np.nan
+    if px is None:
+        return dict(B2M=b2m, EBIT_EV=ebit_ev, ROA_TTM=roa_ttm, AssetGrowthYoY=asset_growth)
     try:
         if len(px) >= 252 + 21:
             p = px["close"].astype(float)
             mom_last = p.iloc[-22]/p.iloc[-253] - 1.0
         if len(px) >= 60:
-            ret = px["close"].pct_change()
+            ret = px["close"].pct_change(fill_method=None)
             vol60_last = ret.rolling(60).std().iloc[-1]
         if len(px) >= 20:
             adv20_last = (px["close"] * px["volume"]).rolling(20).mean().iloc[-1]
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Date-range-aware cache of SEP daily bars.
+
+Per ticker it keeps the bars fetched so far plus the date intervals already
+requested (``coverage``): holidays, pre-IPO and post-delisting stretches have
+no rows, so coverage rather than the bars themselves says what is known.  A
+request is served from the cache where it overlaps coverage and only the
+missing gaps are fetched.  Coverage stops at ``settled_date()``, so recent
+days are asked again until their bars are final.
+
+SEP closes are split-adjusted: a split restates every earlier close.  Each
+gap is therefore fetched together with ``OVERLAP_BARS`` cached bars next to
+it; if their closes moved by more than ``RESTATE_TOL`` the ticker's history
+was restated, and its cache is dropped and rebuilt for the requested range.
+
+One JSON file per ticker under ``PRICE_CACHE_DIR``::
+
+    {"coverage": [["2015-01-01", "2023-12-31"]], "date": [...], "close": [...], "volume": [...]}
+"""
+import os, json, logging
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from http_cache import CACHE_DIR, settled_date, write_atomic
+
+PRICE_CACHE_DIR = os.getenv("PRICE_CACHE_DIR", os.path.join(CACHE_DIR, "sep_ranges"))
+ENABLED = os.getenv("PRICE_RANGE_CACHE", "1") != "0"
+OVERLAP_BARS = int(os.getenv("PRICE_CACHE_OVERLAP_BARS", "5"))
+RESTATE_TOL = float(os.getenv("PRICE_CACHE_RESTATE_TOL", "0.005"))  # median relative close change on the overlap
+
+Interval = Tuple[str, str]
+
+def _day(s: str, delta: int) -> str:
+    return (date.fromisoformat(s) + timedelta(days=delta)).isoformat()
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Sorted, non-overlapping intervals; adjacent days are joined."""
+    out: List[List[str]] = []
+    for a, b in sorted(intervals):
+        if out and a <= _day(out[-1][1], 1):
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    return [tuple(x) for x in out]
+
+def gaps(coverage: List[Interval], start: str, end: str) -> List[Interval]:
+    """Sub-intervals of ``[start, end]`` not covered; stretches without business days are skipped."""
+    out, cur = [], start
+    for a, b in merge_intervals(coverage):
+        if b < cur:
+            continue
+        if a > end:
+            break
+        if a > cur:
+            out.append((cur, _day(a, -1)))
+        cur = _day(b, 1)
+    if cur <= end:
+        out.append((cur, end))
+    return [(a, b) for a, b in out if len(pd.bdate_range(a, b))]
+
+def _path(symbol: str) -> str:
+    return os.path.join(PRICE_CACHE_DIR, f"{symbol}.json")
+
+def load(symbol: str) -> Tuple[List[Interval], pd.DataFrame]:
+    """Coverage intervals and cached close/volume bars (date index) for ``symbol``."""
+    empty = pd.DataFrame({"close": [], "volume": []}, index=pd.DatetimeIndex([], name="date"))
+    try:
+        with open(_path(symbol), "r", encoding="utf-8") as f:
+            obj = json.load(f)
+    except FileNotFoundError:
+        return [], empty
+    except Exception as e:
+        logging.warning("[SEP cache] %s ilegible, se descarta: %s", symbol, e)
+        return [], empty
+    df = pd.DataFrame({"close": np.array(obj["close"], dtype=float), "volume": np.array(obj["volume"], dtype=float)},
+                      index=pd.DatetimeIndex(obj["date"], name="date"))
+    return [tuple(x) for x in obj["coverage"]], df
+
+def store(symbol: str, start: str, end: str, bars: Optional[pd.DataFrame], covered: bool = True):
+    """Merge ``bars`` fetched for ``[start, end]`` into the cache and mark the settled part as covered."""
+    coverage, df = load(symbol)
+    if bars is not None and len(bars):
+        new = bars[["close", "volume"]].astype(float)
+        df = pd.concat([df[~df.index.isin(new.index)], new]).sort_index()
+    end = min(end, settled_date())
+    if covered and start <= end:
+        coverage = merge_intervals(coverage + [(start, end)])
+    try:
+        write_atomic(_path(symbol), {"coverage": [list(x) for x in coverage],
+                                     "date": df.index.strftime("%Y-%m-%d").tolist(),
+                                     "close": df["close"].tolist(), "volume": df["volume"].tolist()})
+    except Exception as e:
+        logging.warning("[SEP cache] no se pudo escribir %s: %s", symbol, e)
+
+def with_overlap(df: pd.DataFrame, a: str, b: str) -> Interval:
+    """``[a, b]`` widened to ``OVERLAP_BARS`` cached bars before it (or, failing that, after it)."""
+    before = df.index[df.index < pd.Timestamp(a)]
+    if len(before):
+        return before[-OVERLAP_BARS:][0].strftime("%Y-%m-%d"), b
+    after = df.index[df.index > pd.Timestamp(b)]
+    if len(after):
+        return a, after[:OVERLAP_BARS][-1].strftime("%Y-%m-%d")
+    return a, b
+
+def restated(cached: pd.DataFrame, bars: Optional[pd.DataFrame]) -> bool:
+    """Whether ``bars`` disagree with the cached closes on their shared dates (a split or other restatement)."""
+    if bars is None or not len(bars):
+        return False
+    common = cached.index.intersection(bars.index)
+    if not len(common):
+        return False
+    gap = np.nanmedian(np.abs(bars.loc[common, "close"].to_numpy(dtype=float)
+                              / cached.loc[common, "close"].to_numpy(dtype=float) - 1))
+    return bool(gap > RESTATE_TOL)
+
+def drop(symbol: str):
+    """Forget everything cached for ``symbol``."""
+    try:
+        os.remove(_path(symbol))
+    except FileNotFoundError:
+        pass
+
+def cached_range(symbol: str, start: str, end: str,
+                 fetch: Callable[[str, str, str], Tuple[Optional[pd.DataFrame], bool]]) -> Optional[pd.DataFrame]:
+    """Bars for ``[start, end]``: cached where covered, ``fetch(symbol, a, b)`` for each gap.
+
+    ``fetch`` returns (bars or None, complete).  A complete answer covers the
+    gap even with no rows (holidays, pre-IPO, delisted), so it is not asked
+    again; a gap with a failed request stays open and only its bars are kept.
+    Each gap is fetched with a few cached bars around it; when those came back
+    restated the cache of ``symbol`` is dropped and ``[start, end]`` fetched anew.
+    """
+    coverage, df = load(symbol)
+    for a, b in gaps(coverage, start, end):
+        fa, fb = with_overlap(df, a, b)
+        logging.debug("[SEP cache] %s gap %s..%s (pedido %s..%s)", symbol, a, b, fa, fb)
+        bars, complete = fetch(symbol, fa, fb)
+        if restated(df, bars):
+            logging.warning("[SEP cache] %s: cierres reajustados (split?), se descarta su caché; "
+                            "las barras ya guardadas en la BBDD siguen en la base anterior", symbol)
+            drop(symbol)
+            bars, complete = fetch(symbol, start, end)
+            if bars is not None or complete:
+                store(symbol, start, end, bars, covered=complete)
+            break
+        if bars is not None or complete:
+            store(symbol, fa, fb, bars, covered=complete)
+    _, df = load(symbol)
+    out = df.loc[start:end]
+    return out if len(out) else None
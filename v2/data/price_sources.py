@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Price-source layer: NDL SEP first, FMP as hedge and fallback.
+
+Each symbol is requested from the first source of ``PRICE_SOURCES``.  When
+it has not answered within the ``PRICE_HEDGE_PCTL`` percentile of its recent
+latencies, the same range is also requested from the next source and the
+first usable answer wins (the slow request keeps running and still fills the
+range cache).  A source that answers with no rows falls back to the next one
+at once.  When several sources answer, bars are reconciled by priority: the
+primary's bars are kept and the other source only fills dates the primary
+lacks, and only if both agree on the overlapping closes.  When the primary
+gives nothing (hedge win, fallback), the other source's bars are checked
+against primary-basis bars already on hand: the caller's stored last bars
+(``anchor``) and the primary's range cache; the request reaches back
+``PRICE_ANCHOR_DAYS`` so the two overlap.  Bars that cannot be checked or
+disagree are tagged ``<source>:unreconciled`` and kept out of returns; a
+symbol with no stored history at all (e.g. one the primary lacks) takes the
+secondary's bars as its basis instead.
+Every bar carries a ``source`` column, stored in ``prices_daily``.
+"""
+import os, time, logging, threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data import price_cache
+from data.db import UNRECONCILED
+from data.prices_ndl import get_eod_prices_ndl
+from data.prices_fmp import get_eod_prices_fmp
+
+SOURCES = {"NDL": get_eod_prices_ndl, "FMP": get_eod_prices_fmp}
+# bars a source already holds locally, for checking another source without a request
+CACHED = {"NDL": lambda s: price_cache.load(s)[1] if price_cache.ENABLED else None}
+ORDER = [s for s in (x.strip().upper() for x in os.getenv("PRICE_SOURCES", "NDL,FMP").split(",")) if s in SOURCES]
+HEDGE_PCTL = float(os.getenv("PRICE_HEDGE_PCTL", "95"))
+HEDGE_MIN_S = float(os.getenv("PRICE_HEDGE_MIN_S", "1.0"))     # never hedge faster than this
+HEDGE_DELAY_S = float(os.getenv("PRICE_HEDGE_DELAY_S", "5.0"))  # until WARMUP latencies are known
+WARMUP = int(os.getenv("PRICE_HEDGE_WARMUP", "20"))
+RECONCILE_TOL = float(os.getenv("PRICE_RECONCILE_TOL", "0.01"))  # median relative close gap on overlap
+WORKERS = int(os.getenv("PRICE_SOURCE_WORKERS", "4"))
+ANCHOR_DAYS = int(os.getenv("PRICE_ANCHOR_DAYS", "14"))  # overlap requested from a secondary source
+
+class LatencyTracker:
+    """Recent wall times of one source; ``threshold()`` is the delay before hedging it."""
+
+    def __init__(self, size: int = 200):
+        self._lat = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._lat.append(seconds)
+
+    def threshold(self) -> float:
+        with self._lock:
+            lat = list(self._lat)
+        if len(lat) < WARMUP:
+            return HEDGE_DELAY_S
+        return max(HEDGE_MIN_S, float(np.percentile(lat, HEDGE_PCTL)))
+
+class SourceStats:
+    """Per-run counters: requests, hedges, hedge wins, fallbacks, missing symbols, bars per source."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = Counter()
+
+    def incr(self, key: str, n: int = 1):
+        with self._lock:
+            self.counts[key] += n
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+LATENCY = {name: LatencyTracker() for name in SOURCES}
+STATS = SourceStats()
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def _pool(name: str) -> ThreadPoolExecutor:
+    # one pool per source: a stalled source cannot starve the other's requests
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix=f"px-{name}")
+        return _pools[name]
+
+def _timed(name: str, symbol: str, start: str, end: str) -> Optional[pd.DataFrame]:
+    t0 = time.perf_counter()
+    try:
+        return SOURCES[name](symbol, start, end)
+    except Exception as e:
+        logging.warning("[%s] %s: %s", name, symbol, e)
+        return None
+    finally:
+        LATENCY[name].add(time.perf_counter() - t0)
+
+def _usable(df: Optional[pd.DataFrame]) -> bool:
+    return df is not None and len(df) > 0
+
+def anchor_start(start: str) -> str:
+    """First day of the primary-basis bars worth passing as ``anchor`` for a request starting at ``start``."""
+    return (pd.Timestamp(start) - pd.Timedelta(days=ANCHOR_DAYS)).date().isoformat()
+
+def reconciled(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """``df`` without unreconciled bars (None if nothing is left)."""
+    if df is None or "source" not in df:
+        return df
+    df = df[~df["source"].astype(str).str.endswith(UNRECONCILED)]
+    return df if len(df) else None
+
+def _gap(a: pd.DataFrame, b: pd.DataFrame) -> float:
+    """Median relative close gap of ``a`` against ``b`` on their shared dates (NaN if none)."""
+    common = a.index.intersection(b.index)
+    if not len(common):
+        return np.nan
+    return float(np.nanmedian(np.abs(a.loc[common, "close"].to_numpy() / b.loc[common, "close"].to_numpy() - 1)))
+
+def _known(primary: str, symbol: str, start: str, end: str, anchor: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    # primary-basis closes on hand: the caller's stored bars plus the primary's local cache
+    try:
+        cached = CACHED[primary](symbol) if primary in CACHED else None
+    except Exception as e:
+        logging.debug("[precios] caché de %s para %s ilegible: %s", primary, symbol, e)
+        cached = None
+    frames = [f[["close"]] for f in (anchor, cached) if _usable(f)]
+    if not frames:
+        return None
+    k = pd.concat(frames)
+    k = k[~k.index.duplicated(keep="last")].sort_index().loc[start:end]
+    return k if len(k) else None
+
+def reconcile(frames: Sequence[Tuple[str, Optional[pd.DataFrame]]]) -> Optional[pd.DataFrame]:
+    """Merge (source, bars) in priority order into close/volume/source bars.
+
+    A later source only adds dates missing from the earlier ones, and only when
+    its closes on the shared dates agree within ``RECONCILE_TOL`` (otherwise the
+    two series are not on the same adjustment basis and splicing would jump).
+    """
+    out = None
+    for name, df in frames:
+        if not _usable(df):
+            continue
+        df = df[["close", "volume"]].assign(source=name)
+        if out is None:
+            out = df
+            continue
+        gap = _gap(df, out)
+        if np.isnan(gap):
+            continue
+        if not gap <= RECONCILE_TOL:
+            logging.debug("[precios] %s descartado: cierre %.2f%% distinto", name, 100 * gap)
+            STATS.incr("mismatched")
+            continue
+        extra = df[~df.index.isin(out.index)]
+        if len(extra):
+            out = pd.concat([out, extra]).sort_index()
+    return out
+
+def get_eod_prices(symbol: str, start: str, end: str, sources: Optional[List[str]] = None,
+                   anchor: Optional[pd.DataFrame] = None, has_basis: bool = True) -> Optional[pd.DataFrame]:
+    """Close/volume/source bars for [start, end] from the first source(s) that answer.
+
+    ``anchor``: primary-basis bars the caller already has (e.g. the stored bars
+    since ``anchor_start(start)``), used to check a secondary source's bars.
+    ``has_basis=False``: nothing is stored for ``symbol`` yet, so with nothing
+    of the primary's known either the secondary's bars are accepted as its basis.
+    """
+    order = [s for s in (sources or ORDER) if s in SOURCES]
+    if not order:
+        return None
+    STATS.incr("requests")
+    known = _known(order[0], symbol, anchor_start(start), end, anchor)
+    # secondaries reach back over the known bars so there is an overlap to compare
+    sec_start = min(start, known.index[0].strftime("%Y-%m-%d")) if known is not None else start
+    futs = {_pool(order[0]).submit(_timed, order[0], symbol, start, end): order[0]}
+    nxt = 1
+    if len(order) > 1:
+        done, _ = wait(futs, timeout=LATENCY[order[0]].threshold())
+        if not done:
+            STATS.incr("hedged")
+            futs[_pool(order[1]).submit(_timed, order[1], symbol, sec_start, end)] = order[1]
+            nxt = 2
+
+    results: Dict[str, Optional[pd.DataFrame]] = {}
+    pending = set(futs)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            results[futs[f]] = f.result()
+        if any(_usable(r) for r in results.values()):
+            break
+    for f in pending:  # the slower request may have finished meanwhile
+        if f.done():
+            results[futs[f]] = f.result()
+    if nxt == 2 and _usable(results.get(order[1])) and order[0] not in results:
+        STATS.incr("hedge_wins")
+
+    for name in order[nxt:]:
+        if any(_usable(r) for r in results.values()):
+            break
+        STATS.incr("fallbacks")
+        results[name] = _timed(name, symbol, sec_start, end)
+
+    if _usable(results.get(order[0])):
+        out = reconcile([(name, results.get(name)) for name in order])
+    else:
+        # no primary bars to splice onto: check the secondary against what is known of the primary
+        out = reconcile([(name, results.get(name)) for name in order[1:]])
+        if out is not None and known is None and not has_basis:
+            STATS.incr("secondary_basis")  # never had primary bars: nothing to splice onto
+        elif out is not None:
+            gap = _gap(out, known) if known is not None else np.nan
+            if not gap <= RECONCILE_TOL:
+                logging.debug("[precios] %s: barras de %s sin conciliar (%s)", symbol, out["source"].iloc[0],
+                              "sin solape" if np.isnan(gap) else f"cierre {100 * gap:.2f}% distinto")
+                STATS.incr("unreconciled")
+                out = out.assign(source=out["source"] + UNRECONCILED)
+    out = out.loc[start:end] if out is not None else None
+    if out is None or not len(out):
+        STATS.incr("missing")
+        return None
+    for name, n in out["source"].value_counts().items():
+        STATS.incr(f"bars_{name}", int(n))
+    return out
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""EOD bars from FMP ``historical-price-full`` (secondary price source)."""
+import logging
+import numpy as np
+import pandas as pd
+from typing import Optional
+from clients.fmp_client import fmp_get
+
+def get_eod_prices_fmp(symbol: str, start: str, end: str) -> Optional[pd.DataFrame]:
+    """Split-adjusted close/volume for [start, end], indexed by date (None when FMP has no rows)."""
+    symbol = (symbol or "").upper().strip()
+    obj = fmp_get(f"/api/v3/historical-price-full/{symbol}", params={"from": start, "to": end})
+    hist = (obj or {}).get("historical") if isinstance(obj, dict) else None
+    if not hist:
+        logging.debug("[FMP] sin barras para %s en [%s .. %s]", symbol, start, end)
+        return None
+    df = pd.DataFrame(hist)
+    if "date" not in df or "close" not in df:
+        return None
+    vol = pd.to_numeric(df["volume"], errors="coerce").to_numpy(dtype=float) if "volume" in df else np.nan
+    out = pd.DataFrame({"close": pd.to_numeric(df["close"], errors="coerce").to_numpy(dtype=float), "volume": vol},
+                       index=pd.DatetimeIndex(pd.to_datetime(df["date"]), name="date"))
+    out = out[~out.index.duplicated(keep="last")].sort_index().loc[start:end]
+    return out.dropna(subset=["close"]) if len(out) else None
@@ -1,29 +1,46 @@
 # prices_ndl.py
 import logging
 import pandas as pd
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from clients.nasdaq_client import ndl_get
 from data.db import upsert_many
+from data.datatable import DatatableReader, split_by_ticker
+from data import price_cache
 
-def _datatable_to_df(obj: dict) -> pd.DataFrame:
-    if not obj or "datatable" not in obj:
-        return pd.DataFrame()
-    cols = [c["name"] for c in obj["datatable"]["columns"]]
-    data = obj["datatable"]["data"]
-    return pd.DataFrame(data, columns=cols)
+def _sep_frame(reader: DatatableReader) -> pd.DataFrame:
+    """Typed, deduplicated close/volume frame indexed by date."""
+    return reader.frame(keys=("ticker", "date"), index="date", columns=["close", "volume"],
+                        required=("close", "volume"))
 
 
 def get_eod_prices_ndl(symbol: str, start: str, end: str, batch_days: int = 250) -> Optional[pd.DataFrame]:
+    """
+    EOD bars for [start, end]. With the range cache enabled, only the date
+    gaps not fetched before go to the API (see data.price_cache).
+    """
+    symbol = (symbol or "").upper().strip()
+    if price_cache.ENABLED:
+        return price_cache.cached_range(symbol, start, end,
+                                        lambda s, a, b: _fetch_sep(s, a, b, batch_days))
+    return _fetch_sep(symbol, start, end, batch_days)[0]
+
+
+def _fetch_sep(symbol: str, start: str, end: str, batch_days: int = 250) -> Tuple[Optional[pd.DataFrame], bool]:
     """
     Fetch EOD from SHARADAR/SEP using the 'date=' filter (comma-separated list).
     If no data comes back, automatically fall back to cursor pagination with
     'date.gte/date.lte'. Emits detailed DEBUG logs.
+
+    Returns (bars or None when there are no rows, whether every request was
+    answered): zero rows from a complete pull is an answer, not an error.
+    Responses skip the HTTP cache when the range cache keeps the bars.
     """
     symbol = (symbol or "").upper().strip()
     logging.debug("[SEP] start symbol=%s start=%s end=%s", symbol, start, end)
 
     # ---------- Strategy A: date list (your browser pattern) ----------
-    frames: List[pd.DataFrame] = []
+    reader = DatatableReader()
+    complete = True
 
     all_dates = pd.date_range(start=start, end=end, freq="D")
     logging.debug("[SEP] date-list mode: total_days=%d batch_days=%d", len(all_dates), batch_days)
@@ -42,38 +59,35 @@ def get_eod_prices_ndl(symbol: str, start: str, end: str, batch_days: int = 250)
             "qopts.columns": "ticker,date,close,volume",
             "qopts.per_page": 10000,
         }
-        obj = ndl_get("/datatables/SHARADAR/SEP", params=params)
+        obj = ndl_get("/datatables/SHARADAR/SEP", params=params, cache=not price_cache.ENABLED)
         if obj is None:
             logging.debug("[SEP] date-list batch %s..%s -> obj=None", chunk[0].date(), chunk[-1].date())
+            complete = False
             continue
 
         qerr = obj.get("quandl_error")
         if qerr:
             logging.warning("[SEP] date-list quandl_error code=%s msg=%s", qerr.get("code"), qerr.get("message"))
+            complete = False
 
-        df = _datatable_to_df(obj)
-        logging.debug("[SEP] date-list batch %s..%s -> rows=%d", chunk[0].date(), chunk[-1].date(), len(df))
-        if not df.empty:
-            frames.append(df)
+        rows = reader.add_page(obj)
+        logging.debug("[SEP] date-list batch %s..%s -> rows=%d", chunk[0].date(), chunk[-1].date(), rows)
 
-    if frames:
+    if len(reader):
 
-        out = pd.concat(frames, ignore_index=True).drop_duplicates()
-        out["date"] = pd.to_datetime(out["date"], errors="coerce")
-        out = out.dropna(subset=["date"]).sort_values("date").set_index("date")
-        out["close"] = pd.to_numeric(out["close"], errors="coerce")
-        out["volume"] = pd.to_numeric(out["volume"], errors="coerce")
+        out = _sep_frame(reader)
         logging.debug("[SEP] date-list total rows=%d first_dt=%s last_dt=%s",
                       len(out), out.index.min().date(), out.index.max().date())
 
-        return out[["close", "volume"]]
+        return out, complete
     logging.debug("[SEP] date-list mode returned 0 rows for %s. Falling back to cursor mode...", symbol)
 
     # ---------- Strategy B: cursor pagination (date.gte / date.lte) ----------
 
-    frames = []
+    reader = DatatableReader()
     cursor_id = None
     pages = 0
+    complete = False
     while True:
 
         params = {
@@ -85,7 +99,7 @@ def get_eod_prices_ndl(symbol: str, start: str, end: str, batch_days: int = 250)
         }
         if cursor_id:
             params["qopts.cursor_id"] = cursor_id
-        obj = ndl_get("/datatables/SHARADAR/SEP", params=params)
+        obj = ndl_get("/datatables/SHARADAR/SEP", params=params, cache=not price_cache.ENABLED)
         if obj is None:
             logging.debug("[SEP] cursor page=%d -> obj=None", pages + 1)
             break
@@ -95,17 +109,15 @@ def get_eod_prices_ndl(symbol: str, start: str, end: str, batch_days: int = 250)
             logging.warning("[SEP] cursor quandl_error code=%s msg=%s", qerr.get("code"), qerr.get("message"))
             break
 
-        df = _datatable_to_df(obj)
-        rows = len(df)
+        rows = reader.add_page(obj)
 
         meta = (obj or {}).get("meta", {}) or {}
         cursor_id = meta.get("next_cursor_id")
         pages += 1
         logging.debug("[SEP] cursor page=%d rows=%d next_cursor_id=%s", pages, rows, cursor_id)
 
-        if rows:
-            frames.append(df)
         if not cursor_id:
+            complete = True
             break
 
         # safety valve: avoid infinite loops
@@ -113,27 +125,102 @@ def get_eod_prices_ndl(symbol: str, start: str, end: str, batch_days: int = 250)
             logging.warning("[SEP] cursor mode aborted after 200 pages for %s", symbol)
             break
 
-    if not frames:
+    if not len(reader):
         logging.warning("[SEP] No rows returned for %s in [%s .. %s] (both modes). "
                         "Check ticker validity, subscription access to SHARADAR/SEP, and API key.",
                         symbol, start, end)
 
-        return None
+        return None, complete
 
-    out = pd.concat(frames, ignore_index=True).drop_duplicates()
-    out["date"] = pd.to_datetime(out["date"], errors="coerce")
-    out = out.dropna(subset=["date"]).sort_values("date").set_index("date")
-    out["close"] = pd.to_numeric(out["close"], errors="coerce")
-    out["volume"] = pd.to_numeric(out["volume"], errors="coerce")
+    out = _sep_frame(reader)
     logging.debug("[SEP] cursor total rows=%d first_dt=%s last_dt=%s",
                   len(out), out.index.min().date(), out.index.max().date())
 
-    return out[["close", "volume"]]
+    return out, complete
+
+
+def get_eod_prices_ndl_batch(symbols: List[str], start: str, end: str,
+                             per_page: int = 10000) -> Dict[str, pd.DataFrame]:
+    """
+    Fetch EOD for many tickers in one cursor-paginated SEP pull
+    ('ticker=A,B,C'). Pages are decoded into a single typed reader and the
+    result is split into per-ticker slices (no per-symbol copies).
+    With the range cache enabled, fully covered tickers are served locally
+    and the pull spans only the union of the others' gaps (plus a few cached
+    bars, to detect restated history).
+    """
+    tickers = sorted({(s or "").upper().strip() for s in symbols} - {""})
+    if not tickers:
+        return {}
+    if price_cache.ENABLED:
+        cached = {t: price_cache.load(t) for t in tickers}
+        todo = {t: g for t, (cov, _) in cached.items() for g in [price_cache.gaps(cov, start, end)] if g}
+        if todo:
+            # reach back over a few cached bars of each ticker to catch restated (split-adjusted) history
+            a = min(price_cache.with_overlap(cached[t][1], g[0][0], g[-1][1])[0] for t, g in todo.items())
+            b = max(g[-1][1] for g in todo.values())
+            fetched, complete = _fetch_sep_batch(list(todo), a, b, per_page)
+            for t in todo:
+                if price_cache.restated(cached[t][1], fetched.get(t)):
+                    logging.warning("[SEP cache] %s: cierres reajustados, se reconstruye su caché", t)
+                    price_cache.drop(t)
+                    get_eod_prices_ndl(t, start, end)
+                    continue
+                # a truncated pull only refreshes bars; coverage needs the whole range
+                price_cache.store(t, a, b, fetched.get(t), covered=complete)
+        out = {}
+        for t in tickers:
+            df = price_cache.load(t)[1].loc[start:end]
+            if len(df):
+                out[t] = df
+        return out
+    return _fetch_sep_batch(tickers, start, end, per_page)[0]
+
+
+def _fetch_sep_batch(tickers: List[str], start: str, end: str, per_page: int = 10000):
+    """One cursor-paginated pull; returns (per-ticker frames, whether the last page was reached)."""
+    reader = DatatableReader(capacity=per_page)
+    cursor_id = None
+    pages = 0
+    complete = False
+    while True:
+        params = {
+            "ticker": ",".join(tickers),
+            "date.gte": start,
+            "date.lte": end,
+            "qopts.columns": "ticker,date,close,volume",
+            "qopts.per_page": per_page,
+        }
+        if cursor_id:
+            params["qopts.cursor_id"] = cursor_id
+        obj = ndl_get("/datatables/SHARADAR/SEP", params=params, cache=not price_cache.ENABLED)
+        if obj is None:
+            break
+        qerr = obj.get("quandl_error")
+        if qerr:
+            logging.warning("[SEP] batch quandl_error code=%s msg=%s", qerr.get("code"), qerr.get("message"))
+            break
+        rows = reader.add_page(obj)
+        cursor_id = ((obj or {}).get("meta", {}) or {}).get("next_cursor_id")
+        pages += 1
+        logging.debug("[SEP] batch page=%d rows=%d next_cursor_id=%s", pages, rows, cursor_id)
+        if not cursor_id:
+            complete = True
+            break
+        if pages > 2000:
+            break
+
+    out = reader.frame(keys=("ticker", "date"), index="date", columns=["ticker", "close", "volume"],
+                       required=("close", "volume"))
+    logging.debug("[SEP] batch tickers=%d total rows=%d", len(tickers), len(out))
+    return split_by_ticker(out), complete
 
 
 def persist_prices(price_map: Dict[str, pd.DataFrame]):
+    """Upsert bars into ``prices_daily``; frames without a ``source`` column are SEP bars."""
     rows = []
     for s, df in price_map.items():
-        for dt, row in df.iterrows():
-            rows.append((s, dt.strftime("%Y-%m-%d"), float(row["close"]), float(row["volume"])))
-    upsert_many("prices_daily", rows, "?,?,?,?")
+        src = df["source"] if "source" in df else pd.Series("NDL", index=df.index)
+        rows += zip([s] * len(df), df.index.strftime("%Y-%m-%d"), df["close"].astype(float).tolist(),
+                    df["volume"].astype(float).tolist(), src.tolist())
+    upsert_many("prices_daily", rows, "?,?,?,?,?")
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Declarative factor registry with lazily evaluated, shared intermediates.
+
+Each factor declares the inputs it needs, its sign (+1: higher is better) and
+its frequency ("M": month x symbol panel, "static": one snapshot per symbol
+broadcast to every month).  ``FactorEngine`` resolves the dependency graph on
+demand and memoizes every node, so daily returns, dollar volume or monthly
+closes are computed once no matter how many factors use them, and only the
+factors needed by the requested strategies are evaluated.
+
+Adding a factor::
+
+    register_factor(Factor("REV_1M", ("m_close",), sign=-1, fn=lambda m: m / m.shift(1) - 1))
+"""
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import BENCHMARK, BETA_WINDOW_D
+from portfolio import next_month_returns
+
+RAW_INPUTS = ("close", "volume", "static")
+
+INTERMEDIATES: Dict[str, Tuple[Tuple[str, ...], Callable]] = {}
+
+def intermediate(name: str, *inputs: str):
+    """Register a shared intermediate computed from ``inputs``."""
+    def deco(fn):
+        INTERMEDIATES[name] = (tuple(inputs), fn)
+        return fn
+    return deco
+
+def own_bars(df: pd.DataFrame, fn: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+    """Apply a row-wise panel op (``shift``, ``rolling``) on each column's own bars.
+
+    Every column's non-NaN rows are packed to the bottom in date order, ``fn``
+    runs on the packed panel and the result is scattered back, so ``shift(21)``
+    means 21 of the symbol's bars rather than 21 rows of the union calendar.
+    """
+    a = df.to_numpy(dtype=float)
+    valid = ~np.isnan(a)
+    order = np.argsort(valid, axis=0, kind="stable")
+    res = fn(pd.DataFrame(np.take_along_axis(a, order, axis=0), columns=df.columns)).to_numpy(dtype=float)
+    out = np.empty_like(a)
+    np.put_along_axis(out, order, res, axis=0)
+    out[~valid] = np.nan
+    return pd.DataFrame(out, index=df.index, columns=df.columns)
+
+@intermediate("daily_rets", "close")
+def _daily_rets(close):
+    """Calendar-day returns on the last known close: a day without a bar reads 0 and the move
+    across the gap lands on the next bar (NaN only before a symbol's first bar)."""
+    return close.ffill().pct_change(fill_method=None)
+
+@intermediate("own_rets", "close")
+def _own_rets(close):
+    """Bar-to-bar returns of each symbol (NaN on days it did not trade)."""
+    return own_bars(close, lambda c: c.pct_change(fill_method=None))
+
+@intermediate("dollar_vol", "close", "volume")
+def _dollar_vol(close, volume):
+    return close * volume
+
+@intermediate("adv20", "dollar_vol")
+def _adv20(dv):
+    return own_bars(dv, lambda d: d.rolling(20).mean())
+
+@intermediate("vol60", "own_rets")
+def _vol60(rets):
+    return own_bars(rets, lambda r: r.rolling(60).std())
+
+@intermediate("mom_12_1_d", "close")
+def _mom_12_1_d(close):
+    return own_bars(close, lambda c: c.shift(21) / c.shift(252) - 1.0)
+
+@intermediate("beta_d", "daily_rets")
+def _beta_d(rets):
+    """Rolling daily beta vs the benchmark (vectorized rolling covariance)."""
+    if BENCHMARK not in rets.columns:
+        return pd.DataFrame(np.nan, index=rets.index, columns=rets.columns)
+    m = rets[BENCHMARK]
+    minp = BETA_WINDOW_D // 2
+    b = rets.rolling(BETA_WINDOW_D, min_periods=minp).cov(m).div(m.rolling(BETA_WINDOW_D, min_periods=minp).var() + 1e-12, axis=0)
+    return b.drop(columns=[BENCHMARK])
+
+@intermediate("m_close", "close")
+def _m_close(close):
+    return close.resample("ME").last()
+
+@intermediate("adv20_m", "adv20")
+def _adv20_m(adv20):
+    return adv20.resample("ME").last()
+
+@intermediate("vol60_m", "vol60")
+def _vol60_m(vol60):
+    return vol60.resample("ME").last()
+
+@intermediate("mom_12_1", "m_close")
+def _mom_12_1(m_close):
+    return m_close.shift(1) / m_close.shift(12) - 1.0
+
+@intermediate("m_rets", "m_close")
+def _m_rets(m_close):
+    return next_month_returns(m_close)
+
+@dataclass(frozen=True)
+class Factor:
+    name: str
+    inputs: Tuple[str, ...]
+    sign: int = 1
+    freq: str = "M"
+    fn: Optional[Callable] = None
+    composite: bool = True
+    daily: Optional[str] = None   # daily intermediate for daily/weekly rebalancing ("M" factors)
+
+    def compute(self, *args):
+        return self.fn(*args) if self.fn is not None else args[0]
+
+FACTORS: Dict[str, Factor] = {}
+
+def register_factor(f: Factor) -> Factor:
+    if f.name in INTERMEDIATES or f.name in RAW_INPUTS:
+        raise ValueError(f"factor name {f.name!r} clashes with an input")
+    if f.freq not in ("M", "static"):
+        raise ValueError(f"unknown factor frequency {f.freq!r}")
+    FACTORS[f.name] = f
+    return f
+
+def _static(col: str, sign: int) -> Factor:
+    """Factor read from a column of the per-symbol snapshot (``factors_static``)."""
+    return Factor(col, ("static",), sign, "static",
+                  lambda st: st[col] if col in st.columns else pd.Series(np.nan, index=st.index))
+
+for _f in [
+    _static("B2M", +1),
+    _static("EBIT_EV", +1),
+    _static("ROA_TTM", +1),
+    _static("AssetGrowthYoY", -1),
+    Factor("MOM_12_1", ("mom_12_1",), +1, daily="mom_12_1_d"),
+    Factor("VOL60", ("vol60_m",), -1, daily="vol60"),
+    _static("InsiderNet90d", +1),
+    _static("Sentiment30d", +1),
+]:
+    register_factor(_f)
+
+def composite_factors() -> List[str]:
+    return [n for n, f in FACTORS.items() if f.composite]
+
+def required_factors(strategies: Optional[Iterable[str]] = None) -> List[str]:
+    """Factors needed by ``strategies`` (``KIND::FACTOR`` names or composites), registry order."""
+    if strategies is None:
+        return list(FACTORS)
+    need = set()
+    for s in strategies:
+        _, _, f = s.partition("::")
+        if s.startswith("ROTATION::"):
+            continue
+        if s.startswith("COMPOSITE"):
+            need.update(composite_factors())
+        elif f:
+            if f not in FACTORS:
+                raise KeyError(f"unknown factor {f!r} in strategy {s!r}")
+            need.add(f)
+    return [n for n in FACTORS if n in need]
+
+class FactorEngine:
+    """Memoized evaluator over raw panels (``close``, ``volume``: date x symbol;
+    ``static``: symbol x field snapshot)."""
+
+    def __init__(self, close: pd.DataFrame, volume: pd.DataFrame, static: Optional[pd.DataFrame] = None):
+        self._cache: Dict[str, object] = {"close": close, "volume": volume}
+        self.computed: List[str] = []
+        if static is not None:
+            self.set_static(static)
+
+    @classmethod
+    def from_price_map(cls, price_map: Dict[str, pd.DataFrame], static: Optional[pd.DataFrame] = None):
+        close = pd.DataFrame({s: df["close"] for s, df in price_map.items()}).sort_index()
+        volume = pd.DataFrame({s: df["volume"] for s, df in price_map.items()}).sort_index()
+        return cls(close, volume, static)
+
+    def set_static(self, static: pd.DataFrame):
+        """Attach the per-symbol snapshot and drop everything derived from the old one."""
+        self._cache["static"] = static.astype(float)
+        for n, f in FACTORS.items():
+            if "static" in f.inputs:
+                self._cache.pop(n, None)
+
+    def get(self, name: str, _stack: Tuple[str, ...] = ()):
+        if name in self._cache:
+            return self._cache[name]
+        if name in _stack:
+            raise ValueError(f"dependency cycle: {' -> '.join(_stack + (name,))}")
+        if name in FACTORS:
+            node = FACTORS[name]
+            deps, fn = node.inputs, node.compute
+        elif name in INTERMEDIATES:
+            deps, fn = INTERMEDIATES[name]
+        elif name in RAW_INPUTS:
+            raise KeyError(f"raw input {name!r} not provided")
+        else:
+            raise KeyError(f"unknown factor or intermediate {name!r}")
+        val = fn(*[self.get(d, _stack + (name,)) for d in deps])
+        self._cache[name] = val
+        self.computed.append(name)
+        return val
+
+    def cross_section(self, factor: str, dt, columns: pd.Index) -> pd.Series:
+        """Factor values for month ``dt`` over ``columns``."""
+        val = self.get(factor)
+        if FACTORS[factor].freq == "static":
+            return val.reindex(columns)
+        return val.loc[dt].reindex(columns)
+
+    def panel_at(self, factor: str, dates: pd.DatetimeIndex, columns: pd.Index) -> np.ndarray:
+        """``len(dates) x len(columns)`` array of factor values known at each (daily) date.
+
+        Uses the factor's daily intermediate when it has one; monthly panels are
+        carried forward from the last month-end on or before each date.
+        """
+        f = FACTORS[factor]
+        if f.freq == "static":
+            v = self.get(factor).reindex(columns).to_numpy(dtype=float)
+            return np.broadcast_to(v, (len(dates), len(columns))).copy()
+        if f.daily:
+            return self.get(f.daily).reindex(index=dates, columns=columns).to_numpy(dtype=float)
+        return self.get(factor).reindex(columns=columns).reindex(dates, method="ffill").to_numpy(dtype=float)
+
+    def snapshot(self) -> pd.DataFrame:
+        """Latest price-based values per symbol (at each symbol's last close), from the shared intermediates."""
+        close = self.get("close")
+        valid = close.notna().to_numpy()
+        if not len(close):
+            return pd.DataFrame(index=close.columns, columns=["MOM_12_1_last", "VOL60_last", "ADV20_last"])
+        last = len(close) - 1 - np.argmax(valid[::-1], axis=0)
+        cols = np.arange(close.shape[1])
+        n_obs = valid.sum(axis=0)
+        out = {}
+        for field, inter, min_obs in [("MOM_12_1_last", "mom_12_1_d", 252 + 21),
+                                      ("VOL60_last", "vol60", 60),
+                                      ("ADV20_last", "adv20", 20)]:
+            v = self.get(inter).to_numpy(dtype=float)[last, cols]
+            out[field] = np.where(n_obs >= min_obs, v, np.nan)
+        return pd.DataFrame(out, index=close.columns)
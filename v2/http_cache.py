@@ -1,11 +1,44 @@
 # -*- coding: utf-8 -*-
-import os, json, hashlib, time
+import os, re, json, hashlib, time
+from datetime import date, timedelta
 from typing import Optional, Dict, Any
 
 CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "utils/.http_cache")
 CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", "86400"))  # 1 día
+NEG_CACHE_TTL = int(os.getenv("HTTP_NEG_CACHE_TTL", "604800"))  # 7 días (errores permanentes)
+NEG_CACHE_TTL_TRANSIENT = int(os.getenv("HTTP_NEG_CACHE_TTL_TRANSIENT", "3600"))  # 1 hora
 
-os.makedirs(CACHE_DIR, exist_ok=True)
+_made = set()
+
+# Cache policy per endpoint: TTL in seconds, None = never expires
+POLICY_TTL = {
+    "reference": CACHE_TTL,
+    "short": int(os.getenv("HTTP_CACHE_TTL_SHORT", "3600")),  # 1 hora
+}
+# Bars older than this many days no longer change on their own (late prints / vendor corrections settle
+# quickly); split-adjusted history is still restated by every split, see data.price_cache
+SETTLE_DAYS = int(os.getenv("HTTP_CACHE_SETTLE_DAYS", "5"))
+
+# First match wins.  Price history is split-adjusted (every split restates it), so it expires like
+# reference data; the SEP range cache does its own revalidation
+ENDPOINT_POLICIES = [
+    (re.compile(r"/datatables/SHARADAR/SEP|/historical-price-full/"), "reference"),
+    (re.compile(r"/insider-trading|/social-sentiment|/stock-news-sentiments"), "short"),
+    (re.compile(r"/stock/list|/delisted-companies|/profile/|/datatables/SHARADAR/SF1"), "reference"),
+]
+
+def settled_date() -> str:
+    """Last date whose daily bars are treated as final."""
+    return (date.today() - timedelta(days=SETTLE_DAYS)).isoformat()
+
+def policy_for(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    for rx, policy in ENDPOINT_POLICIES:
+        if rx.search(url):
+            return policy
+    return "reference"
+
+def ttl_for(url: str, params: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    return POLICY_TTL[policy_for(url, params)]
 
 def _key(method: str, url: str, params: Optional[Dict[str, Any]]):
     src = json.dumps({"m":method.upper(),"u":url,"p":params or {}}, sort_keys=True, ensure_ascii=False)
@@ -13,18 +46,55 @@ def _key(method: str, url: str, params: Optional[Dict[str, Any]]):
 
 def cache_get(method: str, url: str, params: Optional[Dict[str, Any]]):
     path = os.path.join(CACHE_DIR, _key(method, url, params)+".json")
+    ttl = ttl_for(url, params)
     try:
-        if os.path.exists(path) and (time.time() - os.path.getmtime(path)) <= CACHE_TTL:
+        if os.path.exists(path) and (ttl is None or (time.time() - os.path.getmtime(path)) <= ttl):
             with open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
     except Exception:
         return None
     return None
 
+def write_atomic(path: str, obj):
+    d = os.path.dirname(path)
+    if d not in _made:  # created on first write, not at import
+        os.makedirs(d, exist_ok=True)
+        _made.add(d)
+    # several shard processes may share the cache dir: write to a private temp file, then rename
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
 def cache_set(method: str, url: str, params: Optional[Dict[str, Any]], payload: dict):
     path = os.path.join(CACHE_DIR, _key(method, url, params)+".json")
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(payload, f)
+        write_atomic(path, payload)
+    except Exception:
+        pass
+
+def neg_cache_get(method: str, url: str, params: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Return the cached failure status for a request, or None if there is no live entry.
+
+    Permanent failures (401/403/404...) live for ``NEG_CACHE_TTL``; transient ones
+    (retries exhausted on 429/5xx/timeouts) only for ``NEG_CACHE_TTL_TRANSIENT``.
+    """
+    path = os.path.join(CACHE_DIR, _key(method, url, params)+".neg.json")
+    try:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        ttl = NEG_CACHE_TTL if entry.get("permanent") else NEG_CACHE_TTL_TRANSIENT
+        if (time.time() - os.path.getmtime(path)) <= ttl:
+            return int(entry.get("status") or 0)
+    except Exception:
+        return None
+    return None
+
+def neg_cache_set(method: str, url: str, params: Optional[Dict[str, Any]], status: Optional[int], permanent: bool):
+    path = os.path.join(CACHE_DIR, _key(method, url, params)+".neg.json")
+    try:
+        write_atomic(path, {"status": status or 0, "permanent": bool(permanent)})
     except Exception:
         pass
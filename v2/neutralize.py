@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import warnings
 import numpy as np, pandas as pd
 def winsorize(s: pd.Series, p: float = 0.01)->pd.Series:
     if s.dropna().empty: return s
@@ -25,3 +26,43 @@ def residualize_industry_size(f: pd.Series, industries: pd.Series, log_mcap: pd.
         beta = np.linalg.pinv(XtX) @ X.T @ y
     resid = (y - X @ beta).ravel()
     return pd.Series(resid, index=idx).pipe(zscore).reindex(f.index)
+
+# --- Batched (date x symbol array) versions, used by the daily/weekly rebalance backtest.
+# Same maths as the per-date functions above, applied to every row at once.
+def winsorize_batch(A: np.ndarray, p: float = 0.01) -> np.ndarray:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+        lo = np.nanquantile(A, p, axis=1, keepdims=True); hi = np.nanquantile(A, 1-p, axis=1, keepdims=True)
+    return np.clip(A, lo, hi)
+def zscore_batch(A: np.ndarray) -> np.ndarray:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mu = np.nanmean(A, axis=1, keepdims=True); sd = np.nanstd(A, axis=1, keepdims=True)
+    return (A - mu)/(sd+1e-12)
+def residualize_industry_size_batch(A: np.ndarray, industries: pd.Series, log_mcap: pd.Series|None,
+                                    columns: pd.Index) -> np.ndarray:
+    """Row-wise ``residualize_industry_size``: industry dummies + size regression per date.
+
+    By Frisch-Waugh, residualizing on industry dummies (+ intercept) and size equals
+    demeaning y and size within industry (over that date's valid rows) and then
+    removing the size slope, so every date is solved with a few group sums.
+    """
+    M = ~np.isnan(A)
+    codes, _ = pd.factorize(industries.reindex(columns).fillna("UNK"))
+    G = np.zeros((len(columns), codes.max()+1 if len(codes) else 0)); G[np.arange(len(columns)), codes] = 1.0
+    Mf = M.astype(float)
+    cnt = np.maximum(Mf @ G, 1.0)
+    def demean(V):
+        return np.where(M, V - ((np.where(M, V, 0.0) @ G)/cnt)[:, codes], 0.0)
+    Yt = demean(A)
+    if log_mcap is not None:
+        x = log_mcap.reindex(columns).to_numpy(dtype=float)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            med = np.nanmedian(np.where(M, x[None, :], np.nan), axis=1)
+        X = np.where(np.isnan(x)[None, :], np.nan_to_num(med)[:, None], x[None, :])
+        Xt = demean(X)
+        sxx = (Xt*Xt).sum(axis=1)
+        b = np.where(sxx > 1e-12, (Xt*Yt).sum(axis=1)/np.where(sxx > 1e-12, sxx, 1.0), 0.0)
+        Yt = Yt - b[:, None]*Xt
+    return zscore_batch(np.where(M, Yt, np.nan))
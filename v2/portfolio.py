@@ -1,5 +1,7 @@
 """Portfolio construction helpers."""
 
+import warnings
+
 import numpy as np
 import pandas as pd
 
@@ -26,8 +28,10 @@ def next_month_returns(m_close: pd.DataFrame) -> pd.DataFrame:
     """
 
     return m_close.shift(-1).divide(m_close) - 1
-def beta_rolling_daily(df_close: pd.DataFrame, mkt_close: pd.Series, window: int=252)->pd.DataFrame:
-    rets = df_close.pct_change(); mret = mkt_close.pct_change()
+def beta_rolling_daily(df_close: pd.DataFrame, mkt_close: pd.Series, window: int=252, rets=None, mret=None)->pd.DataFrame:
+    # rets/mret: precomputed daily returns (e.g. FactorEngine's "daily_rets") to avoid recomputing them
+    rets = df_close.ffill().pct_change(fill_method=None) if rets is None else rets
+    mret = mkt_close.ffill().pct_change(fill_method=None) if mret is None else mret
     betas = pd.DataFrame(index=df_close.index, columns=df_close.columns, dtype=float)
     for t in range(window, len(df_close)):
         s = df_close.index[t-window+1]; e = df_close.index[t]
@@ -54,3 +58,265 @@ def portfolio_returns_from_weights(w_panel, m_rets):
         if dt in m_rets.index:
             out[dt]=float((w.reindex(m_rets.columns).fillna(0.0)*m_rets.loc[dt]).sum())
     return pd.Series(out).sort_index()
+
+
+class ShrinkageCov:
+    """Ledoit-Wolf shrinkage covariance of daily returns, updated incrementally.
+
+    Keeps running sums (``X'X`` and ``sum(x)``) over a fixed symbol universe
+    and a rolling window of ``window`` days: each ``update`` adds the newest
+    block of returns (e.g. one month) and subtracts the blocks that fell out of
+    the window.  ``matrix`` takes the covariance from the sums and the
+    shrinkage intensity from the retained blocks, restricted to the requested
+    names (O(T p) for those ``p`` names, instead of p x p fourth-moment sums
+    over the whole universe on every update).
+    Missing returns count as 0.  ``downside=True`` accumulates the downside
+    semi-covariance (returns clipped at 0, target 0) used by Sortino-style
+    objectives.
+    """
+
+    def __init__(self, columns, window: int = 252, downside: bool = False):
+        self.columns = pd.Index(columns)
+        self.window = window
+        self.downside = downside
+        p = len(self.columns)
+        self._xx = np.zeros((p, p))
+        self._sx = np.zeros(p)
+        self._blocks = []
+        self.n = 0
+
+    def update(self, rets: pd.DataFrame):
+        X = rets.reindex(columns=self.columns).to_numpy(dtype=float)
+        X = np.nan_to_num(X, nan=0.0, posinf=0.0, neginf=0.0)
+        if self.downside:
+            X = np.minimum(X, 0.0)
+        if not len(X):
+            return
+        self._add(X, 1.0)
+        self._blocks.append(X)
+        self.n += len(X)
+        while self._blocks and self.n - len(self._blocks[0]) >= self.window:
+            old = self._blocks.pop(0)
+            self._add(old, -1.0)
+            self.n -= len(old)
+
+    def _add(self, X, sign):
+        self._xx += sign * (X.T @ X)
+        self._sx += sign * X.sum(axis=0)
+
+    def matrix(self, symbols):
+        """Shrunk covariance over ``symbols`` and the shrinkage intensity used."""
+        ix = self.columns.get_indexer(pd.Index(symbols))
+        if (ix < 0).any():
+            raise KeyError("symbols outside the covariance universe")
+        T = self.n
+        if T < 2:
+            return np.eye(len(ix)) * 1e-4, 1.0
+        S = self._xx[np.ix_(ix, ix)] / T
+        m = np.zeros(len(ix)) if self.downside else self._sx[ix] / T
+        S = S - np.outer(m, m)
+        p = len(ix)
+        mu = np.trace(S) / p
+        d2 = np.sum((S - mu * np.eye(p)) ** 2)
+        # Ledoit-Wolf pi: sum_t |y_t y_t' - S|^2 = sum_t |y_t|^4 - T |S|^2, y_t the centred returns of these names
+        y4 = sum(float(np.sum(np.sum((B[:, ix] - m) ** 2, axis=1) ** 2)) for B in self._blocks)
+        b2 = (y4 / T - np.sum(S ** 2)) / T
+        b2 = min(max(b2, 0.0), d2)
+        shrink = b2 / d2 if d2 > 0 else 1.0
+        return shrink * mu * np.eye(p) + (1 - shrink) * S, shrink
+
+
+def _project_capped_simplex(y, cap, total=1.0, iters=60):
+    """Euclidean projection onto {0 <= x <= cap, sum(x) = total} (bisection on the shift)."""
+    lo, hi = y.min() - cap, y.max()
+    for _ in range(iters):
+        tau = 0.5 * (lo + hi)
+        if np.clip(y - tau, 0.0, cap).sum() > total:
+            lo = tau
+        else:
+            hi = tau
+    return np.clip(y - 0.5 * (lo + hi), 0.0, cap)
+
+
+def _max_eig(A, v0=None, iters=30):
+    v = np.ones(len(A)) if v0 is None or len(v0) != len(A) else v0
+    lam = 0.0
+    for _ in range(iters):
+        Av = A @ v
+        nv = np.linalg.norm(Av)
+        if nv == 0:
+            return 0.0
+        lam, v = nv / (np.linalg.norm(v) + 1e-300), Av / nv
+    return lam
+
+
+OBJECTIVES = ("min_var", "mean_variance", "max_sharpe", "downside")
+
+
+def build_optimized(z, betas, adv20, cov: ShrinkageCov, objective="min_var", long_short=True,
+                    min_liq_pctl=0.2, cand_q=0.3, gross=1.0, w_max=0.05, risk_aversion=1.0, ic=0.05,
+                    beta_penalty=1.0, w_prev=None, max_iter=500, tol=1e-5):
+    """Optimizer-based portfolio over the liquid names of a signal ``z``.
+
+    Objectives (risk from ``cov``, a ``ShrinkageCov``):
+
+    - ``"min_var"``: minimum variance (the signal only picks the candidates),
+    - ``"mean_variance"``: utility ``alpha'w - risk_aversion/2 w'Cw``
+      with Grinold alphas ``ic * vol * z``,
+    - ``"max_sharpe"``: the portfolio with the best ex-ante Sharpe
+      ``alpha'w / sqrt(w'Cw)`` along the mean-variance frontier of the
+      constrained legs (a warm-started sweep of the risk aversion),
+    - ``"downside"``: mean-variance utility on a downside semi-covariance (``cov.downside``).
+
+    Candidates are the top ``cand_q`` (long leg) and, if ``long_short``, the
+    bottom ``cand_q`` (short leg).  Each leg is a capped simplex (weights in
+    ``[0, w_max]`` summing to 1), solved with accelerated projected gradient
+    warm-started from ``w_prev`` (last month's weights); a beta penalty steers
+    the solve and the legs are finally scaled to exact beta neutrality and
+    ``gross``.
+    ``w.attrs`` carries ``n_iter``, ``shrinkage`` and the ``risk_aversion`` used.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"unknown objective {objective!r}")
+    if (objective == "downside") != cov.downside:
+        raise ValueError("objective 'downside' needs a ShrinkageCov(downside=True) and vice versa")
+    zero = pd.Series(0.0, index=z.index)
+    thr = adv20.quantile(min_liq_pctl); z_elig = z.where(adv20>=thr)
+    if long_short:
+        z_elig = z_elig.where(betas.reindex(z.index).notna())
+    z_elig = z_elig.where(z_elig.index.isin(cov.columns))
+    r = z_elig.rank(pct=True, method="first")
+    L = r.index[r >= (1-cand_q)]; S = r.index[r <= cand_q] if long_short else r.index[:0]
+    if len(L)==0 or (long_short and len(S)==0):
+        return zero
+    names = L.append(S)
+    C, shrink = cov.matrix(names)
+    nL = len(L)
+    sign = np.r_[np.ones(nL), -np.ones(len(S))]
+    if objective == "min_var":
+        alpha, gamma = np.zeros(len(names)), 1.0
+    else:
+        alpha, gamma = ic * np.sqrt(np.diag(C)) * z.reindex(names).to_numpy(dtype=float), risk_aversion
+    b = betas.reindex(names).fillna(1.0).to_numpy(dtype=float) if long_short else np.zeros(len(names))
+    lamC, bb = _max_eig(C), np.sum(b ** 2)
+    # per-name cap, never tighter than twice the equal weight (keeps small legs feasible and non-trivial)
+    capL = max(w_max, 2.0/nL); capS = max(w_max, 2.0/max(len(S), 1))
+
+    def project(v):
+        out = np.empty_like(v)
+        out[:nL] = _project_capped_simplex(v[:nL], capL)
+        if len(S):
+            out[nL:] = _project_capped_simplex(v[nL:], capS)
+        return out
+
+    def solve(g, v):
+        # accelerated projected gradient on g/2 w'Cw - alpha'w (+ beta penalty), from leg weights v
+        lam = g * lamC
+        # beta penalty scaled to the risk curvature so it steers without dominating the step size
+        rho = beta_penalty * lam / (bb + 1e-12) if long_short else 0.0
+        Lip = lam + rho * bb + 1e-12
+        y, t, n_iter = v.copy(), 1.0, 0
+        for n_iter in range(1, max_iter + 1):
+            w = sign * y
+            grad = sign * (g * (C @ w) - alpha + rho * b * (b @ w))
+            v_new = project(y - grad / Lip)
+            if np.dot(y - v_new, v_new - v) > 0:  # adaptive restart of the momentum
+                t = 1.0
+            t_new = 0.5 * (1 + np.sqrt(1 + 4 * t * t))
+            y = v_new + (t - 1) / t_new * (v_new - v)
+            done = np.max(np.abs(v_new - v)) < tol * max(capL, capS)
+            v, t = v_new, t_new
+            if done:
+                break
+        return v, n_iter
+
+    def legs(v):
+        # signed weights: leg sizes proportional to the other leg's beta (a*betaL == bb*betaS), total ``gross``
+        if not long_short:
+            return v
+        betaL, betaS = v[:nL] @ b[:nL], v[nL:] @ b[nL:]
+        scale = gross / (abs(betaS) + abs(betaL) + 1e-12)
+        return np.r_[abs(betaS) * scale * v[:nL], -abs(betaL) * scale * v[nL:]]
+
+    # warm start: previous weights restricted to today's legs (uniform for new legs)
+    v = np.r_[np.full(nL, 1.0/nL), np.full(len(S), 1.0/max(len(S), 1))]
+    if w_prev is not None:
+        prev = (w_prev.reindex(names).fillna(0.0).to_numpy(dtype=float) * sign).clip(min=0.0)
+        for sl in (slice(0, nL), slice(nL, None)):
+            if prev[sl].sum() > 0:
+                v[sl] = prev[sl] / prev[sl].sum()
+    v = project(v)
+    if objective == "max_sharpe":
+        # risk aversions around the one balancing mean alpha against mean variance, low to high
+        g0 = np.mean(np.abs(alpha)) / max(np.mean(np.diag(C)), 1e-12)
+        best, n_iter = (-np.inf, v, gamma), 0
+        for g in g0 * np.geomspace(1e-2, 1e2, 9):
+            v, k = solve(g, v)
+            n_iter += k
+            x = legs(v)
+            sharpe = (alpha @ x) / np.sqrt(max(x @ C @ x, 1e-300))
+            if sharpe > best[0]:
+                best = (sharpe, v, g)
+        _, v, gamma = best
+    else:
+        v, n_iter = solve(gamma, v)
+
+    x = legs(v)
+    w = pd.Series(x, index=names).reindex(z.index, fill_value=0.0)
+    w = w.fillna(0.0)
+    w.attrs.update(n_iter=n_iter, shrinkage=shrink, risk_aversion=gamma)
+    return w
+
+
+# --- Batched (rebalance date x symbol array) builders for the daily/weekly backtest.
+# Row t of the result equals build_long_only / build_long_short_beta_neutral on row t.
+
+def _rank_pct_first(A):
+    """Row-wise ``rank(pct=True, method="first")`` (NaN stays NaN)."""
+    valid = ~np.isnan(A)
+    order = np.argsort(np.where(valid, A, np.inf), axis=1, kind="stable")
+    ranks = np.empty(A.shape)
+    np.put_along_axis(ranks, order, np.arange(1, A.shape[1]+1, dtype=float)[None, :].repeat(len(A), 0), axis=1)
+    return np.where(valid, ranks/np.maximum(valid.sum(axis=1, keepdims=True), 1), np.nan)
+
+def _eligible(Z, ADV, min_liq_pctl):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        thr = np.nanquantile(ADV, min_liq_pctl, axis=1, keepdims=True)
+    return np.where(ADV >= thr, Z, np.nan)
+
+def build_long_only_batch(Z, ADV, min_liq_pctl=0.2, top_q=0.1):
+    r = _rank_pct_first(_eligible(Z, ADV, min_liq_pctl)); sel = (r >= (1-top_q)).astype(float)
+    n = sel.sum(axis=1, keepdims=True)
+    return np.where(n > 0, sel/np.maximum(n, 1), 0.0)
+
+def build_long_short_beta_neutral_batch(Z, B, ADV, min_liq_pctl=0.2, top_q=0.1, bottom_q=0.1, gross=1.0):
+    r = _rank_pct_first(_eligible(Z, ADV, min_liq_pctl))
+    L = (r >= (1-top_q)).astype(float); S = (r <= bottom_q).astype(float)
+    nL = L.sum(axis=1, keepdims=True); nS = S.sum(axis=1, keepdims=True)
+    wL = L/np.maximum(nL, 1); wS = S/np.maximum(nS, 1)
+    betaL = np.nansum(wL*B, axis=1, keepdims=True); betaS = np.nansum(wS*B, axis=1, keepdims=True)
+    a = np.abs(betaS)/(np.abs(betaL)+1e-12); b = np.abs(betaL)/(np.abs(betaS)+1e-12); scale = gross/(a+b+1e-12)
+    W = a*scale*wL - b*scale*wS
+    return np.where((nL > 0) & (nS > 0), W, 0.0)
+
+def portfolio_returns_carry_forward(W, reb_pos, R):
+    """Daily returns of buy-and-hold portfolios between rebalances.
+
+    ``W[k]`` is set at the close of day ``reb_pos[k]`` and held through
+    ``R[reb_pos[k]+1 .. reb_pos[k+1]]`` (missing returns count as 0): positions
+    drift with their returns, ``w_{d+1} = w_d (1 + r_d) / (1 + w_d.r_d)``, and
+    the unallocated capital (``1 - sum(W[k])``) stays in cash.  Returns an array
+    aligned with the rows of ``R`` (NaN before the first rebalance).
+    """
+    R = np.nan_to_num(R, nan=0.0)
+    out = np.full(len(R), np.nan)
+    ends = list(reb_pos[1:]) + [len(R)-1]
+    for k, (p, e) in enumerate(zip(reb_pos, ends)):
+        if e > p:
+            Rk = R[p+1:e+1]
+            # position values at the start of each day, per unit of capital at the rebalance
+            V = W[k] * np.vstack([np.ones((1, Rk.shape[1])), np.cumprod(1.0 + Rk[:-1], axis=0)])
+            nav = 1.0 + (V - W[k]).sum(axis=1)
+            out[p+1:e+1] = (V * Rk).sum(axis=1) / nav
+    return out
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Static HTML tearsheets built from the results DB.
+
+Reads ``performance``, ``portfolio_returns`` and the latest ``weights`` of
+each strategy, renders one self-contained page per strategy (stats, equity
+and drawdown charts as inline SVG, calendar returns, top holdings) plus an
+``index.html`` summary.  A ``manifest.json`` keeps a content hash per
+strategy: only strategies whose returns or latest weights changed since the
+last build are rendered again, in parallel worker processes.
+
+    python cli.py build-reports [--force] [--workers N]
+"""
+import os, re, json, html, hashlib, logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+from data.db import connection
+from performance import perf_stats
+
+TEMPLATE_VERSION = "1"  # bump to force a full rebuild after layout changes
+MANIFEST = "manifest.json"
+
+def page_name(strategy: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.@-]+", "_", strategy) + ".html"
+
+def periods_per_year(index: pd.DatetimeIndex) -> int:
+    """252 for daily/weekly-rebalanced series (daily returns), 12 for monthly ones."""
+    if len(index) < 3:
+        return 12
+    return 252 if np.median(np.diff(index.values).astype("timedelta64[D]").astype(int)) <= 7 else 12
+
+def load_results(conn=None):
+    """(performance frame, {strategy: returns}, {strategy: latest weights})."""
+    conn = conn or connection()
+    perf = pd.read_sql_query("SELECT * FROM performance", conn)
+    rets = pd.read_sql_query("SELECT date, strategy, ret FROM portfolio_returns", conn, parse_dates=["date"])
+    returns = {s: g.set_index("date")["ret"].sort_index() for s, g in rets.groupby("strategy", sort=False)}
+    # latest rebalance per strategy straight from the clustered table (no scan of the date view)
+    w = pd.read_sql_query(
+        "SELECT s.name AS strategy, y.symbol AS symbol, w.weight AS weight "
+        "FROM weights_c w JOIN (SELECT strategy_id, MAX(day) AS day FROM weights_c GROUP BY strategy_id) m "
+        "ON m.strategy_id = w.strategy_id AND m.day = w.day "
+        "JOIN strategies s ON s.id = w.strategy_id JOIN symbols y ON y.id = w.symbol_id", conn)
+    weights = {s: g.set_index("symbol")["weight"] for s, g in w.groupby("strategy", sort=False)}
+    return perf, returns, weights
+
+def content_hash(r: pd.Series, w: Optional[pd.Series]) -> str:
+    h = hashlib.sha256(TEMPLATE_VERSION.encode())
+    h.update(r.index.values.astype("datetime64[D]").tobytes())
+    h.update(r.to_numpy(dtype=float).tobytes())
+    if w is not None and len(w):
+        w = w.sort_index()
+        h.update("\x00".join(map(str, w.index)).encode())
+        h.update(w.to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+def _svg_line(y: np.ndarray, width: int = 620, height: int = 180, color: str = "#348dc1", baseline=None) -> str:
+    y = np.asarray(y, dtype=float)
+    ok = np.isfinite(y)
+    if ok.sum() < 2:
+        return ""
+    lo, hi = np.nanmin(y), np.nanmax(y)
+    if baseline is not None:
+        lo, hi = min(lo, baseline), max(hi, baseline)
+    span = (hi - lo) or 1.0
+    xs = np.linspace(0, width, len(y))
+    ys = height - (y - lo) / span * height
+    pts = " ".join(f"{x:.1f},{v:.1f}" for x, v in zip(xs[ok], ys[ok]))
+    base = ""
+    if baseline is not None:
+        yb = height - (baseline - lo) / span * height
+        base = f'<line x1="0" x2="{width}" y1="{yb:.1f}" y2="{yb:.1f}" stroke="#ccc"/>'
+    return (f'<svg viewBox="0 0 {width} {height}" preserveAspectRatio="none">{base}'
+            f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{pts}"/></svg>')
+
+def _fmt(v, pct=False) -> str:
+    if v is None or (isinstance(v, float) and not np.isfinite(v)):
+        return "-"
+    return f"{v:.2%}" if pct else (f"{v:,.2f}" if isinstance(v, float) else str(v))
+
+_PCT = {"CAGR", "AnnVol", "MaxDD", "HitRate"}
+_CSS = ("body{font:13px/1.4 Arial,sans-serif;margin:30px}.container{max-width:960px;margin:auto}"
+        "table{border-spacing:0;margin:0 0 30px;width:100%}td,th{text-align:right;padding:4px 6px}"
+        "td:first-child,th:first-child{text-align:left}tr:nth-child(even){background:#f6f6f6}"
+        "svg{width:100%;height:180px;border-bottom:1px solid #eee}h3{margin:24px 0 8px}")
+
+def _page(title: str, body: str) -> str:
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f'<style>{_CSS}</style></head><body><div class="container">{body}</div></body></html>')
+
+def render_tearsheet(strategy: str, r: pd.Series, w: Optional[pd.Series], path: str):
+    """Write one strategy page to ``path``."""
+    r = r.dropna()
+    k = periods_per_year(r.index)
+    stats = perf_stats(r, k)
+    eq = (1 + r).cumprod()
+    dd = eq / eq.cummax() - 1
+    rows = "".join(f"<tr><td>{n}</td><td>{_fmt(v, n in _PCT)}</td></tr>" for n, v in stats.items())
+    parts = [f"<h1>{html.escape(strategy)}</h1>",
+             f"<h4>{r.index.min():%Y-%m-%d} – {r.index.max():%Y-%m-%d} · {len(r)} periodos · {k}/año</h4>",
+             "<h3>Capital</h3>", _svg_line(eq.to_numpy(), baseline=1.0),
+             "<h3>Drawdown</h3>", _svg_line(dd.to_numpy(), color="#c13434", baseline=0.0),
+             f"<h3>Métricas</h3><table>{rows}</table>"]
+    cal = (1 + r).groupby([r.index.year, r.index.month]).prod() - 1
+    if len(cal):
+        tab = cal.unstack()
+        head = "".join(f"<th>{m}</th>" for m in tab.columns) + "<th>Año</th>"
+        yearly = (1 + r).groupby(r.index.year).prod() - 1
+        body = "".join(f"<tr><td>{y}</td>" + "".join(f"<td>{_fmt(tab.loc[y, m], True)}</td>" for m in tab.columns)
+                       + f"<td><b>{_fmt(yearly.loc[y], True)}</b></td></tr>" for y in tab.index)
+        parts.append(f"<h3>Retornos por mes</h3><table><tr><th></th>{head}</tr>{body}</table>")
+    if w is not None and len(w):
+        top = w.reindex(w.abs().sort_values(ascending=False).index).head(20)
+        body = "".join(f"<tr><td>{html.escape(str(s))}</td><td>{_fmt(float(v), True)}</td></tr>" for s, v in top.items())
+        parts.append(f"<h3>Pesos último rebalanceo (top 20)</h3><table>{body}</table>")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(_page(strategy, "".join(parts)))
+    os.replace(tmp, path)
+
+def _render_job(args):
+    render_tearsheet(*args)
+    return args[0]
+
+def render_summary(perf: pd.DataFrame, pages: Dict[str, str], path: str):
+    perf = perf.sort_values("CAGR", ascending=False)
+    cols = ["CAGR", "AnnVol", "Sharpe", "Sortino", "MaxDD", "HitRate", "N"]
+    head = "<tr><th>Estrategia</th>" + "".join(f"<th>{c}</th>" for c in cols) + "</tr>"
+    body = ""
+    for _, row in perf.iterrows():
+        s = row["strategy"]
+        name = f'<a href="{html.escape(pages[s])}">{html.escape(s)}</a>' if s in pages else html.escape(s)
+        body += f"<tr><td>{name}</td>" + "".join(
+            f"<td>{_fmt(None if pd.isna(row[c]) else (int(row[c]) if c == 'N' else float(row[c])), c in _PCT)}</td>"
+            for c in cols) + "</tr>"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(_page("Factor study", f"<h1>Estrategias ({len(perf)})</h1><table>{head}{body}</table>"))
+
+def build_reports(out_dir: Optional[str] = None, force: bool = False, workers: Optional[int] = None) -> List[str]:
+    """Render changed tearsheets and the summary; returns the strategies rendered."""
+    out_dir = out_dir or config.REPORTS_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    mpath = os.path.join(out_dir, MANIFEST)
+    manifest = {}
+    if not force and os.path.exists(mpath):
+        with open(mpath, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    perf, returns, weights = load_results()
+    hashes = {s: content_hash(r, weights.get(s)) for s, r in returns.items()}
+    pages = {s: page_name(s) for s in returns}
+    todo = [s for s in returns
+            if manifest.get(s) != hashes[s] or not os.path.exists(os.path.join(out_dir, pages[s]))]
+    jobs = [(s, returns[s], weights.get(s), os.path.join(out_dir, pages[s])) for s in todo]
+    workers = workers or config.REPORT_WORKERS or os.cpu_count() or 1
+    if workers > 1 and len(jobs) >= 2 * workers:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(_render_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    else:
+        for job in jobs:
+            _render_job(job)
+
+    render_summary(perf, pages, os.path.join(out_dir, "index.html"))
+    for s in set(manifest) - set(returns):  # strategies no longer in the DB
+        try:
+            os.remove(os.path.join(out_dir, page_name(s)))
+        except OSError:
+            pass
+    tmp = f"{mpath}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(hashes, f)
+    os.replace(tmp, mpath)
+    logging.info("Informes: %d/%d estrategias regeneradas -> %s", len(todo), len(returns), out_dir)
+    return todo
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Intermarket beta rotation (notebook 02), vectorized over a grid of pairs and lookbacks.
+
+For a pair (defensive, market), e.g. (XLU, VTI): when the defensive/market
+price ratio rose over the last ``L`` rebalance periods, hold the defensive
+leg until the next rebalance, otherwise hold the market.  All pairs and
+lookbacks are evaluated at once as (lookback, rebalance, pair) arrays, and
+daily returns come out as one ``day x config`` matrix, so the whole grid is
+backtested in a single pass next to the factor strategies.
+
+Strategy names: ``ROTATION::<DEF>_<MKT>_<L><freq>``, e.g. ``ROTATION::XLU_VTI_4W``.
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence, Tuple
+
+def parse_pairs(spec: str) -> List[Tuple[str, str]]:
+    """``"XLU:VTI,XLP:SPY"`` -> ``[("XLU", "VTI"), ("XLP", "SPY")]``."""
+    out = []
+    for item in (spec or "").split(","):
+        a, sep, b = item.strip().upper().partition(":")
+        if a and sep and b:
+            out.append((a, b))
+    return out
+
+def rotation_tickers(pairs: Sequence[Tuple[str, str]]) -> List[str]:
+    return sorted({t for p in pairs for t in p})
+
+def rotation_grid(close: pd.DataFrame, pairs: Sequence[Tuple[str, str]], lookbacks: Sequence[int],
+                  reb_pos: np.ndarray, freq: str = "W", cost_bps: float = 0.0):
+    """Backtest every (pair, lookback) configuration at once.
+
+    ``close`` is day x ticker; ``reb_pos`` the row positions of the rebalance
+    days.  The signal observed at the close of rebalance ``k`` is held from the
+    next day through rebalance ``k+1``; a switch costs ``2 * cost_bps`` (sell
+    one leg, buy the other).  Returns ``(names, returns, holdings)``: names per
+    config, a day x config DataFrame of daily returns (NaN until the first
+    signal) and, per config, ``{rebalance date: held ticker}``.
+    """
+    pairs = [p for p in pairs if p[0] in close.columns and p[1] in close.columns]
+    lookbacks = np.asarray(sorted(set(int(l) for l in lookbacks if int(l) > 0)), dtype=int)
+    if not pairs or not len(lookbacks) or not len(reb_pos):
+        return [], pd.DataFrame(index=close.index), {}
+    a = close.columns.get_indexer([p[0] for p in pairs])
+    b = close.columns.get_indexer([p[1] for p in pairs])
+    P = close.to_numpy(dtype=float)
+    R = close.ffill().pct_change(fill_method=None).to_numpy(dtype=float)
+
+    ratio = P[reb_pos][:, a] / P[reb_pos][:, b]                        # (n_reb, pairs)
+    n = len(reb_pos)
+    lag = np.arange(n)[None, :] - lookbacks[:, None]                   # (K, n_reb)
+    roc = ratio[None, :, :] / ratio[np.clip(lag, 0, None)] - 1.0       # (K, n_reb, pairs)
+    roc[lag < 0] = np.nan
+    valid = np.isfinite(roc)
+    hold_a = roc > 0
+
+    # day t is governed by the last rebalance strictly before it
+    k_of_t = np.searchsorted(reb_pos, np.arange(len(P)), side="left") - 1
+    live = k_of_t >= 0
+    k_t = np.clip(k_of_t, 0, None)
+    Ra, Rb = np.nan_to_num(R[:, a]), np.nan_to_num(R[:, b])            # (T, pairs)
+    rets = np.where(hold_a[:, k_t, :], Ra[None], Rb[None])             # (K, T, pairs)
+    rets[~valid[:, k_t, :] | ~live[None, :, None]] = np.nan
+
+    if cost_bps:
+        switch = np.zeros_like(valid)
+        switch[:, 1:] = (hold_a[:, 1:] != hold_a[:, :-1]) & valid[:, 1:] & valid[:, :-1]
+        first_day = reb_pos + 1
+        ok = first_day < len(P)
+        rets[:, first_day[ok], :] -= 2.0 * cost_bps / 1e4 * switch[:, ok, :]
+
+    names, holdings, cols = [], {}, []
+    dates = close.index[reb_pos]
+    for j, (da, mk) in enumerate(pairs):
+        for i, L in enumerate(lookbacks):
+            name = f"ROTATION::{da}_{mk}_{L}{freq}"
+            names.append(name)
+            cols.append(rets[i, :, j])
+            held = np.where(hold_a[i, :, j], da, mk)
+            holdings[name] = {dates[k]: held[k] for k in np.flatnonzero(valid[i, :, j])}
+    return names, pd.DataFrame(np.column_stack(cols), index=close.index, columns=names), holdings
+
+def holdings_to_weights(holdings: Dict[str, Dict[pd.Timestamp, str]]) -> Dict[str, Dict[pd.Timestamp, pd.Series]]:
+    """``weights_panel`` entries (100% in the held leg) for ``save_results``."""
+    return {name: {dt: pd.Series({t: 1.0}) for dt, t in h.items()} for name, h in holdings.items()}
+
+def to_formation_months(daily: pd.DataFrame) -> pd.DataFrame:
+    """Compound daily returns per calendar month, labelled by the month *before*
+    (the formation-month convention of ``next_month_returns``)."""
+    m = np.log1p(daily).resample("ME").sum(min_count=1)
+    return np.expm1(m).shift(-1).iloc[:-1]
@@ -1,27 +1,39 @@
 # -*- coding: utf-8 -*-
-import os, logging, argparse
+import os, logging, argparse, warnings
 import numpy as np, pandas as pd
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
-from config import (DEFAULT_START, DEFAULT_END, EXCHANGES, OUT_DIR, TOP_Q, BOTTOM_Q, MIN_LIQ_PCTL, BETA_WINDOW_D)
-from data.db import init_db, upsert_many, latest_price_date
+from config import (DEFAULT_START, DEFAULT_END, EXCHANGES, OUT_DIR, CUBE_DIR, TOP_Q, BOTTOM_Q, MIN_LIQ_PCTL,
+                    BETA_WINDOW_D, BENCHMARK, ROTATION_PAIRS, ROTATION_LOOKBACKS, ROTATION_FREQ, ROTATION_COST_BPS,
+                    WF_TRAIN_MONTHS, WF_MIN_TRAIN, WF_METHODS)
+from data.db import (init_db, upsert_many, latest_price_date, start_writer, stop_writer, connection, flush_writes,
+                     RECONCILED_SQL)
 from data.universe import get_universe, fetch_profiles, persist_universe
-from data.prices_ndl import get_eod_prices_ndl, persist_prices
+from data.prices_ndl import persist_prices
+from data.price_sources import get_eod_prices, anchor_start, reconciled, STATS as PRICE_STATS
 from data.fundamentals import compute_static_factors_from_ndl
 from data.altdata_fmp import insider_net_90d, sentiment_30d
-from neutralize import winsorize, zscore, residualize_industry_size
-from portfolio import next_month_returns, beta_rolling_daily, build_long_only, build_long_short_beta_neutral, portfolio_returns_from_weights
+from neutralize import (winsorize, zscore, residualize_industry_size, winsorize_batch, zscore_batch,
+                        residualize_industry_size_batch)
+from portfolio import (beta_rolling_daily, build_long_only, build_long_short_beta_neutral, build_optimized,
+                       portfolio_returns_from_weights, ShrinkageCov, build_long_only_batch,
+                       build_long_short_beta_neutral_batch, portfolio_returns_carry_forward, OBJECTIVES)
+from factors import FACTORS, FactorEngine, composite_factors, required_factors
 from performance import perf_stats
+from cube import CubeWriter
+from rotation import parse_pairs, rotation_tickers, rotation_grid, holdings_to_weights, to_formation_months
+from analytics.fama_macbeth import fama_macbeth, newey_west_tstats, attribution
+from analytics.ic import rank_ic
+from analytics.walk_forward import walk_forward
+from clients.retry import BUDGET
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
-def prepare_universe(include_delisted: bool, universe_size: int, seed: int):
-    uni = get_universe(EXCHANGES, include_delisted, universe_size, seed=seed)
-    persist_universe(uni)
-
-    # 1) Universo (FMP)
-    uni = get_universe(EXCHANGES, include_delisted, universe_size, seed=seed)
+def prepare_universe(include_delisted: bool, universe_size: int, seed: int, shard_filter=None, universe=None):
+    # 1) Universo (FMP); shard_filter(symbol) -> bool keeps only this shard's symbols. ``universe``: the
+    # get_universe frame already downloaded by the caller (a shard run fetches /stock/list once, in the parent)
+    uni = get_universe(EXCHANGES, include_delisted, universe_size, seed=seed) if universe is None else universe
+    if shard_filter is not None:
+        uni = uni[uni["symbol"].map(shard_filter)].reset_index(drop=True)
     persist_universe(uni)
 
     # Perfilar (sector/industria/mcap)
@@ -39,38 +51,94 @@ def prepare_universe(include_delisted: bool, universe_size: int, seed: int):
     log_mcap = np.log1p(df_uni["market_cap"])
     return uni, industries, log_mcap
 
-def fetch_price_data(syms, start: str, end: str):
-    syms_all = syms + ["SPY"]
-    price_map: Dict[str, pd.DataFrame] = {}
+def incremental_start(symbol: str, start: str, end: str) -> Optional[str]:
+    """Day after the last stored bar of ``symbol`` (``start`` if none); None when already up to ``end``."""
+    last_dt = latest_price_date(symbol)
+    if not last_dt:
+        return start
+    try:
+        next_dt = (pd.to_datetime(last_dt) + pd.Timedelta(days=1)).date().isoformat()
+    except Exception:
+        return start
+    return None if next_dt > end else next_dt
+
+def fetch_price_data(syms, start: str, end: str, persist_benchmark: bool = False, benchmark_px=None):
+    """Incremental prices of ``syms`` plus the benchmark (``benchmark_px``: bars fetched once by the caller)."""
+    syms_all = syms + ([] if benchmark_px is not None else [BENCHMARK])
+    price_map: Dict[str, pd.DataFrame] = {} if benchmark_px is None else {BENCHMARK: benchmark_px}
     for i, s in enumerate(syms_all, 1):
         if i % 25 == 0:
-            logging.info("Precios NDL %d/%d ...", i, len(syms_all))
-        last_dt = latest_price_date(s)
-        start_dt = start
-        if last_dt:
-            try:
-                next_dt = (pd.to_datetime(last_dt) + pd.Timedelta(days=1)).date().isoformat()
-                if next_dt > end:
-                    continue
-                start_dt = next_dt
-            except Exception:
-                pass
-        df = get_eod_prices_ndl(s, start_dt, end)
+            logging.info("Precios %d/%d ...", i, len(syms_all))
+        start_dt = incremental_start(s, start, end)
+        if start_dt is None:
+            continue
+        df = get_eod_prices(s, start_dt, end, anchor=stored_prices(s, anchor_start(start_dt), start_dt),
+                            has_basis=latest_price_date(s) is not None)
         if df is not None and not df.empty:
             price_map[s] = df
+    logging.info("Fuentes de precios: %s", PRICE_STATS.summary())
     if price_map:
-        persist_prices({k: v for k, v in price_map.items() if k in syms})
+        persist_prices({k: v for k, v in price_map.items() if k in syms or persist_benchmark})
         return price_map
 
-def compute_factors(syms, price_map):
+def stored_prices(symbol: str, start: str, end: str) -> Optional[pd.DataFrame]:
+    """Reconciled close/volume/source bars of ``symbol`` in ``[start, end]`` from the DB (None if there are none)."""
+    flush_writes()
+    df = pd.read_sql_query("SELECT date, close, volume, source FROM prices_daily WHERE symbol = ? "
+                           f"AND date BETWEEN ? AND ? AND {RECONCILED_SQL} ORDER BY date", connection(),
+                           params=(symbol, start, end), parse_dates=["date"], index_col="date")
+    return df if len(df) else None
+
+def fetch_rotation_prices(start: str, end: str):
+    """Incremental prices of the intermarket rotation legs (kept out of the factor universe).
+
+    Called once per run by the process that owns the main DB (never by shard workers).
+    """
+    price_map = {}
+    for t in rotation_tickers(parse_pairs(ROTATION_PAIRS)):
+        start_dt = incremental_start(t, start, end)
+        if start_dt is None:
+            continue
+        df = get_eod_prices(t, start_dt, end, anchor=stored_prices(t, anchor_start(start_dt), start_dt),
+                            has_basis=latest_price_date(t) is not None)
+        if df is not None and not df.empty:
+            price_map[t] = df
+    persist_prices(price_map)
+
+def load_rotation_close(index: pd.DatetimeIndex):
+    """Rotation leg closes from the DB, on the trading days of ``index`` (None if not configured)."""
+    tickers = rotation_tickers(parse_pairs(ROTATION_PAIRS))
+    if not tickers or not len(index):
+        return None
+    flush_writes()
+    px = pd.read_sql_query(
+        f"SELECT symbol, date, close FROM prices_daily WHERE symbol IN ({','.join('?' * len(tickers))}) "
+        f"AND date BETWEEN ? AND ? AND {RECONCILED_SQL}", connection(),
+        params=(*tickers, index[0].strftime("%Y-%m-%d"), index[-1].strftime("%Y-%m-%d")), parse_dates=["date"])
+    if px.empty:
+        return None
+    return px.pivot(index="date", columns="symbol", values="close").reindex(index)
+
+def rotation_strategies(rotation_close, want=lambda name: True):
+    """Daily returns (day x strategy) and weights of the rotation grid."""
+    if rotation_close is None:
+        return pd.DataFrame(), {}
+    names, daily, holdings = rotation_grid(rotation_close, parse_pairs(ROTATION_PAIRS), ROTATION_LOOKBACKS,
+                                           rebalance_positions(rotation_close.index, ROTATION_FREQ),
+                                           ROTATION_FREQ, ROTATION_COST_BPS)
+    keep = [n for n in names if want(n)]
+    return daily[keep], holdings_to_weights({n: holdings[n] for n in keep})
+
+def compute_factors(syms, engine: FactorEngine):
     factor_rows = []
+    snap = engine.snapshot()
     for i, s in enumerate(syms, 1):
         if i % 25 == 0:
             logging.info("Factores NDL+FMP %d/%d ...", i, len(syms))
-        px = price_map.get(s)
-        if px is None:
+        if s not in snap.index:
             continue
-        f = compute_static_factors_from_ndl(s, px)
+        f = compute_static_factors_from_ndl(s)
+        f.update(snap.loc[s].to_dict())
         # alt-data
         f["InsiderNet90d"] = insider_net_90d(s)
         f["Sentiment30d"] = sentiment_30d(s)
@@ -110,30 +178,19 @@ def compute_factors(syms, price_map):
     ).T
     return fac_df
 
-def monthly_panels(price_map):
-    all_idx = sorted(set().union(*[df.index for df in price_map.values()]))
-    df_close = pd.DataFrame(
-        index=all_idx, data={s: price_map[s]["close"] for s in price_map}
-    ).sort_index()
-    df_vol = pd.DataFrame(
-        index=all_idx, data={s: price_map[s]["volume"] for s in price_map}
-    ).sort_index()
-    m_close = df_close.resample("ME").last()
-    adv20_m = (df_close * df_vol).rolling(20).mean().resample("M").last()
-    vol60_m = df_close.pct_change().rolling(60).std().resample("M").last()
-    m_rets = next_month_returns(m_close)
-    return df_close, m_close, adv20_m, vol60_m, m_rets
-
-
-def compute_betas(df_close):
-    if "SPY" not in df_close.columns:
+def compute_betas(engine: FactorEngine):
+    df_close = engine.get("close")
+    if BENCHMARK not in df_close.columns:
         return None
+    rets = engine.get("daily_rets")
     betas_daily = beta_rolling_daily(
-        df_close.drop(columns=["SPY"], errors="ignore"),
-        df_close["SPY"],
+        df_close.drop(columns=[BENCHMARK], errors="ignore"),
+        df_close[BENCHMARK],
         window=BETA_WINDOW_D,
+        rets=rets.drop(columns=[BENCHMARK], errors="ignore"),
+        mret=rets[BENCHMARK],
     )
-    betas = betas_daily.resample("M").last()
+    betas = betas_daily.resample("ME").last()
     upsert_many(
         "betas_monthly",
         [
@@ -145,70 +202,219 @@ def compute_betas(df_close):
     )
     return betas
 
-def build_and_backtest(m_close, adv20_m, vol60_m, m_rets, fac_df, betas, industries, log_mcap):
+STATIC_COLS = ["B2M", "EBIT_EV", "ROA_TTM", "AssetGrowthYoY", "InsiderNet90d", "Sentiment30d"]
+
+def load_panels(syms=None, start: str = DEFAULT_START, end: str = DEFAULT_END):
+    """Rebuild engine inputs, betas and neutralization inputs from the DB (e.g. after a shard merge).
+
+    ``syms=None`` keeps every symbol of the stored universe.
+    """
+    conn = connection()
+    if syms is None:  # the stored universe (prices_daily also holds e.g. the rotation ETFs)
+        syms = [r[0] for r in conn.execute("SELECT symbol FROM universe")] or None
+    keep = None if syms is None else set(syms) | {BENCHMARK}
+    def _keep(df):
+        return df if keep is None else df[df["symbol"].isin(keep)]
+    # unreconciled secondary-source bars stay out of the panels (and so out of returns)
+    px = _keep(pd.read_sql_query("SELECT symbol, date, close, volume FROM prices_daily "
+                                 f"WHERE date BETWEEN ? AND ? AND {RECONCILED_SQL}",
+                                 conn, params=(start, end), parse_dates=["date"]))
+    close = px.pivot(index="date", columns="symbol", values="close").sort_index()
+    volume = px.pivot(index="date", columns="symbol", values="volume").sort_index()
+
+    st = _keep(pd.read_sql_query(f"SELECT symbol, {', '.join(STATIC_COLS)} FROM factors_static", conn))
+    engine = FactorEngine(close, volume, st.set_index("symbol"))
+
+    b = _keep(pd.read_sql_query("SELECT date, symbol, beta_252 FROM betas_monthly", conn, parse_dates=["date"]))
+    betas = b.pivot(index="date", columns="symbol", values="beta_252").sort_index() if not b.empty else None
+
+    uni = _keep(pd.read_sql_query("SELECT symbol, industry, market_cap FROM universe", conn)).set_index("symbol")
+    return engine, betas, uni["industry"], np.log1p(uni["market_cap"].astype(float))
+
+def neutralized_factors(engine: FactorEngine, dt, facs, industries, log_mcap) -> pd.DataFrame:
+    """Winsorized, signed z-scores of ``facs`` at month ``dt``, residualized on industry + size."""
+    cols = engine.get("m_close").columns
+    z_resid = {}
+    for f in facs:
+        s = winsorize(engine.cross_section(f, dt, cols).astype(float), p=0.01)
+        z = zscore(s) * FACTORS[f].sign
+        z_resid[f] = residualize_industry_size(z, industries, log_mcap)
+    return pd.DataFrame(z_resid)
+
+def write_cube_matrices(cube: CubeWriter, engine: FactorEngine, betas):
+    cube.write_matrix("m_rets", engine.get("m_rets"))
+    cube.write_matrix("adv20", engine.get("adv20_m"))
+    cube.write_matrix("beta", betas)
+
+def build_and_backtest(engine: FactorEngine, betas, industries, log_mcap, strategies=None, optimizer=None,
+                       cube: CubeWriter = None, rotation_close=None):
+    """Monthly factor / composite portfolios.
+
+    ``strategies`` restricts the run to the given strategy names; only the
+    factors (and intermediates) they need are evaluated.  ``optimizer``
+    ("min_var", "mean_variance", "max_sharpe" or "downside") adds ``COMPOSITE_OPT_LS::<objective>``,
+    an optimized beta-neutral composite on a rolling shrinkage covariance.
+    ``cube`` receives each month's neutralized z-scores plus the return, ADV
+    and beta matrices (see ``cube.py``).  ``rotation_close`` (daily closes of
+    the rotation legs) adds the ``ROTATION::`` grid, compounded to months.
+    """
+    m_close = engine.get("m_close")
+    adv20_m = engine.get("adv20_m")
+    m_rets = engine.get("m_rets")
     months = m_close.index
     weights_panel = {}
     returns_map = {}
-    mom_12_1 = m_close.shift(1) / m_close.shift(12) - 1.0
-    fac_static = fac_df.reindex(m_close.columns)
+    facs = required_factors(strategies)
+    comp_cols = composite_factors()
+    want = (lambda name: True) if strategies is None else set(strategies).__contains__
+    sc = "COMPOSITE_LS_BETA_NEUTRAL"
+    so = f"COMPOSITE_OPT_LS::{optimizer}"
+    if optimizer and not want(so):
+        optimizer = None
+    if optimizer:
+        rets_d = engine.get("daily_rets")
+        cov = ShrinkageCov(m_close.columns.drop(BENCHMARK, errors="ignore"), window=BETA_WINDOW_D,
+                           downside=(optimizer == "downside"))
+        prev_dt, w_opt = None, None
 
     for dt in months:
-        mom_dt = mom_12_1.loc[dt]
-        vol_dt = vol60_m.loc[dt]
         adv_dt = adv20_m.loc[dt]
-        fac_panel = pd.DataFrame(
-            {
-                "B2M": fac_static["B2M"],
-                "EBIT_EV": fac_static["EBIT_EV"],
-                "ROA_TTM": fac_static["ROA_TTM"],
-                "AssetGrowthYoY": fac_static["AssetGrowthYoY"],
-                "MOM_12_1": mom_dt,
-                "VOL60": vol_dt,
-                "InsiderNet90d": fac_static["InsiderNet90d"],
-                "Sentiment30d": fac_static["Sentiment30d"],
-            }
-        )
+        if optimizer:
+            cov.update(rets_d.loc[(rets_d.index > prev_dt) & (rets_d.index <= dt)] if prev_dt is not None
+                       else rets_d.loc[:dt])
+            prev_dt = dt
 
-        z_resid = {}
-        for f in fac_panel.columns:
-            s = winsorize(fac_panel[f].astype(float), p=0.01)
-            dir_ = 1 if f in ["B2M", "EBIT_EV", "ROA_TTM", "MOM_12_1", "InsiderNet90d", "Sentiment30d"] else -1
-            z = zscore(s) * dir_
-            z = residualize_industry_size(z, industries, log_mcap)
-            z_resid[f]=z
-        zdf = pd.DataFrame(z_resid)
+        zdf = neutralized_factors(engine, dt, facs, industries, log_mcap)
+        if cube is not None:
+            cube.write_month(dt, zdf)
 
-        for f in ["B2M", "EBIT_EV", "ROA_TTM", "MOM_12_1", "VOL60", "AssetGrowthYoY", "InsiderNet90d", "Sentiment30d"]:
+        for f in facs:
             lo = f"FACTOR_LONG_ONLY::{f}"
-            weights_panel.setdefault(lo, {})[dt] = build_long_only(zdf[f], adv_dt, MIN_LIQ_PCTL, TOP_Q)
+            if want(lo):
+                weights_panel.setdefault(lo, {})[dt] = build_long_only(zdf[f], adv_dt, MIN_LIQ_PCTL, TOP_Q)
             ls = f"FACTOR_LS_BETA_NEUTRAL::{f}"
-            if betas is not None and dt in betas.index:
+            if want(ls) and betas is not None and dt in betas.index:
                 weights_panel.setdefault(ls, {})[dt] = build_long_short_beta_neutral(
                     zdf[f], betas.loc[dt], adv_dt, MIN_LIQ_PCTL, TOP_Q, BOTTOM_Q, 1.0
                 )
 
-        comp_cols = [
-            "B2M",
-            "EBIT_EV",
-            "ROA_TTM",
-            "MOM_12_1",
-            "InsiderNet90d",
-            "Sentiment30d",
-            "AssetGrowthYoY",
-            "VOL60",
-        ]
-        comp = zdf[comp_cols].mean(axis=1, skipna=True)
-        sc = "COMPOSITE_LS_BETA_NEUTRAL"
-        if betas is not None and dt in betas.index:
+        comp = zdf[comp_cols].mean(axis=1, skipna=True) if set(comp_cols) <= set(zdf.columns) else None
+        if want(sc) and betas is not None and dt in betas.index:
             weights_panel.setdefault(sc, {})[dt] = build_long_short_beta_neutral(
                 comp, betas.loc[dt], adv_dt, MIN_LIQ_PCTL, TOP_Q, BOTTOM_Q, 1.0
             )
+        if optimizer and betas is not None and dt in betas.index and cov.n >= 60:
+            w_opt = build_optimized(comp, betas.loc[dt], adv_dt, cov, objective=optimizer,
+                                    min_liq_pctl=MIN_LIQ_PCTL, w_prev=w_opt)
+            weights_panel.setdefault(so, {})[dt] = w_opt
+
+    if cube is not None:
+        write_cube_matrices(cube, engine, betas)
 
     for strat, wpan in weights_panel.items():
         returns_map[strat] = portfolio_returns_from_weights(wpan, m_rets)
+
+    daily, rot_w = rotation_strategies(rotation_close, want)
+    monthly = to_formation_months(daily).reindex(months) if len(daily.columns) else daily
+    for strat in daily.columns:
+        returns_map[strat] = monthly[strat].dropna()
+    weights_panel.update(rot_w)
     return weights_panel, returns_map
 
-def save_results(weights_panel, returns_map):
+def rebalance_positions(index: pd.DatetimeIndex, freq: str) -> np.ndarray:
+    """Row positions of the rebalance days: every day ("D"), last day of each week ("W") or month ("M")."""
+    pos = pd.Series(np.arange(len(index)), index=index)
+    if freq == "D":
+        return pos.to_numpy()
+    if freq not in ("W", "M"):
+        raise ValueError(f"unknown rebalance frequency {freq!r}")
+    return pos.groupby(index.to_period(freq)).max().to_numpy()
+
+def build_and_backtest_rebalance(engine: FactorEngine, industries, log_mcap, freq: str = "D", strategies=None,
+                                 rotation_close=None):
+    """Array-based backtest at daily ("D"), weekly ("W") or monthly ("M") rebalancing.
+
+    Signals for all rebalance dates are computed at once as date x symbol
+    arrays (batched winsorize / z-score / industry-size neutralization), the
+    same long-only and beta-neutral rules as ``build_and_backtest`` are applied
+    row-wise, and weights are carried forward between rebalances to produce
+    *daily* returns.  Strategy names get an ``@<freq>`` suffix; stored weights
+    are month-end snapshots only.  ``rotation_close`` adds the ``ROTATION::``
+    grid (its own rebalance frequency, ``ROTATION_FREQ``; same ``@<freq>`` suffix).
+    """
+    close = engine.get("close")
+    days = close.index
+    cols = close.columns
+    R = engine.get("daily_rets").reindex(columns=cols).to_numpy(dtype=float)
+    pos = rebalance_positions(days, freq)
+    pos = pos[pos >= 20]  # ADV20 warm-up
+    dates = days[pos]
+    ADV = engine.get("adv20").reindex(index=dates, columns=cols).to_numpy(dtype=float)
+    B = engine.get("beta_d").reindex(index=dates, columns=cols).to_numpy(dtype=float)
+    has_beta = ~np.all(np.isnan(B), axis=1, keepdims=True)
+    facs = required_factors(strategies)
+    comp_cols = composite_factors()
+    want = (lambda name: True) if strategies is None else set(strategies).__contains__
+
+    Z = {}
+    for f in facs:
+        A = winsorize_batch(engine.panel_at(f, dates, cols), p=0.01)
+        Z[f] = residualize_industry_size_batch(zscore_batch(A) * FACTORS[f].sign, industries, log_mcap, cols)
+    W = {}
+    for f in facs:
+        if want(f"FACTOR_LONG_ONLY::{f}"):
+            W[f"FACTOR_LONG_ONLY::{f}"] = build_long_only_batch(Z[f], ADV, MIN_LIQ_PCTL, TOP_Q)
+        if want(f"FACTOR_LS_BETA_NEUTRAL::{f}"):
+            W[f"FACTOR_LS_BETA_NEUTRAL::{f}"] = np.where(has_beta, build_long_short_beta_neutral_batch(
+                Z[f], B, ADV, MIN_LIQ_PCTL, TOP_Q, BOTTOM_Q, 1.0), 0.0)
+    sc = "COMPOSITE_LS_BETA_NEUTRAL"
+    if want(sc):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # symbols with no factor at all
+            comp = np.nanmean(np.stack([Z[f] for f in comp_cols]), axis=0)
+        W[sc] = np.where(has_beta, build_long_short_beta_neutral_batch(
+            comp, B, ADV, MIN_LIQ_PCTL, TOP_Q, BOTTOM_Q, 1.0), 0.0)
+
+    month_end = pd.Series(np.arange(len(dates)), index=dates).groupby(dates.to_period("M")).max().to_numpy()
+    weights_panel, returns_map = {}, {}
+    for strat, Wk in W.items():
+        name = f"{strat}@{freq}"
+        active = np.flatnonzero(np.abs(Wk).sum(axis=1) > 0)
+        if not len(active):
+            continue
+        first = active[0]
+        rets = portfolio_returns_carry_forward(Wk[first:], pos[first:], R)
+        returns_map[name] = pd.Series(rets, index=days).iloc[pos[first]+1:]
+        weights_panel[name] = {dates[k]: pd.Series(Wk[k], index=cols) for k in month_end if k >= first}
+
+    # daily rows under their own names: the monthly study stores month-end returns as ROTATION::<...>
+    daily, rot_w = rotation_strategies(rotation_close, want)
+    for strat in daily.columns:
+        returns_map[f"{strat}@{freq}"] = daily[strat].dropna()
+    weights_panel.update({f"{strat}@{freq}": w for strat, w in rot_w.items()})
+    return weights_panel, returns_map
+
+def factor_stage(engine: FactorEngine, betas, industries, log_mcap, factors=None):
+    """Factor stage on its own: the neutralized monthly z-scores of ``factors``
+    (default: all) into the cube, then the IC and Fama-MacBeth analytics.
+
+    Same cube as the monthly backtest exports, without building portfolios.
+    """
+    m_close = engine.get("m_close")
+    facs = list(factors or FACTORS)
+    cube = CubeWriter(CUBE_DIR or None, m_close.index, m_close.columns, facs)
+    for dt in m_close.index:
+        cube.write_month(dt, neutralized_factors(engine, dt, facs, industries, log_mcap))
+    write_cube_matrices(cube, engine, betas)
+    cube = cube.close()
+    if CUBE_DIR:
+        logging.info("Factor cube %s -> %s", cube.shape, CUBE_DIR)
+    factor_analytics(cube, {})
+    ic_analytics(cube)
+    return cube
+
+def save_results(weights_panel, returns_map, periods_per_year: int = 12):
+    os.makedirs(OUT_DIR, exist_ok=True)
     upsert_many(
         "weights",
         [
@@ -231,7 +437,7 @@ def save_results(weights_panel, returns_map):
     )
     perf_rows = []
     for strat, series in returns_map.items():
-        stats = perf_stats(series)
+        stats = perf_stats(series, periods_per_year)
         perf_rows.append(
             (
                 strat,
@@ -256,28 +462,166 @@ def save_results(weights_panel, returns_map):
     with pd.option_context("display.float_format", lambda x: f"{x:,.3f}"):
         print(perf_df.head(20).to_string(index=False))
 
-def run(start: str, end: str, universe_size: int, include_delisted: bool, loglevel: str = "INFO", seed: int = 42):
+def factor_analytics(cube, weights_panel, strategy: str = "COMPOSITE_LS_BETA_NEUTRAL"):
+    """Fama-MacBeth factor returns, Newey-West t-stats and the attribution of ``strategy``."""
+    if cube is None or "m_rets" not in cube.matrices:
+        return None
+    fm = fama_macbeth(cube)
+    fr = fm["factor_returns"]
+    tstats = newey_west_tstats(fr)
+    os.makedirs(OUT_DIR, exist_ok=True)
+    fr.assign(R2=fm["r2"], N=fm["n_obs"]).to_csv(os.path.join(OUT_DIR, "fm_factor_returns.csv"))
+    tstats.to_csv(os.path.join(OUT_DIR, "fm_tstats.csv"))
+    attr = None
+    if weights_panel.get(strategy):
+        attr = attribution(cube, pd.DataFrame(weights_panel[strategy]).T, fr)
+        attr.to_csv(os.path.join(OUT_DIR, f"attribution_{strategy.replace('::','_')}.csv"))
+    print("\n=== Fama-MacBeth (t-stats Newey-West) ===\n")
+    with pd.option_context("display.float_format", lambda x: f"{x:,.4f}"):
+        print(tstats.to_string())
+        if attr is not None and len(attr):
+            print(f"\n=== Atribución {strategy} (media mensual) ===\n")
+            print(attr.mean().to_string())
+    return dict(fm, tstats=tstats, attribution=attr)
+
+def ic_analytics(cube, horizons=range(1, 13)):
+    """Rank IC by horizon, IC IR, decay and rank turnover of every factor, stored for the dashboard."""
+    if cube is None or "m_rets" not in cube.matrices:
+        return None
+    res = rank_ic(cube, horizons)
+    _num = lambda v: None if pd.isna(v) else float(v)
+    _int = lambda v: None if pd.isna(v) else int(v)
+    upsert_many("factor_ic", [(r.factor, int(r.horizon), r.date, float(r.ic)) for r in res["ic"].itertuples()],
+                "?,?,?,?")
+    upsert_many("factor_ic_summary",
+                [(r.factor, int(r.horizon), _num(r.mean_ic), _num(r.ic_std), _num(r.ic_ir), _num(r.t_stat), int(r.n))
+                 for r in res["summary"].itertuples()], "?,?,?,?,?,?,?")
+    upsert_many("factor_decay",
+                [(r.factor, _int(r.peak_horizon), _int(r.half_life), _num(r.rank_autocorr), _num(r.turnover))
+                 for r in res["decay"].itertuples()], "?,?,?,?,?")
+    print("\n=== Rank IC medio por horizonte (meses) ===\n")
+    with pd.option_context("display.float_format", lambda x: f"{x:,.3f}"):
+        print(res["summary"].pivot(index="factor", columns="horizon", values="mean_ic").to_string())
+        print()
+        print(res["decay"].set_index("factor").to_string())
+    return res
+
+def walk_forward_study(cube, mode: str = "expanding"):
+    """Out-of-sample composites whose factor weights are picked on an expanding or rolling IC window."""
+    if cube is None or "m_rets" not in cube.matrices:
+        return None
+    facs = [f for f in composite_factors() if f in cube.factors]
+    if not facs:
+        return None
+    window = WF_TRAIN_MONTHS if mode == "rolling" and WF_TRAIN_MONTHS > 0 else None
+    res = walk_forward(cube, facs, WF_METHODS, WF_MIN_TRAIN, window, MIN_LIQ_PCTL, TOP_Q, BOTTOM_Q)
+    if not res["returns"]:
+        logging.warning("Walk-forward %s: menos de %d meses de IC, sin meses fuera de muestra", mode, WF_MIN_TRAIN)
+        return res
+    os.makedirs(OUT_DIR, exist_ok=True)
+    fw = pd.concat(res["factor_weights"], names=["strategy", "date"])
+    fw.to_csv(os.path.join(OUT_DIR, f"wf_factor_weights_{mode}.csv"))
+    logging.info("Walk-forward %s: %d estrategias, %s meses fuera de muestra", mode, len(res["returns"]),
+                 max((len(r) for r in res["returns"].values()), default=0))
+    return res
+
+def parse_strategies(spec):
+    """``"FACTOR_LONG_ONLY::MOM_12_1,COMPOSITE_LS_BETA_NEUTRAL"`` -> list (None: every strategy)."""
+    names = [s.strip() for s in (spec or "").split(",") if s.strip()]
+    if not names:
+        return None
+    required_factors(names)  # unknown factors raise KeyError here, before any download
+    return names
+
+def monthly_only(rebalance: str, optimizer=None, walk_forward_mode=None) -> Optional[str]:
+    """Error message when monthly-only options are combined with ``--rebalance D/W`` (None: fine)."""
+    if rebalance == "M":
+        return None
+    bad = [f for f, v in (("--optimizer", optimizer), ("--walk-forward", walk_forward_mode)) if v]
+    return f"{' y '.join(bad)} solo con --rebalance M" if bad else None
+
+def run(start: str, end: str, universe_size: int, include_delisted: bool, loglevel: str = "INFO", seed: int = 42,
+        optimizer=None, rebalance: str = "M", walk_forward_mode=None, strategies=None):
     logging.basicConfig(
         level=getattr(logging, loglevel.upper(), logging.INFO),
         format="%(asctime)s %(levelname)s: %(message)s",
     )
     init_db()
+    start_writer()
+    try:
+        _run_stages(start, end, universe_size, include_delisted, seed, optimizer, rebalance, walk_forward_mode,
+                    strategies)
+    finally:
+        stop_writer()
 
+def _run_stages(start: str, end: str, universe_size: int, include_delisted: bool, seed: int, optimizer=None,
+                rebalance: str = "M", walk_forward_mode=None, strategies=None):
     uni, industries, log_mcap = prepare_universe(include_delisted, universe_size, seed)
     syms = uni["symbol"].tolist()
 
-    price_map = fetch_price_data(syms, start, end)
-    if not price_map:
-        logging.error("Sin datos de precios (NDL). Revisa API key NDL.")
+    engine, betas = ingest(syms, start, end)
+    if engine is None:
         return
+    cross_sectional(engine, betas, industries, log_mcap, optimizer, rebalance, walk_forward_mode, strategies)
+    logging.info("HTTP retry budget: %s", BUDGET.summary())
 
-    fac_df = compute_factors(syms, price_map)
-    df_close, m_close, adv20_m, vol60_m, m_rets = monthly_panels(price_map)
-    betas = compute_betas(df_close)
-    weights_panel, returns_map = build_and_backtest(
-        m_close, adv20_m, vol60_m, m_rets, fac_df, betas, industries, log_mcap
-    )
+def ingest(syms, start: str, end: str, persist_benchmark: bool = False, benchmark_px=None, rotation: bool = True):
+    """Per-symbol stages: prices, static factors + alt-data, betas.
+
+    Shard workers pass the benchmark bars fetched once by the parent and
+    ``rotation=False`` (the rotation legs are fetched by the merge step).
+    """
+    price_map = fetch_price_data(syms, start, end, persist_benchmark, benchmark_px)
+    if rotation:
+        fetch_rotation_prices(start, end)
+    if not price_map:
+        logging.error("Sin datos de precios (NDL/FMP). Revisa las API keys.")
+        return None, None
+
+    priced = {s: reconciled(df) for s, df in price_map.items()}  # unreconciled bars stay out of returns
+    engine = FactorEngine.from_price_map({s: df for s, df in priced.items() if df is not None})
+    engine.set_static(compute_factors(syms, engine))
+    betas = compute_betas(engine)
+    return engine, betas
+
+def cross_sectional(engine: FactorEngine, betas, industries, log_mcap, optimizer=None, rebalance: str = "M",
+                    walk_forward_mode=None, strategies=None):
+    """Cross-sectional stages: neutralization, portfolio construction, results.
+
+    ``rebalance`` "D"/"W" runs the array-based daily/weekly backtest instead
+    of the monthly loop (no optimizer, no cube export, no walk-forward: they
+    are logged as ignored; the entry points reject them up front).
+    ``walk_forward_mode`` ("expanding" or "rolling") adds the
+    ``COMPOSITE_WF_LS::`` out-of-sample composites.  ``strategies`` limits the
+    run (and the factors evaluated) to those strategy names.
+    """
+    rotation_close = load_rotation_close(engine.get("close").index)
+    if rebalance != "M":
+        msg = monthly_only(rebalance, optimizer, walk_forward_mode)
+        if msg:
+            logging.warning("%s: se ignora(n) con rebalanceo %s", msg, rebalance)
+        if CUBE_DIR:
+            logging.warning("Rebalanceo %s: no se exporta el cubo de factores (CUBE_DIR)", rebalance)
+        weights_panel, returns_map = build_and_backtest_rebalance(engine, industries, log_mcap, rebalance,
+                                                                  strategies, rotation_close=rotation_close)
+        save_results(weights_panel, returns_map, periods_per_year=252)
+        return None
+    m_close = engine.get("m_close")
+    cube = CubeWriter(CUBE_DIR or None, m_close.index, m_close.columns, required_factors(strategies))
+    weights_panel, returns_map = build_and_backtest(engine, betas, industries, log_mcap, strategies, optimizer,
+                                                    cube=cube, rotation_close=rotation_close)
+    cube = cube.close()
+    if CUBE_DIR:
+        logging.info("Factor cube %s -> %s", cube.shape, CUBE_DIR)
+    if walk_forward_mode:
+        wf = walk_forward_study(cube, walk_forward_mode)
+        if wf is not None:
+            weights_panel.update(wf["weights"])
+            returns_map.update(wf["returns"])
     save_results(weights_panel, returns_map)
+    factor_analytics(cube, weights_panel)
+    ic_analytics(cube)
+    return cube
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
@@ -287,5 +631,32 @@ if __name__ == "__main__":
     ap.add_argument("--include-delisted", type=int, default=1)
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--log", default="INFO")
+    ap.add_argument("--optimizer", choices=list(OBJECTIVES), default=None)
+    ap.add_argument("--rebalance", choices=["M", "W", "D"], default="M",
+                    help="rebalance frequency: monthly (default), weekly or daily")
+    ap.add_argument("--walk-forward", choices=["expanding", "rolling"], default=None,
+                    help="add out-of-sample composites with factor weights chosen on a training window")
+    ap.add_argument("--strategies", default=None,
+                    help="comma-separated strategy names; only the factors they need are evaluated")
+    ap.add_argument("--shards", type=int, default=0,
+                    help="split the universe into N hash shards (one process each unless --shard-id)")
+    ap.add_argument("--shard-id", type=int, default=None,
+                    help="run only this shard's per-symbol stages (multi-node); merge later with --merge")
+    ap.add_argument("--merge", action="store_true",
+                    help="merge existing shard stores and run the cross-sectional stages")
     args = ap.parse_args()
-    run(args.start, args.end, args.universe_size, args.include_delisted==1, args.log, args.seed)
+    try:
+        strategies = parse_strategies(args.strategies)
+    except KeyError as e:
+        ap.error(str(e))
+    msg = monthly_only(args.rebalance, args.optimizer, args.walk_forward)
+    if msg:
+        ap.error(msg)
+    if args.shards:
+        from shards import run_sharded
+        run_sharded(args.shards, args.start, args.end, args.universe_size, args.include_delisted==1,
+                    args.log, args.seed, args.optimizer, shard_id=args.shard_id, merge_only=args.merge,
+                    rebalance=args.rebalance, walk_forward_mode=args.walk_forward, strategies=strategies)
+    else:
+        run(args.start, args.end, args.universe_size, args.include_delisted==1, args.log, args.seed, args.optimizer,
+            args.rebalance, args.walk_forward, strategies)
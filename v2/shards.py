@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Symbol-sharded study runs.
+
+The universe is split by a stable hash of the symbol into N shards.  Each
+shard (a local worker process, or a machine running the same entry point
+with ``--shard-id``) runs the per-symbol stages (prices, static factors,
+alt-data, betas) into its own SQLite store next to ``DB_PATH``.  The merge
+step copies every shard store into the main DB, rebuilds the panels from it
+and runs the cross-sectional stages (neutralization, portfolios) once.
+
+    python run_study.py --shards 8                      # 8 local workers + merge
+    python run_study.py --shards 8 --shard-id 3         # node 3 of 8
+    python run_study.py --shards 8 --merge              # after all nodes finished
+"""
+import os, zlib, logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional, Tuple
+
+import config
+from data.db import init_db, connection, transaction, start_writer, stop_writer, close_conn
+
+SHARD_TABLES = ["universe", "prices_daily", "factors_static", "betas_monthly"]
+
+def shard_of(symbol: str, n_shards: int) -> int:
+    """Stable across processes and machines (unlike ``hash``)."""
+    return zlib.crc32(symbol.encode("utf-8")) % n_shards
+
+def shard_db_path(shard_id: int, n_shards: int, base: Optional[str] = None) -> str:
+    root, ext = os.path.splitext(base or config.DB_PATH)
+    return f"{root}.shard{shard_id:03d}-of-{n_shards:03d}{ext or '.db'}"
+
+def _logging(loglevel: str):
+    logging.basicConfig(
+        level=getattr(logging, loglevel.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s: %(message)s",
+    )
+
+def run_shard(shard_id: int, n_shards: int, start: str, end: str, universe_size: int,
+              include_delisted: bool, seed: int = 42, loglevel: str = "INFO", db_path: Optional[str] = None,
+              fmp_qps: Optional[float] = None, budget: Optional[Tuple[int, float]] = None,
+              benchmark_px=None, universe=None) -> str:
+    """Per-symbol stages for one shard, written to its own store. Returns the store path.
+
+    Runs in a process of its own (see ``_spawn``): the store path, the FMP rate
+    and this shard's share of the retry budget are set for that process only.
+    ``benchmark_px`` are the benchmark bars and ``universe`` the full universe
+    frame, both fetched once by the parent (None: the shard fetches them
+    itself, as a ``--shard-id`` node must).
+    """
+    import run_study as rs
+    from clients import fmp_client
+    from clients.retry import BUDGET
+    _logging(loglevel)
+    config.DB_PATH = path = db_path or shard_db_path(shard_id, n_shards)
+    if fmp_qps:
+        fmp_client.RATE_LIMIT_QPS = fmp_qps
+    if budget:
+        BUDGET.max_retries, BUDGET.max_sleep_s = budget
+        BUDGET.reset()
+    init_db()
+    start_writer()
+    try:
+        uni, _, _ = rs.prepare_universe(include_delisted, universe_size, seed,
+                                        shard_filter=lambda s: shard_of(s, n_shards) == shard_id, universe=universe)
+        syms = uni["symbol"].tolist()
+        logging.info("Shard %d/%d: %d símbolos -> %s", shard_id, n_shards, len(syms), path)
+        rs.ingest(syms, start, end, persist_benchmark=benchmark_px is None, benchmark_px=benchmark_px,
+                  rotation=False)
+    finally:
+        stop_writer()
+        close_conn()
+    return path
+
+def _spawn(n_workers: int) -> ProcessPoolExecutor:
+    # fresh process per shard: nothing set by run_shard outlives it or reaches the parent
+    return ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context("spawn"), max_tasks_per_child=1)
+
+def merge_shards(n_shards: int) -> List[str]:
+    """Copy every shard store into the main DB; returns the merged universe symbols."""
+    init_db()
+    conn = connection()
+    syms: List[str] = []
+    for i in range(n_shards):
+        path = shard_db_path(i, n_shards)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"missing shard store {path}")
+        conn.execute("ATTACH DATABASE ? AS shard", (path,))
+        try:
+            with transaction():
+                for t in SHARD_TABLES:
+                    # by name: a shard store from an older schema may lack newer columns
+                    cols = ",".join(r[1] for r in conn.execute(f"PRAGMA shard.table_info({t})"))
+                    conn.execute(f"INSERT OR REPLACE INTO main.{t}({cols}) SELECT {cols} FROM shard.{t}")
+            syms += [r[0] for r in conn.execute("SELECT symbol FROM shard.universe")]
+        finally:
+            conn.execute("DETACH DATABASE shard")
+    logging.info("Merge: %d shards, %d símbolos", n_shards, len(syms))
+    return syms
+
+def run_sharded(n_shards: int, start: str, end: str, universe_size: int, include_delisted: bool,
+                loglevel: str = "INFO", seed: int = 42, optimizer=None,
+                shard_id: Optional[int] = None, merge_only: bool = False, rebalance: str = "M",
+                walk_forward_mode=None, strategies=None):
+    import run_study as rs
+    from clients.retry import BUDGET
+    _logging(loglevel)
+    # every shard throttles FMP and spends retries on its own: split the global rate and budget. The
+    # one-off downloads (universe list, benchmark) run here first, alone, at the full rate
+    qps = float(os.getenv("FMP_QPS", "4")) / n_shards
+    share = (BUDGET.max_retries // n_shards, BUDGET.max_sleep_s / n_shards)
+    if shard_id is not None:
+        # one node of a multi-machine run (same API key): its share, in a process of its own
+        with _spawn(1) as ex:
+            ex.submit(run_shard, shard_id, n_shards, start, end, universe_size, include_delisted, seed, loglevel,
+                      shard_db_path(shard_id, n_shards), qps, share).result()
+        return
+    if not merge_only:
+        init_db()
+        start_writer()
+        try:
+            uni = rs.get_universe(config.EXCHANGES, include_delisted, universe_size, seed=seed)
+            rs.fetch_price_data([], start, end, persist_benchmark=True)
+            # the whole range, not just the incremental tail: every shard computes betas against it
+            bench = rs.stored_prices(config.BENCHMARK, start, end)
+        finally:
+            stop_writer()
+        with _spawn(n_shards) as ex:
+            futs = [ex.submit(run_shard, i, n_shards, start, end, universe_size, include_delisted, seed, loglevel,
+                              shard_db_path(i, n_shards), qps, share, bench, uni)
+                    for i in range(n_shards)]
+            for f in futs:
+                f.result()
+    syms = merge_shards(n_shards)
+    engine, betas, industries, log_mcap = rs.load_panels(syms, start, end)
+    if engine.get("close").empty:
+        logging.error("Sin datos de precios en los shards.")
+        return
+    start_writer()
+    try:
+        rs.fetch_rotation_prices(start, end)  # once, not per shard
+        rs.cross_sectional(engine, betas, industries, log_mcap, optimizer, rebalance, walk_forward_mode,
+                           strategies)
+    finally:
+        stop_writer()
@@ -0,0 +1,4 @@
+import os, sys
+
+# v2 modules import each other as top-level packages (``from data.db import ...``)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
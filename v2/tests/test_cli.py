@@ -0,0 +1,34 @@
+import os, sys, sqlite3, subprocess
+
+V2 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(tmp_path, *argv):
+    code = ("import sys, cli; rc = cli.main(sys.argv[1:]); "
+            "print('HEAVY', sorted(m for m in ('pandas', 'numpy', 'requests') if m in sys.modules)); sys.exit(rc)")
+    env = dict(os.environ, DB_PATH=str(tmp_path / "t.db"), CUBE_DIR="", PYTHONPATH=V2)
+    return subprocess.run([sys.executable, "-c", code, *argv], cwd=tmp_path, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+def test_status_and_report_stay_light(tmp_path):
+    r = _run(tmp_path, "status")
+    assert r.returncode == 1 and "no existe" in r.stderr
+    assert not (tmp_path / "t.db").exists()
+
+    conn = sqlite3.connect(tmp_path / "t.db")
+    conn.execute("CREATE TABLE performance(strategy TEXT PRIMARY KEY, CAGR REAL, AnnVol REAL, Sharpe REAL, "
+                 "Sortino REAL, MaxDD REAL, HitRate REAL, N INTEGER)")
+    conn.execute("INSERT INTO performance VALUES ('LO::B2M', 0.1, 0.2, 0.5, 0.7, -0.3, 0.55, 60)")
+    conn.commit()
+    conn.close()
+    for cmd in ("status", "report"):
+        r = _run(tmp_path, cmd)
+        assert r.returncode == 0, r.stderr
+        assert "HEAVY []" in r.stdout
+    assert "LO::B2M" in r.stdout
+    assert not (tmp_path / "utils").exists()
+
+def test_backtest_rejects_monthly_only_options_with_daily_rebalance(tmp_path):
+    r = _run(tmp_path, "backtest", "--rebalance", "W", "--optimizer", "min_var", "--walk-forward", "rolling")
+    assert r.returncode == 2
+    assert "--optimizer y --walk-forward solo con --rebalance M" in r.stderr
+    assert not (tmp_path / "t.db").exists()
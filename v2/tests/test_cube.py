@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from ..cube import CubeWriter, open_cube
+
+def test_cube_roundtrip_is_memory_mapped(tmp_path):
+    months = pd.date_range("2020-01-31", periods=3, freq="ME")
+    syms, facs = ["A", "B", "C"], ["F1", "F2"]
+    w = CubeWriter(str(tmp_path / "cube"), months, syms, facs)
+    for i, dt in enumerate(months):
+        w.write_month(dt, pd.DataFrame({"F2": [i, i + 1.0], "F1": [-1.0, 1.0]}, index=["C", "A"]))
+    w.write_matrix("m_rets", pd.DataFrame(0.01, index=months, columns=["A", "B"]))
+    w.write_matrix("beta", None)
+    w.close()
+    assert not (tmp_path / "cube.tmp").exists()
+
+    cube = open_cube(str(tmp_path / "cube"))
+    assert isinstance(cube.z, np.memmap) and cube.shape == (3, 3, 2)
+    assert cube.month(months[2]).loc["A", "F2"] == 3.0
+    assert np.isnan(cube.month(months[0]).loc["B", "F1"])
+    f1 = cube.factor("F1")
+    assert np.shares_memory(f1.to_numpy(), cube.z)
+    assert cube.matrix("m_rets").loc[months[1], "A"] == 0.01
+    assert "beta" not in cube.matrices
+
+def test_in_memory_cube():
+    months = pd.date_range("2020-01-31", periods=2, freq="ME")
+    w = CubeWriter(None, months, ["A"], ["F1"])
+    w.write_month(months[1], pd.DataFrame({"F1": [2.0]}, index=["A"]))
+    cube = w.close()
+    assert cube.factor("F1").loc[months[1], "A"] == 2.0
+
+def test_republish_swaps_directories(tmp_path):
+    months = pd.date_range("2020-01-31", periods=1, freq="ME")
+    path = str(tmp_path / "cube")
+    for v in (1.0, 2.0):
+        w = CubeWriter(path, months, ["A"], ["F1"])
+        w.write_month(months[0], pd.DataFrame({"F1": [v]}, index=["A"]))
+        w.close()
+    assert open_cube(path).factor("F1").iloc[0, 0] == 2.0
+    assert not (tmp_path / "cube.old").exists() and not (tmp_path / "cube.tmp").exists()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from ..data.datatable import DatatableReader, decode_datatable, split_by_ticker
+
+COLS = [{"name": "ticker", "type": "String"}, {"name": "date", "type": "Date"},
+        {"name": "close", "type": "BigDecimal(34,12)"}, {"name": "volume", "type": "BigDecimal(37,15)"}]
+
+def _page(rows):
+    return {"datatable": {"data": rows, "columns": COLS}, "meta": {"next_cursor_id": None}}
+
+def test_typed_decode_across_pages():
+    reader = DatatableReader()
+    reader.add_page(_page([["AAA", "2020-01-03", 11.0, 100], ["BBB", "2020-01-02", 5.0, None]]))
+    reader.add_page(_page([["AAA", "2020-01-02", 10.0, 200], ["AAA", "2020-01-03", 11.0, 100],
+                           ["BBB", None, 6.0, 1]]))
+    df = reader.frame()
+    assert len(df) == 3
+    assert df["date"].dtype == "datetime64[ns]"
+    assert df["close"].dtype == np.float64 and np.isnan(df["volume"].iloc[-1])
+    assert isinstance(df["ticker"].dtype, pd.CategoricalDtype)
+    assert list(df["ticker"]) == ["AAA", "AAA", "BBB"]
+    assert list(df["date"].dt.day) == [2, 3, 2]
+
+def test_split_by_ticker_and_index():
+    obj = _page([["BBB", "2020-01-02", 5.0, 1], ["AAA", "2020-01-02", 10.0, 2], ["AAA", "2020-01-03", 11.0, 3]])
+    df = decode_datatable(obj, index="date", columns=["ticker", "close", "volume"])
+    parts = split_by_ticker(df)
+    assert set(parts) == {"AAA", "BBB"}
+    assert list(parts["AAA"].columns) == ["close", "volume"]
+    assert parts["AAA"]["close"].tolist() == [10.0, 11.0]
+    assert isinstance(parts["AAA"].index, pd.DatetimeIndex)
+    # every slice is a view into the same buffer (no per-ticker copy)
+    def root(a):
+        while a.base is not None:
+            a = a.base
+        return a
+    assert root(parts["AAA"]["close"].to_numpy()) is root(parts["BBB"]["close"].to_numpy())
+    whole = split_by_ticker(df, drop_key=False)
+    assert np.shares_memory(whole["AAA"]["close"].to_numpy(), df["close"].to_numpy())
+
+def test_bad_numeric_cells_and_keep_last():
+    reader = DatatableReader()
+    reader.add_page(_page([["AAA", "2020-01-02", "n/a", 1], ["AAA", "2020-01-02", 10.0, 2]]))
+    assert np.isnan(reader.frame()["close"].iloc[0])
+    assert reader.frame(keep="last")["volume"].tolist() == [2.0]
+    # a required column drops the unparseable row before deduplication: the good bar wins
+    assert reader.frame(required=("close", "volume"))["close"].tolist() == [10.0]
+
+def test_bad_dates_and_values_are_coerced_and_dropped():
+    reader = DatatableReader()
+    reader.add_page(_page([["AAA", "2020-01-02", 10.0, 1], ["AAA", "not a date", 11.0, 2],
+                           ["AAA", "2020-01-06", 12.0, "x"], ["AAA", "2020-01-07", None, 4]]))
+    reader.add_page(_page([["AAA", "2020-01-03", 13.0, 5]]))
+    df = reader.frame(index="date", columns=["close", "volume"], required=("close", "volume"))
+    assert [d.day for d in df.index] == [2, 3, 7]
+    assert df["volume"].tolist() == [1.0, 5.0, 4.0] and np.isnan(df["close"].iloc[-1])
+    assert len(reader.frame()) == 4  # volume not required: the "x" row stays with NaN
+
+def test_empty_payload():
+    assert decode_datatable(None).empty
+    assert split_by_ticker(decode_datatable(_page([]))) == {}
@@ -0,0 +1,79 @@
+import sqlite3, threading
+import pytest
+from ..data import db
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db.config, "DB_PATH", str(tmp_path / "t.db"))
+    db.init_db()
+    yield
+    db.stop_writer()
+    db.close_conn()
+
+def test_connection_is_reused_and_tuned(tmp_db):
+    conn = db.connection()
+    assert db.connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+def test_transaction_rolls_back(tmp_db):
+    with pytest.raises(ValueError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO performance(strategy) VALUES ('X')")
+            raise ValueError
+    assert db.connection().execute("SELECT COUNT(*) FROM performance").fetchone()[0] == 0
+
+def test_single_writer_from_many_threads(tmp_db):
+    db.start_writer()
+    def work(k):
+        for i in range(20):
+            db.upsert_many("prices_daily", [(f"S{k}", f"2020-01-{d:02d}", float(i), 1.0, "NDL")
+                                            for d in range(1, 11)], "?,?,?,?,?")
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    db.flush_writes()
+    assert db.connection().execute("SELECT COUNT(*) FROM prices_daily").fetchone()[0] == 80
+    assert db.latest_price_date("S3") == "2020-01-10"
+
+def test_compact_schema_views_and_migration(tmp_path, monkeypatch):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE weights(date TEXT, strategy TEXT, symbol TEXT, weight REAL, PRIMARY KEY(date, strategy, symbol));
+        CREATE TABLE portfolio_returns(date TEXT, strategy TEXT, ret REAL, PRIMARY KEY(date, strategy));
+        CREATE TABLE betas_monthly(date TEXT, symbol TEXT, beta_252 REAL, PRIMARY KEY(date, symbol));
+        INSERT INTO weights VALUES ('2020-01-31', 'LO::B2M', 'AAA', 0.5), ('2020-01-31', 'LO::B2M', 'BBB', 0.5);
+        INSERT INTO portfolio_returns VALUES ('2020-02-29', 'LO::B2M', 0.01);
+        INSERT INTO betas_monthly VALUES ('2020-01-31', 'AAA', 1.1);
+        CREATE TABLE prices_daily(symbol TEXT, date TEXT, close REAL, volume REAL, PRIMARY KEY(symbol, date));
+        INSERT INTO prices_daily VALUES ('AAA', '2020-01-31', 10.0, 100.0);
+    """)
+    conn.close()
+    monkeypatch.setattr(db.config, "DB_PATH", str(path))
+    try:
+        db.init_db()
+        c = db.connection()
+        kinds = dict(c.execute("SELECT name, type FROM sqlite_master WHERE name IN "
+                               "('weights','portfolio_returns','betas_monthly')").fetchall())
+        assert set(kinds.values()) == {"view"}
+        assert c.execute("SELECT * FROM weights ORDER BY symbol").fetchall() == [
+            ("2020-01-31", "LO::B2M", "AAA", 0.5), ("2020-01-31", "LO::B2M", "BBB", 0.5)]
+        # writes through the views keep the surrogate keys stable
+        db.upsert_many("portfolio_returns", [("2020-02-29", "LO::B2M", 0.02), ("2020-02-29", "LS::B2M", -0.01)],
+                       "?,?,?")
+        db.upsert_many("betas_monthly", [("2020-01-31", "AAA", 1.2)], "?,?,?")
+        assert c.execute("SELECT id, name FROM strategies ORDER BY id").fetchall() == [(1, "LO::B2M"), (2, "LS::B2M")]
+        assert c.execute("SELECT ret FROM portfolio_returns WHERE strategy = 'LO::B2M'").fetchall() == [(0.02,)]
+        assert c.execute("SELECT date, symbol, beta_252 FROM betas_monthly").fetchall() == [("2020-01-31", "AAA", 1.2)]
+        assert c.execute("SELECT source FROM prices_daily").fetchall() == [("NDL",)]
+        db.init_db()  # idempotent
+        assert c.execute("SELECT COUNT(*) FROM weights_c").fetchone()[0] == 2
+    finally:
+        db.close_conn()
+
+def test_unreconciled_bars_are_asked_again(tmp_db):
+    db.upsert_many("prices_daily", [("AAA", "2024-01-02", 10.0, 1.0, "NDL"),
+                                    ("AAA", "2024-01-03", 10.1, 1.0, "FMP"),
+                                    ("AAA", "2024-01-04", 55.0, 1.0, "FMP" + db.UNRECONCILED)], "?,?,?,?,?")
+    assert db.latest_price_date("AAA") == "2024-01-03"
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ..factors import FactorEngine, required_factors, composite_factors
+
+def _engine(n_days=400, n_sym=4, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2019-01-01", periods=n_days)
+    close = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_days, n_sym)), axis=0)),
+                         index=idx, columns=[f"S{i}" for i in range(n_sym)])
+    volume = pd.DataFrame(rng.uniform(1e5, 1e6, (n_days, n_sym)), index=idx, columns=close.columns)
+    return FactorEngine(close, volume)
+
+def test_shared_intermediates_are_computed_once():
+    eng = _engine()
+    eng.get("VOL60"); eng.get("MOM_12_1"); eng.get("adv20_m"); eng.get("m_rets")
+    assert eng.computed.count("own_rets") == 1
+    assert eng.computed.count("m_close") == 1
+    assert "dollar_vol" in eng.computed and "vol60" in eng.computed
+
+def test_only_requested_factors_are_evaluated():
+    assert required_factors(["FACTOR_LONG_ONLY::MOM_12_1"]) == ["MOM_12_1"]
+    assert required_factors(["COMPOSITE_LS_BETA_NEUTRAL"]) == composite_factors()
+    eng = _engine()
+    eng.get("MOM_12_1")
+    assert "own_rets" not in eng.computed and "VOL60" not in eng.computed
+    with pytest.raises(KeyError):
+        eng.get("B2M")  # static snapshot not attached
+
+def test_snapshot_matches_per_symbol_computation():
+    eng = _engine()
+    snap = eng.snapshot()
+    p = eng.get("close")["S1"]
+    assert snap.loc["S1", "MOM_12_1_last"] == pytest.approx(p.iloc[-22] / p.iloc[-253] - 1.0)
+    assert snap.loc["S1", "VOL60_last"] == pytest.approx(p.pct_change().rolling(60).std().iloc[-1])
+    v = eng.get("volume")["S1"]
+    assert snap.loc["S1", "ADV20_last"] == pytest.approx((p * v).rolling(20).mean().iloc[-1])
+
+def test_snapshot_uses_each_symbols_own_bars():
+    eng = _engine()
+    close, volume = eng.get("close").copy(), eng.get("volume")
+    close.iloc[100:130, 1] = np.nan       # trading halt
+    close.iloc[-15:-10, 1] = np.nan
+    snap = FactorEngine(close, volume).snapshot()
+    p = close["S1"].dropna()
+    v = volume["S1"].reindex(p.index)
+    assert snap.loc["S1", "MOM_12_1_last"] == pytest.approx(p.iloc[-22] / p.iloc[-253] - 1.0)
+    assert snap.loc["S1", "VOL60_last"] == pytest.approx(p.pct_change().rolling(60).std().iloc[-1])
+    assert snap.loc["S1", "ADV20_last"] == pytest.approx((p * v).rolling(20).mean().iloc[-1])
+
+def test_daily_rets_fill_gaps_explicitly():
+    import warnings
+    close = pd.DataFrame({"A": [np.nan, 10.0, np.nan, 12.0, np.nan]}, index=pd.bdate_range("2024-01-01", periods=5))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # no implicit fill_method="pad"
+        r = FactorEngine(close, close * 0 + 1).get("daily_rets")["A"]
+    np.testing.assert_allclose(r.to_numpy(), [np.nan, np.nan, 0.0, 0.2, 0.0])
+
+def test_factor_stage_cube_matches_backtest_cube(monkeypatch):
+    from .. import run_study as rs
+    from ..cube import CubeWriter
+    eng = _engine(n_sym=6)
+    industries = pd.Series(["A", "A", "B", "B", "C", "C"], index=eng.get("close").columns)
+    log_mcap = pd.Series(np.arange(6.0), index=industries.index)
+    monkeypatch.setattr(rs, "CUBE_DIR", "")
+    monkeypatch.setattr(rs, "factor_analytics", lambda cube, wp: None)
+    monkeypatch.setattr(rs, "ic_analytics", lambda cube: None)
+    facs = ["MOM_12_1", "VOL60"]
+    cube = rs.factor_stage(eng, None, industries, log_mcap, facs)
+    m = eng.get("m_close")
+    ref = CubeWriter(None, m.index, m.columns, facs)
+    rs.build_and_backtest(eng, None, industries, log_mcap, [f"FACTOR_LONG_ONLY::{f}" for f in facs], cube=ref)
+    ref = ref.close()
+    assert list(cube.factors) == facs and np.isfinite(cube.z).any()
+    np.testing.assert_array_equal(cube.z, ref.z)
+    np.testing.assert_array_equal(cube.matrix("m_rets"), ref.matrix("m_rets"))
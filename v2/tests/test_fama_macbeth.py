@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from ..cube import CubeWriter
+from ..analytics.fama_macbeth import fama_macbeth, newey_west_tstats, attribution
+
+def _cube(T=24, N=80, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.date_range("2018-01-31", periods=T, freq="ME")
+    syms = [f"S{i}" for i in range(N)]
+    w = CubeWriter(None, months, syms, ["F1", "F2"])
+    Z = rng.standard_normal((T, N, 2))
+    Z[3, :10, 1] = np.nan
+    f = rng.normal(0.01, 0.02, (T, 2))
+    for t, dt in enumerate(months):
+        w.write_month(dt, pd.DataFrame(Z[t], index=syms, columns=["F1", "F2"]))
+    R = 0.002 + np.einsum("tnk,tk->tn", np.nan_to_num(Z), f) + 0.01 * rng.standard_normal((T, N))
+    R[5, :5] = np.nan
+    w.write_matrix("m_rets", pd.DataFrame(R, index=months, columns=syms))
+    return w.close()
+
+def test_batched_solve_matches_per_month_lstsq():
+    cube = _cube()
+    fr = fama_macbeth(cube, min_obs=10)["factor_returns"]
+    for t in (0, 3, 5):
+        y = cube.matrices["m_rets"][t]
+        X = np.column_stack([np.ones(len(y)), np.nan_to_num(cube.z[t])])
+        ok = np.isfinite(y)
+        ref = np.linalg.lstsq(X[ok], y[ok], rcond=None)[0]
+        assert np.allclose(fr.iloc[t].to_numpy(), ref)
+
+def test_newey_west_and_attribution_add_up():
+    cube = _cube()
+    fr = fama_macbeth(cube, min_obs=10)["factor_returns"]
+    ts = newey_west_tstats(fr, lags=0)
+    x = fr["F1"]
+    assert np.isclose(ts.loc["F1", "t_stat"], x.mean() / (x.std(ddof=0) / np.sqrt(len(x))))
+    assert ts.loc["F1", "t_stat"] > 2
+    w = pd.DataFrame(0.0, index=cube.months, columns=cube.symbols)
+    w.iloc[:, :10], w.iloc[:, -10:] = 0.1, -0.1
+    attr = attribution(cube, w, fr)
+    parts = attr.drop(columns="total").sum(axis=1)
+    assert np.allclose(parts, attr["total"])
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from ..cube import CubeWriter
+from ..analytics.ic import rank_ic
+
+def test_rank_ic_by_horizon_matches_spearman():
+    rng = np.random.default_rng(3)
+    T, N = 30, 200
+    months = pd.date_range("2015-01-31", periods=T, freq="ME")
+    syms = [f"S{i}" for i in range(N)]
+    z = rng.standard_normal((T, N))
+    # F1 predicts the next month strongly and the month after weakly
+    R = 0.02 * rng.standard_normal((T, N))
+    R[:, :] += 0.02 * z
+    R[1:] += 0.005 * z[:-1]
+    w = CubeWriter(None, months, syms, ["F1", "NOISE"])
+    for t, dt in enumerate(months):
+        w.write_month(dt, pd.DataFrame({"F1": z[t], "NOISE": rng.standard_normal(N)}, index=syms))
+    w.write_matrix("m_rets", pd.DataFrame(R, index=months, columns=syms))
+    res = rank_ic(w.close(), horizons=[1, 2, 3, 6])
+
+    ic = res["ic"].set_index(["factor", "horizon", "date"])["ic"]
+    ref = pd.Series(z[4]).corr(pd.Series(R[5]), method="spearman")
+    assert np.isclose(ic[("F1", 2, "2015-05-31")], ref)
+
+    s = res["summary"].set_index(["factor", "horizon"])
+    assert s.loc[("F1", 1), "mean_ic"] > 0.5 > s.loc[("F1", 2), "mean_ic"] > 0.05
+    assert abs(s.loc[("NOISE", 1), "mean_ic"]) < 0.05
+    assert s.loc[("F1", 6), "n"] == T - 5
+    d = res["decay"].set_index("factor")
+    assert d.loc["F1", "peak_horizon"] == 1 and d.loc["F1", "half_life"] == 2
+    assert d.loc["NOISE", "turnover"] > 0.9
+
+def test_ties_and_missing_pairs_give_exact_spearman():
+    rng = np.random.default_rng(5)
+    T, N = 3, 120
+    months = pd.date_range("2020-01-31", periods=T, freq="ME")
+    syms = [f"S{i}" for i in range(N)]
+    z = rng.integers(0, 5, (T, N)).astype(float)        # heavy ties, as in bucketed factors
+    z[:, :10] = np.nan
+    R = np.round(0.01 * z + 0.02 * rng.standard_normal((T, N)), 2)
+    R[:, 10:25] = np.nan                                 # different holes on the return side
+    w = CubeWriter(None, months, syms, ["F"])
+    for t, dt in enumerate(months):
+        w.write_month(dt, pd.DataFrame({"F": z[t]}, index=syms))
+    w.write_matrix("m_rets", pd.DataFrame(R, index=months, columns=syms))
+    res = rank_ic(w.close(), horizons=[1, 2])
+    ic = res["ic"].set_index(["horizon", "date"])["ic"]
+    for h, t in ((1, 0), (2, 0), (1, 1)):
+        ref = pd.Series(z[t]).corr(pd.Series(R[t + h - 1]), method="spearman")
+        assert np.isclose(ic[(h, months[t].strftime("%Y-%m-%d"))], ref)
+    ref = pd.Series(z[1]).corr(pd.Series(z[0]), method="spearman")
+    assert np.isclose(1.0 - res["turnover"].iloc[1, 0], ref)
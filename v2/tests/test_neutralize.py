@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+from ..neutralize import (winsorize, zscore, residualize_industry_size, winsorize_batch, zscore_batch,
+                          residualize_industry_size_batch)
+
+def test_batch_neutralization_matches_per_date():
+    rng = np.random.default_rng(0)
+    cols = pd.Index([f"S{i}" for i in range(60)])
+    A = rng.normal(size=(4, 60)); A[0, :5] = np.nan; A[2, 10:30] = np.nan
+    industries = pd.Series(rng.choice(["X", "Y", "Z", None], 60), index=cols)
+    log_mcap = pd.Series(rng.normal(20, 1, 60), index=cols); log_mcap.iloc[7] = np.nan
+    Zb = residualize_industry_size_batch(zscore_batch(winsorize_batch(A)), industries, log_mcap, cols)
+    for t in range(4):
+        s = pd.Series(A[t], index=cols)
+        z = residualize_industry_size(zscore(winsorize(s)), industries, log_mcap)
+        np.testing.assert_allclose(Zb[t], z.to_numpy(), atol=1e-9)
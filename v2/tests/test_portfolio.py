@@ -9,4 +9,94 @@ def test_next_month_returns_basic():
     }, index=pd.date_range('2020-01-31', periods=3, freq='M'))
     expected = prices.shift(-1).divide(prices) - 1
     result = next_month_returns(prices)
-    pd.testing.assert_frame_equal(result, expected)
\ No newline at end of file
+    pd.testing.assert_frame_equal(result, expected)
+
+def _daily_rets(n=300, k=40, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range('2020-01-01', periods=n)
+    return pd.DataFrame(rng.normal(0, 0.01, (n, k)) + rng.normal(0, 0.01, (n, 1)),
+                        index=idx, columns=[f'S{i}' for i in range(k)])
+
+def test_shrinkage_cov_incremental_matches_batch():
+    from ..portfolio import ShrinkageCov
+    rets = _daily_rets()
+    cov = ShrinkageCov(rets.columns, window=100)
+    for _, block in rets.groupby(rets.index.to_period('M')):
+        cov.update(block)
+    X = np.concatenate(cov._blocks)
+    C, shrink = cov.matrix(rets.columns[:10])
+    S = np.cov(X[:, :10], rowvar=False, bias=True)
+    assert cov.n == len(X) and cov.n < 100 + 23
+    assert 0 < shrink < 1
+    mu = np.trace(S) / 10
+    np.testing.assert_allclose(C, shrink * mu * np.eye(10) + (1 - shrink) * S, atol=1e-12)
+    # Ledoit-Wolf intensity from the window's returns (the retained blocks)
+    Y = X[:, :10] - X[:, :10].mean(axis=0)
+    d2 = np.sum((S - mu * np.eye(10)) ** 2)
+    b2 = min(max((np.sum(np.sum(Y ** 2, axis=1) ** 2) / len(X) - np.sum(S ** 2)) / len(X), 0.0), d2)
+    assert np.isclose(shrink, b2 / d2, rtol=1e-9)
+
+def test_build_optimized_beta_neutral_and_warm_start():
+    from ..portfolio import ShrinkageCov, build_optimized
+    rets = _daily_rets()
+    cov = ShrinkageCov(rets.columns, window=252)
+    cov.update(rets)
+    rng = np.random.default_rng(1)
+    z = pd.Series(rng.normal(size=40), index=rets.columns)
+    betas = pd.Series(rng.uniform(0.5, 1.5, 40), index=rets.columns)
+    adv = pd.Series(1.0, index=rets.columns)
+    w = build_optimized(z, betas, adv, cov, objective='mean_variance', w_max=0.2)
+    assert abs(w.abs().sum() - 1.0) < 1e-9
+    assert abs((w * betas).sum()) < 1e-9
+    assert (w[z.rank(pct=True) > 0.7] >= 0).all() and (w[z.rank(pct=True) <= 0.3] <= 0).all()
+    w2 = build_optimized(z, betas, adv, cov, objective='mean_variance', w_max=0.2, w_prev=w)
+    assert w2.attrs['n_iter'] < w.attrs['n_iter']
+    lo = build_optimized(z, betas, adv, cov, objective='min_var', long_short=False)
+    assert abs(lo.sum() - 1.0) < 1e-9 and (lo >= 0).all()
+
+def test_max_sharpe_beats_fixed_risk_aversion():
+    from ..portfolio import ShrinkageCov, build_optimized
+    rets = _daily_rets()
+    cov = ShrinkageCov(rets.columns, window=252)
+    cov.update(rets)
+    rng = np.random.default_rng(2)
+    z = pd.Series(rng.normal(size=40), index=rets.columns)
+    betas = pd.Series(rng.uniform(0.5, 1.5, 40), index=rets.columns)
+    adv = pd.Series(1.0, index=rets.columns)
+    def sharpe(w):
+        names = w.index[w != 0]
+        C, _ = cov.matrix(names)
+        alpha = 0.05 * np.sqrt(np.diag(C)) * z[names].to_numpy()
+        x = w[names].to_numpy()
+        return alpha @ x / np.sqrt(x @ C @ x)
+    ms = build_optimized(z, betas, adv, cov, objective='max_sharpe', w_max=0.2)
+    assert abs(ms.abs().sum() - 1.0) < 1e-9 and abs((ms * betas).sum()) < 1e-9
+    for obj, ra in (('mean_variance', 1.0), ('mean_variance', 1e4), ('min_var', 1.0)):
+        other = build_optimized(z, betas, adv, cov, objective=obj, w_max=0.2, risk_aversion=ra)
+        assert sharpe(ms) >= sharpe(other) - 1e-9
+
+def test_batch_builders_match_per_date_builders():
+    from ..portfolio import (build_long_only, build_long_short_beta_neutral, build_long_only_batch,
+                             build_long_short_beta_neutral_batch, portfolio_returns_carry_forward)
+    rng = np.random.default_rng(2)
+    Z = rng.normal(size=(5, 50)); Z[:, :3] = np.nan
+    ADV = rng.uniform(1, 2, (5, 50)); B = rng.uniform(0.5, 1.5, (5, 50))
+    lo = build_long_only_batch(Z, ADV); ls = build_long_short_beta_neutral_batch(Z, B, ADV)
+    for t in range(5):
+        z, adv, b = pd.Series(Z[t]), pd.Series(ADV[t]), pd.Series(B[t])
+        np.testing.assert_allclose(lo[t], build_long_only(z, adv).to_numpy())
+        np.testing.assert_allclose(ls[t], build_long_short_beta_neutral(z, b, adv).to_numpy())
+    R = np.array([[np.nan, np.nan], [0.01, 0.02], [0.03, -0.01], [0.0, 0.05]])
+    W = np.array([[1.0, 0.0], [0.5, 0.5]])
+    out = portfolio_returns_carry_forward(W, np.array([0, 2]), R)
+    np.testing.assert_allclose(out, [np.nan, 0.01, 0.03, 0.025])
+
+def test_carry_forward_lets_weights_drift():
+    from ..portfolio import portfolio_returns_carry_forward
+    R = np.array([[0.0, 0.0], [0.10, 0.0], [0.0, 0.10]])
+    out = portfolio_returns_carry_forward(np.array([[0.5, 0.5]]), np.array([0]), R)
+    # day 1: 0.5 * 10% = 5%; the weights drift to 0.55/1.05 and 0.5/1.05, so day 2 earns 0.5/1.05 * 10%
+    np.testing.assert_allclose(out, [np.nan, 0.05, 0.05 / 1.05])
+    # long/short with cash: the short leg's loss shrinks the capital it is measured against
+    out = portfolio_returns_carry_forward(np.array([[0.5, -0.5]]), np.array([0]), R)
+    np.testing.assert_allclose(out, [np.nan, 0.05, -0.05 / 1.05])
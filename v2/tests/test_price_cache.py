@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+from .. import http_cache
+from ..data import price_cache
+
+def test_endpoint_policies(monkeypatch):
+    sep = "https://data.nasdaq.com/api/v3/datatables/SHARADAR/SEP"
+    # split-adjusted history is restated by every split: it never becomes immutable
+    assert http_cache.policy_for(sep, {"date.lte": "2003-12-31"}) == "reference"
+    assert http_cache.ttl_for(sep, {"date.lte": "2003-12-31"}) == http_cache.CACHE_TTL
+    assert http_cache.policy_for("https://x/api/v4/historical/social-sentiment", {}) == "short"
+
+def test_gaps_and_merge():
+    cov = [("2020-01-01", "2020-03-31"), ("2020-04-01", "2020-06-30"), ("2021-01-01", "2021-12-31")]
+    assert price_cache.merge_intervals(cov) == [("2020-01-01", "2020-06-30"), ("2021-01-01", "2021-12-31")]
+    assert price_cache.gaps(cov, "2020-02-01", "2022-01-31") == [("2020-07-01", "2020-12-31"),
+                                                                  ("2022-01-01", "2022-01-31")]
+    assert price_cache.gaps(cov, "2021-03-01", "2021-04-01") == []
+    assert price_cache.gaps([], "2024-01-06", "2024-01-07") == []  # weekend only
+
+def _bars(start, end, scale=1.0):
+    idx = pd.bdate_range(start, end, name="date")
+    # a close per date, so overlapping requests agree unless rescaled
+    return pd.DataFrame({"close": scale * (idx - pd.Timestamp("2000-01-01")).days, "volume": 1.0}, index=idx,
+                        dtype=float)
+
+def test_cached_range_fetches_only_gaps(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_cache, "PRICE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(price_cache, "settled_date", lambda: "2024-06-01")
+    calls = []
+    def fetch(s, a, b):
+        calls.append((a, b))
+        return _bars(a, b), True
+    first = price_cache.cached_range("AAA", "2015-01-01", "2023-12-31", fetch)
+    again = price_cache.cached_range("AAA", "2016-01-01", "2023-06-30", fetch)
+    wider = price_cache.cached_range("AAA", "2015-01-01", "2024-12-31", fetch)
+    # the new gap is asked with the last 5 cached bars in front of it
+    assert calls == [("2015-01-01", "2023-12-31"), ("2023-12-25", "2024-12-31")]
+    assert len(again) < len(first) < len(wider)
+    assert again.index.min() >= pd.Timestamp("2016-01-01")
+    # the unsettled tail is asked again next time
+    price_cache.cached_range("AAA", "2024-01-01", "2024-12-31", fetch)
+    assert calls[-1] == ("2024-05-27", "2024-12-31")
+
+def test_empty_answer_is_covered_but_errors_are_not(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_cache, "PRICE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(price_cache, "settled_date", lambda: "2024-06-01")
+    calls = []
+    def no_rows(s, a, b):
+        calls.append(("empty", a, b))
+        return None, True
+    def failing(s, a, b):
+        calls.append(("error", a, b))
+        return None, False
+    assert price_cache.cached_range("PRE", "2010-01-01", "2012-12-31", no_rows) is None
+    assert price_cache.cached_range("PRE", "2010-01-01", "2012-12-31", no_rows) is None
+    assert calls == [("empty", "2010-01-01", "2012-12-31")]
+    price_cache.cached_range("ERR", "2010-01-01", "2010-12-31", failing)
+    price_cache.cached_range("ERR", "2010-01-01", "2010-12-31", failing)
+    assert [c[0] for c in calls[1:]] == ["error", "error"]
+    assert price_cache.load("ERR")[0] == []
+
+def test_restated_history_drops_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_cache, "PRICE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(price_cache, "settled_date", lambda: "2024-06-01")
+    scale, calls = [1.0], []
+    def fetch(s, a, b):
+        calls.append((a, b))
+        return _bars(a, b, scale[0]), True
+    price_cache.cached_range("SPL", "2020-01-01", "2023-12-31", fetch)
+    scale[0] = 0.5  # a 2:1 split restates every earlier close
+    out = price_cache.cached_range("SPL", "2020-01-01", "2024-03-29", fetch)
+    assert calls[1][0] < "2024-01-01" and calls[2] == ("2020-01-01", "2024-03-29")
+    expect = 0.5 * (out.index - pd.Timestamp("2000-01-01")).days
+    assert (out["close"].to_numpy() == expect.to_numpy()).all()
+    assert price_cache.load("SPL")[0] == [("2020-01-01", "2024-03-29")]
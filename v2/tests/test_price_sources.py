@@ -0,0 +1,57 @@
+import time
+import pandas as pd
+from ..data import price_sources as ps
+
+def _bars(start, end, scale=1.0):
+    idx = pd.bdate_range(start, end, name="date")
+    return pd.DataFrame({"close": [scale * (10.0 + i) for i in range(len(idx))], "volume": 1.0}, index=idx)
+
+def _sources(monkeypatch, ndl, fmp):
+    monkeypatch.setattr(ps, "SOURCES", {"NDL": ndl, "FMP": fmp})
+    monkeypatch.setattr(ps, "LATENCY", {"NDL": ps.LatencyTracker(), "FMP": ps.LatencyTracker()})
+    monkeypatch.setattr(ps, "HEDGE_DELAY_S", 0.05)
+    monkeypatch.setattr(ps, "CACHED", {})
+    ps.STATS.reset()
+
+# stored primary bars from anchor_start("2024-01-01") on, on the same basis as _bars over the extended request
+ANCHOR = _bars("2023-12-18", "2023-12-29")
+
+def test_slow_primary_is_hedged(monkeypatch):
+    def slow(s, a, b):
+        time.sleep(0.5)
+        return _bars(a, b)
+    _sources(monkeypatch, slow, lambda s, a, b: _bars(a, b))
+    t = time.perf_counter()
+    out = ps.get_eod_prices("AAA", "2024-01-01", "2024-01-31", ["NDL", "FMP"], anchor=ANCHOR)
+    assert time.perf_counter() - t < 0.4
+    assert (out["source"] == "FMP").all() and len(out) == 23
+    assert ps.STATS.summary()["hedge_wins"] == 1
+
+def test_missing_ticker_falls_back_and_bars_are_reconciled(monkeypatch):
+    _sources(monkeypatch, lambda s, a, b: None, lambda s, a, b: _bars(a, b))
+    out = ps.get_eod_prices("BBB", "2024-01-01", "2024-01-31", ["NDL", "FMP"], anchor=ANCHOR)
+    assert (out["source"] == "FMP").all() and ps.STATS.summary()["fallbacks"] == 1
+    assert out.index[0] == pd.Timestamp("2024-01-01") and len(out) == 23
+    # nothing of the primary's basis to compare with, or a different basis: tagged and kept out of returns
+    for anchor in (None, ANCHOR * 2):
+        out = ps.get_eod_prices("BBB", "2024-01-01", "2024-01-31", ["NDL", "FMP"], anchor=anchor)
+        assert (out["source"] == "FMP:unreconciled").all() and ps.reconciled(out) is None
+    assert ps.STATS.summary()["unreconciled"] == 2
+
+    short = _bars("2024-01-01", "2024-01-19")
+    out = ps.reconcile([("NDL", short), ("FMP", _bars("2024-01-01", "2024-01-31"))])
+    assert out.loc["2024-01-19", "source"] == "NDL" and out.loc["2024-01-22", "source"] == "FMP"
+    assert len(out) == 23
+    # a differently adjusted series is not spliced in
+    out = ps.reconcile([("NDL", short), ("FMP", _bars("2024-01-01", "2024-01-31", scale=0.5))])
+    assert len(out) == len(short) and (out["source"] == "NDL").all()
+
+def test_symbol_without_history_takes_the_secondary_as_basis(monkeypatch):
+    _sources(monkeypatch, lambda s, a, b: None, lambda s, a, b: _bars(a, b))
+    out = ps.get_eod_prices("NEW", "2024-01-01", "2024-01-31", ["NDL", "FMP"], has_basis=False)
+    assert (out["source"] == "FMP").all() and len(out) == 23
+    assert len(ps.reconciled(out)) == len(out) and ps.STATS.summary()["secondary_basis"] == 1
+    # once stored, those bars anchor the next incremental request
+    out = ps.get_eod_prices("NEW", "2024-02-01", "2024-02-29", ["NDL", "FMP"],
+                            anchor=_bars("2024-01-18", "2024-01-31"), has_basis=True)
+    assert out is not None and (out["source"] == "FMP").all()
@@ -0,0 +1,26 @@
+import pytest
+from ..data import db
+from .. import report_builder as rb
+
+@pytest.fixture
+def results_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db.config, "DB_PATH", str(tmp_path / "r.db"))
+    db.init_db()
+    months = [f"2020-{m:02d}-28" for m in range(1, 13)]
+    for k, s in enumerate(["LO::A", "LS::B", "ROT::C@W"]):
+        db.upsert_many("portfolio_returns", [(d, s, 0.01 * (i % 3 - k)) for i, d in enumerate(months)], "?,?,?")
+        db.upsert_many("weights", [(months[-1], s, "AAA", 0.6), (months[-1], s, "BBB", 0.4)], "?,?,?,?")
+        db.upsert_many("performance", [(s, 0.1 * k, 0.2, 1.0, 1.2, -0.1, 0.5, 12)], "?,?,?,?,?,?,?,?")
+    yield tmp_path
+    db.close_conn()
+
+def test_incremental_build(results_db):
+    out = str(results_db / "reports")
+    assert sorted(rb.build_reports(out, workers=1)) == ["LO::A", "LS::B", "ROT::C@W"]
+    page = (results_db / "reports" / rb.page_name("LO::A")).read_text(encoding="utf-8")
+    assert "<svg" in page and "AAA" in page
+    assert f'href="{rb.page_name("LS::B")}"' in (results_db / "reports" / "index.html").read_text(encoding="utf-8")
+    assert rb.build_reports(out, workers=1) == []
+    db.upsert_many("portfolio_returns", [("2020-12-28", "LS::B", 0.05)], "?,?,?")
+    assert rb.build_reports(out, workers=1) == ["LS::B"]
+    assert len(rb.build_reports(out, force=True, workers=1)) == 3
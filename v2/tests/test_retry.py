@@ -0,0 +1,53 @@
+import time
+from types import SimpleNamespace
+from ..clients.retry import RetryBudget, is_permanent, retry_after
+from .. import http_cache
+
+def test_status_classification():
+    assert is_permanent(401) and is_permanent(404)
+    assert not is_permanent(429) and not is_permanent(503) and not is_permanent(200)
+
+def test_retry_after_header():
+    assert retry_after(SimpleNamespace(headers={"Retry-After": "3"})) == 3.0
+    assert retry_after(SimpleNamespace(headers={})) is None
+
+def test_budget_degrades_instead_of_sleeping():
+    b = RetryBudget(max_retries=2, max_sleep_s=10)
+    t0 = time.time()
+    assert b.sleep(0.0) and b.sleep(0.0)
+    assert not b.sleep(5.0)
+    assert time.time() - t0 < 1.0
+    assert b.summary() == dict(retries=2, slept_s=0.0, denied=1)
+
+def test_negative_cache_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path))
+    params = {"symbol": "DEAD"}
+    assert http_cache.neg_cache_get("GET", "u", params) is None
+    http_cache.neg_cache_set("GET", "u", params, 404, permanent=True)
+    assert http_cache.neg_cache_get("GET", "u", params) == 404
+    monkeypatch.setattr(http_cache, "NEG_CACHE_TTL_TRANSIENT", -1)
+    http_cache.neg_cache_set("GET", "u", params, 503, permanent=False)
+    assert http_cache.neg_cache_get("GET", "u", params) is None
+
+def test_fmp_denial_is_per_endpoint_and_short_runs_are_not_neg_cached(monkeypatch):
+    from ..clients import fmp_client
+    assert fmp_client.endpoint_key("/api/v3/profile/BRK.B") == "/api/v3/profile"
+    assert fmp_client.endpoint_key("/api/v3/stock/list") == "/api/v3/stock/list"
+    neg = {}
+    monkeypatch.setattr(fmp_client, "cache_get", lambda *a: None)
+    monkeypatch.setattr(fmp_client, "neg_cache_get", lambda m, u, p: neg.get(u))
+    monkeypatch.setattr(fmp_client, "neg_cache_set", lambda m, u, p, status, permanent: neg.__setitem__(u, status))
+    monkeypatch.setattr(fmp_client, "_get_api_key", lambda: None)
+    monkeypatch.setattr(fmp_client, "_denied_paths", set())
+    monkeypatch.setattr(fmp_client, "RATE_LIMIT_QPS", 1e6)
+    calls = []
+    def get(url, **kw):
+        calls.append(url)
+        return SimpleNamespace(status_code=403 if "profile" in url else 503, text="", headers={})
+    monkeypatch.setattr(fmp_client.requests, "get", get)
+    assert fmp_client.fmp_get("/api/v3/profile/AAA") is None
+    assert fmp_client.fmp_get("/api/v3/profile/BBB") is None
+    assert len(calls) == 1
+    monkeypatch.setattr(fmp_client, "BUDGET", RetryBudget(max_retries=0, max_sleep_s=0))
+    assert fmp_client.fmp_get("/api/v3/quote/CCC") is None
+    assert f"{fmp_client.BASE_URL}/api/v3/quote/CCC" not in neg
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from ..rotation import parse_pairs, rotation_grid, to_formation_months
+
+def _close(T=300, seed=1):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2020-01-01", periods=T)
+    r = rng.normal(0.0003, 0.01, (T, 3))
+    return pd.DataFrame(100 * np.cumprod(1 + r, axis=0), index=idx, columns=["XLU", "VTI", "XLP"])
+
+def _notebook(close, defensive, market, L, reb_pos):
+    """Loop version of notebook 02 on rebalance-day closes, daily returns held to the next rebalance."""
+    wk = close.iloc[reb_pos]
+    roc = (wk[defensive] / wk[market]).pct_change(periods=L)
+    out = pd.Series(np.nan, index=close.index)
+    rets = close.pct_change()
+    for k, p in enumerate(reb_pos):
+        if np.isnan(roc.iloc[k]):
+            continue
+        leg = defensive if roc.iloc[k] > 0 else market
+        end = reb_pos[k + 1] if k + 1 < len(reb_pos) else len(close) - 1
+        out.iloc[p + 1:end + 1] = rets[leg].iloc[p + 1:end + 1]
+    return out
+
+def test_grid_matches_notebook_loop():
+    close = _close()
+    reb_pos = pd.Series(np.arange(len(close)), index=close.index).groupby(close.index.to_period("W")).max().to_numpy()
+    pairs = parse_pairs("XLU:VTI, XLP:VTI, XXX:VTI")
+    names, daily, holdings = rotation_grid(close, pairs, [2, 4, 8], reb_pos)
+    assert names == [f"ROTATION::{a}_VTI_{L}W" for a in ("XLU", "XLP") for L in (2, 4, 8)]
+    for a in ("XLU", "XLP"):
+        for L in (2, 4, 8):
+            ref = _notebook(close, a, "VTI", L, reb_pos)
+            pd.testing.assert_series_equal(daily[f"ROTATION::{a}_VTI_{L}W"], ref, check_names=False)
+    h = holdings["ROTATION::XLU_VTI_4W"]
+    assert set(h.values()) <= {"XLU", "VTI"} and min(h) == close.index[reb_pos[4]]
+
+    costly = rotation_grid(close, pairs[:1], [4], reb_pos, cost_bps=10)[1].iloc[:, 0]
+    assert costly.sum() < daily["ROTATION::XLU_VTI_4W"].sum()
+
+    m = to_formation_months(daily)
+    jan = (1 + daily.loc["2020-02", "ROTATION::XLU_VTI_2W"]).prod() - 1
+    assert np.isclose(m.loc["2020-01-31", "ROTATION::XLU_VTI_2W"], jan)
+
+def test_rotation_prices_fetch_incrementally(tmp_path, monkeypatch):
+    from .. import run_study as rs
+    from ..data import db
+    monkeypatch.setattr(db.config, "DB_PATH", str(tmp_path / "t.db"))
+    monkeypatch.setattr(rs, "ROTATION_PAIRS", "XLU:VTI")
+    db.init_db()
+    db.upsert_many("prices_daily", [("XLU", "2024-01-31", 70.0, 1.0, "NDL"), ("VTI", "2024-03-29", 250.0, 1.0, "NDL")],
+                   "?,?,?,?,?")
+    calls = []
+    def fake(t, start, end, anchor=None, has_basis=True):
+        calls.append((t, start, end, None if anchor is None else len(anchor)))
+        return None
+    monkeypatch.setattr(rs, "get_eod_prices", fake)
+    rs.fetch_rotation_prices("2020-01-01", "2024-03-29")
+    assert calls == [("XLU", "2024-02-01", "2024-03-29", 1)]  # the stored last bar anchors a secondary source
+    db.close_conn()
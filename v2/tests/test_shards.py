@@ -0,0 +1,49 @@
+import os
+import pandas as pd
+from .. import shards
+from ..run_study import load_panels
+from ..data import db
+
+def test_shard_assignment_is_stable_and_balanced():
+    syms = [f"S{i}" for i in range(1000)]
+    ids = [shards.shard_of(s, 4) for s in syms]
+    assert ids == [shards.shard_of(s, 4) for s in syms]
+    assert min(pd.Series(ids).value_counts()) > 150
+
+def test_merge_shards_and_load_panels(tmp_path, monkeypatch):
+    main = str(tmp_path / "study.db")
+    monkeypatch.setattr(db.config, "DB_PATH", main)
+    dates = pd.bdate_range("2021-01-01", periods=30)
+    for i, sym in enumerate(["AAA", "BBB"]):
+        db.config.DB_PATH = shards.shard_db_path(i, 2, main)
+        db.init_db()
+        db.upsert_many("universe", [(sym, sym, "NYSE", 0, "Tech", "Software", 1e9)], "?,?,?,?,?,?,?")
+        db.upsert_many("prices_daily", [(s, d.strftime("%Y-%m-%d"), 10.0 + k, 100.0, "NDL")
+                                        for s in (sym, "SPY") for k, d in enumerate(dates)], "?,?,?,?,?")
+        db.upsert_many("factors_static", [(sym, "2021-02-12", 0.5, 0.1, 0.2, 0.3, None, None, None, 1.0, 2.0)],
+                       "?,?,?,?,?,?,?,?,?,?,?")
+        db.upsert_many("betas_monthly", [("2021-01-31", sym, 1.0 + i)], "?,?,?")
+    db.config.DB_PATH = main
+    syms = shards.merge_shards(2)
+    assert sorted(syms) == ["AAA", "BBB"]
+    engine, betas, industries, log_mcap = load_panels(syms, "2021-01-01", "2021-12-31")
+    assert sorted(engine.get("close").columns) == ["AAA", "BBB", "SPY"]
+    assert engine.get("close").shape[0] == 30
+    assert engine.get("B2M").loc["BBB"] == 0.5
+    assert betas.loc["2021-01-31", "BBB"] == 2.0
+    assert industries.loc["AAA"] == "Software"
+    db.close_conn()
+
+def test_run_shard_filters_the_parents_universe(tmp_path, monkeypatch):
+    import config, run_study as rs
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "study.db"))
+    def no_download(*a, **k):
+        raise AssertionError("the shard must not download /stock/list again")
+    monkeypatch.setattr(rs, "get_universe", no_download)
+    monkeypatch.setattr(rs, "fetch_profiles", lambda syms: [(s, "Tech", "Software", 1e9) for s in syms])
+    got = {}
+    monkeypatch.setattr(rs, "ingest", lambda syms, *a, **k: got.setdefault("syms", syms))
+    uni = pd.DataFrame({"symbol": [f"S{i}" for i in range(20)], "name": "x", "exchange": "NYSE", "is_delisted": 0})
+    path = shards.run_shard(1, 3, "2021-01-01", "2021-12-31", 20, True, universe=uni)
+    assert got["syms"] == [s for s in uni["symbol"] if shards.shard_of(s, 3) == 1] and got["syms"]
+    assert path == shards.shard_db_path(1, 3, str(tmp_path / "study.db")) and os.path.exists(path)
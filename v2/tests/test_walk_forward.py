@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from ..cube import CubeWriter
+from ..analytics.walk_forward import window_stats, factor_weights, walk_forward
+
+def test_window_stats_use_only_past_months():
+    rng = np.random.default_rng(0)
+    ic = rng.standard_normal((20, 2))
+    ic[3, 1] = np.nan
+    mean, std, n = window_stats(ic, min_train=4, window=6)
+    assert np.isnan(mean[3]).all() and np.isfinite(mean[4, 0])
+    past = ic[4:10, 1]
+    past = past[np.isfinite(past)]
+    assert np.isclose(mean[10, 1], past.mean()) and np.isclose(std[10, 1], past.std(ddof=1))
+    exp_mean, _, _ = window_stats(ic, min_train=4)
+    assert np.isclose(exp_mean[15, 0], ic[:15, 0].mean())
+
+def test_walk_forward_picks_the_predictive_factor():
+    rng = np.random.default_rng(1)
+    T, N = 40, 200
+    months = pd.date_range("2015-01-31", periods=T, freq="ME")
+    syms = [f"S{i}" for i in range(N)]
+    z = rng.standard_normal((T, N))
+    R = 0.02 * rng.standard_normal((T, N)) + 0.02 * z
+    w = CubeWriter(None, months, syms, ["GOOD", "NOISE"])
+    for t, dt in enumerate(months):
+        w.write_month(dt, pd.DataFrame({"GOOD": z[t], "NOISE": rng.standard_normal(N)}, index=syms))
+    w.write_matrix("m_rets", pd.DataFrame(R, index=months, columns=syms))
+    w.write_matrix("adv20", pd.DataFrame(1e6, index=months, columns=syms))
+    w.write_matrix("beta", pd.DataFrame(1.0, index=months, columns=syms))
+    res = walk_forward(w.close(), ["GOOD", "NOISE"], ["equal", "top1"], min_train=12)
+
+    fw = res["factor_weights"]["COMPOSITE_WF_LS::top1_exp"]
+    assert fw.index[0] == months[12] and (fw["GOOD"] == 1.0).all()
+    assert (res["returns"]["COMPOSITE_WF_LS::top1_exp"] > 0).mean() > 0.9
+    assert np.isnan(factor_weights(np.full((1, 2), np.nan), np.full((1, 2), np.nan), "ic_ir")).all()
+    wt = res["weights"]["COMPOSITE_WF_LS::equal_exp"][months[20]]
+    assert np.isclose(wt.sum(), 0.0, atol=1e-9) and (wt != 0).sum() > 0